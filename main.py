@@ -7,7 +7,14 @@ project_root = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(project_root)
 
 from src.ui.main_window import MainWindow
-from src.utils.logger import logger
+from src.utils.config_loader import config
+from src.utils.logger import apply_logging_settings, logger
+
+def run_app():
+    """メインウィンドウを作成してイベントループを実行"""
+    app = MainWindow()
+    logger.info("メインウィンドウを初期化しました")
+    app.mainloop()
 
 def main():
     """アプリケーションのメインエントリーポイント"""
@@ -15,15 +22,23 @@ def main():
         # 必要なディレクトリの作成
         os.makedirs("logs", exist_ok=True)
         
+        # 設定ファイルのログの設定を反映
+        apply_logging_settings(config.get_logging_settings())
+
         # ロガーの初期化確認
         logger.info("アプリケーションを起動します")
-        logger.debug(f"現在の作業ディレクトリ: {os.getcwd()}")
-        logger.debug(f"プロジェクトルート: {project_root}")
+        logger.debug("現在の作業ディレクトリ: {}", os.getcwd())
+        logger.debug("プロジェクトルート: {}", project_root)
         
-        # アプリケーションの起動
-        app = MainWindow()
-        logger.info("メインウィンドウを初期化しました")
-        app.mainloop()
+        # アプリケーションの起動（--profile [PATH] でプロファイリング）
+        if "--profile" in sys.argv:
+            from src.utils.profiler import ProfileSession
+            position = sys.argv.index("--profile")
+            report_path = sys.argv[position + 1] if len(sys.argv) > position + 1 else None
+            with ProfileSession(report_path):
+                run_app()
+        else:
+            run_app()
         
     except Exception as e:
         error_msg = f"予期せぬエラーが発生しました: {str(e)}"
@@ -0,0 +1,537 @@
+"""変換エンジンのベンチマーク
+
+FFmpegのlavfiソース（sine / anoisesrc / testsrc2）で再現性のあるテスト用メディアを生成し、
+FFmpegWrapper.convert_audio / convert_video を出力形式・品質設定・並列数ごとに実行して
+処理速度とメモリ使用量をJSONで出力する。基準値（以前の結果）と比較して性能の低下を検出する。
+
+使用例:
+    python -m src.benchmark -o bench.json                         # 計測して結果を保存
+    python -m src.benchmark --baseline bench.json                 # 基準値と比較（低下があれば終了コード1）
+    python -m src.benchmark --durations 10,60 --jobs 1,4 --formats mp3,mp4 --presets normal
+    python -m src.benchmark --validation-files 10000              # ログ出力のオーバーヘッドのみ計測
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+
+# 終了コード
+EXIT_OK = 0
+EXIT_REGRESSION = 1    # 基準値より性能が低下した
+EXIT_USAGE = 2
+EXIT_ENVIRONMENT = 3   # FFmpegが使えないなど実行環境の問題
+
+REPORT_VERSION = 1
+QUALITY_PRESETS = ["normal", "medium_compression", "high_compression", "ultra_compression", "hell_compression"]
+
+# 音声のチャンネル構成
+CHANNEL_LAYOUTS = {"mono": 1, "stereo": 2}
+
+
+@dataclass
+class BenchmarkMedia:
+    """生成したテスト用メディア"""
+    name: str
+    path: str
+    duration: float
+    has_video: bool
+
+
+@dataclass
+class BenchmarkResult:
+    """1ケース（出力形式・品質設定・並列数）の計測結果"""
+    key: str
+    output_format: str
+    quality_preset: Optional[str]
+    jobs: int
+    files: int
+    failed: int
+    media_seconds: float
+    wall_seconds: float
+    files_per_second: float
+    media_seconds_per_second: float
+    peak_rss_mb: Optional[float]
+
+
+class RssSampler:
+    """このプロセスと子プロセス（FFmpeg）のメモリ使用量（RSS）の合計の最大値を計測
+
+    Linuxでは/procを一定間隔で読み、同時に動くFFmpegの合計を計測する。
+    /procが無い環境ではresourceモジュールの最大RSS（プロセス単位の最大値）で代用する。
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.method = "procfs" if os.path.exists(f"/proc/{os.getpid()}/status") else "getrusage"
+
+    def __enter__(self) -> "RssSampler":
+        if self.method == "procfs":
+            self._thread = threading.Thread(target=self._sample_loop, name="rss-sampler", daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        else:
+            self.peak_bytes = self._getrusage_peak()
+
+    @property
+    def peak_mb(self) -> Optional[float]:
+        return round(self.peak_bytes / (1024 * 1024), 1) if self.peak_bytes else None
+
+    def _sample_loop(self) -> None:
+        while not self._stop.is_set():
+            self.peak_bytes = max(self.peak_bytes, self._current_total())
+            self._stop.wait(self.interval)
+
+    def _current_total(self) -> int:
+        """このプロセスと直接の子プロセスのRSSの合計（バイト）"""
+        pid = os.getpid()
+        total = self._read_rss(pid)
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit() or int(entry) == pid:
+                continue
+            try:
+                with open(f"/proc/{entry}/stat", "r") as f:
+                    # commにスペースや括弧が含まれる場合があるため、最後の')'以降を分割する
+                    fields = f.read().rsplit(")", 1)[1].split()
+                if int(fields[1]) == pid:
+                    total += self._read_rss(int(entry))
+            except (OSError, IndexError, ValueError):
+                continue
+        return total
+
+    def _read_rss(self, pid: int) -> int:
+        try:
+            with open(f"/proc/{pid}/status", "r") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError):
+            pass
+        return 0
+
+    def _getrusage_peak(self) -> int:
+        try:
+            import resource
+        except ImportError:
+            # Windowsでは計測しない
+            return 0
+        peak = max(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        )
+        # macOSはバイト、それ以外はKB単位
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """コマンドライン引数の定義"""
+    parser = argparse.ArgumentParser(
+        prog="python -m src.benchmark",
+        description="テスト用メディアを生成して変換速度を計測します"
+    )
+    parser.add_argument("--durations", default="5,30", help="テスト用メディアの長さ（秒、カンマ区切り）")
+    parser.add_argument("--layouts", default="mono,stereo", help="音声のチャンネル構成（カンマ区切り）: mono, stereo")
+    parser.add_argument("--formats", default="mp3,wav,mp4", help="出力フォーマット（カンマ区切り）")
+    parser.add_argument("--presets", default=",".join(QUALITY_PRESETS), help="MP4の品質設定（カンマ区切り）")
+    parser.add_argument("--jobs", default="1,2,4", help="並列数（カンマ区切り）")
+    parser.add_argument("--repeat", type=int, default=1, help="各ケースの実行回数（最も速かった回を採用）")
+    parser.add_argument("--work-dir", help="テスト用メディアと出力の作業ディレクトリ（省略時は一時ディレクトリ）")
+    parser.add_argument("-o", "--output", help="結果のJSONの保存先（省略時は標準出力）")
+    parser.add_argument("--baseline", help="比較する基準値（以前の結果のJSON）")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.15,
+        help="性能低下とみなす割合（0.15で処理速度が15%%以上低下、またはメモリが15%%以上増加）"
+    )
+    parser.add_argument(
+        "--validation-files",
+        type=int,
+        metavar="N",
+        help="変換の代わりに、N個のファイルの検証にかかるログ出力のオーバーヘッドをログの設定ごとに計測する"
+    )
+    return parser
+
+
+def split_list(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def generate_media(
+    ffmpeg_path: str,
+    work_dir: str,
+    durations: List[float],
+    layouts: List[str],
+    with_video: bool
+) -> List[BenchmarkMedia]:
+    """lavfiソースでテスト用メディアを生成（同じ設定のファイルが既にあれば再利用）
+
+    音声はサイン波とシード固定のピンクノイズ、動画はtestsrc2とサイン波を使うため、毎回同じ内容になる。
+    """
+    media_dir = os.path.join(work_dir, "media")
+    os.makedirs(media_dir, exist_ok=True)
+    media: List[BenchmarkMedia] = []
+
+    for duration in durations:
+        for layout in layouts:
+            channels = CHANNEL_LAYOUTS[layout]
+            sources = {
+                "sine": f"sine=frequency=440:sample_rate=44100:duration={duration}",
+                "noise": f"anoisesrc=color=pink:seed=42:sample_rate=44100:amplitude=0.3:duration={duration}"
+            }
+            for source_name, source in sources.items():
+                name = f"{source_name}_{layout}_{duration:g}s"
+                path = os.path.join(media_dir, f"{name}.wav")
+                _generate(ffmpeg_path, path, [
+                    "-f", "lavfi", "-i", source,
+                    "-ac", str(channels), "-c:a", "pcm_s16le"
+                ])
+                media.append(BenchmarkMedia(name, path, duration, False))
+
+        if with_video:
+            name = f"testsrc2_{duration:g}s"
+            path = os.path.join(media_dir, f"{name}.mov")
+            _generate(ffmpeg_path, path, [
+                "-f", "lavfi", "-i", f"testsrc2=size=640x360:rate=30:duration={duration}",
+                "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=48000:duration={duration}",
+                "-c:v", "mpeg4", "-q:v", "3", "-c:a", "pcm_s16le", "-ac", "2", "-shortest"
+            ])
+            media.append(BenchmarkMedia(name, path, duration, True))
+
+    return media
+
+
+def _generate(ffmpeg_path: str, path: str, args: List[str]) -> None:
+    if os.path.exists(path):
+        return
+    temp_path = f"{os.path.splitext(path)[0]}.tmp{os.path.splitext(path)[1]}"
+    command = [ffmpeg_path, "-hide_banner", "-loglevel", "error", "-y"] + args + [temp_path]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"テスト用メディアの生成に失敗しました: {path}: {result.stderr.strip()}")
+    os.replace(temp_path, path)
+
+
+def build_cases(formats: List[str], presets: List[str]) -> List[Dict[str, Optional[str]]]:
+    """計測するケース（出力形式と品質設定の組み合わせ）"""
+    cases: List[Dict[str, Optional[str]]] = []
+    for output_format in formats:
+        if output_format == "mp4":
+            cases.extend({"format": "mp4", "quality_preset": preset} for preset in presets)
+        else:
+            cases.append({"format": output_format, "quality_preset": None})
+    return cases
+
+
+def run_case(
+    ffmpeg: Any,
+    media: List[BenchmarkMedia],
+    case: Dict[str, Optional[str]],
+    jobs: int,
+    out_dir: str
+) -> BenchmarkResult:
+    """1ケースを実行して計測（MP4は動画のみ、MP3/WAVは全メディアが対象）"""
+    output_format = case["format"]
+    quality_preset = case["quality_preset"]
+    targets = [item for item in media if item.has_video or output_format != "mp4"]
+    os.makedirs(out_dir, exist_ok=True)
+
+    def convert(item: BenchmarkMedia) -> bool:
+        output_path = os.path.join(out_dir, f"{item.name}.{output_format}")
+        try:
+            if output_format == "mp4":
+                ffmpeg.convert_video(item.path, "mp4", output_path, quality_preset, item.duration)
+            else:
+                ffmpeg.convert_audio(item.path, output_format, output_path, item.duration)
+            return True
+        except Exception:
+            return False
+
+    ffmpeg.governor.set_expected_jobs(min(jobs, len(targets)))
+    with RssSampler() as sampler:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="benchmark") as executor:
+            succeeded = list(executor.map(convert, targets))
+        wall = time.perf_counter() - start
+    shutil.rmtree(out_dir, ignore_errors=True)
+
+    media_seconds = sum(item.duration for item in targets)
+    key = f"{output_format}:{quality_preset}" if quality_preset else output_format
+    return BenchmarkResult(
+        key=f"{key}/j{jobs}",
+        output_format=output_format,
+        quality_preset=quality_preset,
+        jobs=jobs,
+        files=len(targets),
+        failed=succeeded.count(False),
+        media_seconds=media_seconds,
+        wall_seconds=round(wall, 3),
+        files_per_second=round(len(targets) / wall, 3) if wall > 0 else 0.0,
+        media_seconds_per_second=round(media_seconds / wall, 2) if wall > 0 else 0.0,
+        peak_rss_mb=sampler.peak_mb
+    )
+
+
+def compare_with_baseline(
+    results: List[Dict[str, Any]],
+    baseline: Dict[str, Any],
+    tolerance: float
+) -> List[Dict[str, Any]]:
+    """基準値と比較して、処理速度の低下・メモリ使用量の増加が許容範囲を超えたケースを返す"""
+    baseline_results = {result["key"]: result for result in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        base = baseline_results.get(result["key"])
+        if base is None:
+            continue
+        if base.get("media_seconds_per_second") and \
+                result["media_seconds_per_second"] < base["media_seconds_per_second"] * (1 - tolerance):
+            regressions.append({
+                "key": result["key"],
+                "metric": "media_seconds_per_second",
+                "baseline": base["media_seconds_per_second"],
+                "current": result["media_seconds_per_second"]
+            })
+        if base.get("peak_rss_mb") and result["peak_rss_mb"] and \
+                result["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance):
+            regressions.append({
+                "key": result["key"],
+                "metric": "peak_rss_mb",
+                "baseline": base["peak_rss_mb"],
+                "current": result["peak_rss_mb"]
+            })
+        if result["failed"] > base.get("failed", 0):
+            regressions.append({
+                "key": result["key"],
+                "metric": "failed",
+                "baseline": base.get("failed", 0),
+                "current": result["failed"]
+            })
+    return regressions
+
+
+# ログのオーバーヘッドの計測に使う設定（名前, コンソールのレベル, ファイルのレベル, JSON, enqueue）
+LOGGING_CASES = [
+    ("debug", "DEBUG", "DEBUG", False, False),  # 変更前の相当: 全メッセージを組み立てて書き込む
+    ("info", "INFO", "INFO", False, False),     # デフォルト
+    ("warning", "WARNING", "WARNING", False, False),
+    ("info_json", "INFO", "INFO", True, False),
+    ("info_enqueue", "INFO", "INFO", False, True)
+]
+
+
+def run_logging_benchmark(count: int, work_dir: str) -> List[Dict[str, Any]]:
+    """count個の空のファイルを検証し、ログの設定ごとの1ファイルあたりの時間を計測する
+
+    per_file_usは呼び出し側のスレッドでかかった時間、drain_secondsはキューに残ったログの書き出しを待った時間。
+    計測後はロガーを標準エラー出力・WARNINGの設定に戻す。
+    """
+    from .services.file_handler import FileHandler
+    from .utils.logger import logger, setup_logger
+
+    media_dir = os.path.join(work_dir, "validation")
+    os.makedirs(media_dir, exist_ok=True)
+    paths = []
+    for index in range(count):
+        path = os.path.join(media_dir, f"file_{index:06d}.wav")
+        if not os.path.exists(path):
+            open(path, "wb").close()
+        paths.append(path)
+
+    handler = FileHandler()
+    results = []
+    try:
+        with open(os.devnull, "w", encoding="utf-8") as devnull:
+            for name, console_level, file_level, json_lines, enqueue in LOGGING_CASES:
+                log_dir = os.path.join(work_dir, "logs", name)
+                setup_logger(devnull, console_level, file_level, json_lines, enqueue, log_dir)
+                started = time.perf_counter()
+                valid = sum(1 for _ in handler.iter_valid_files(paths))
+                elapsed = time.perf_counter() - started
+                logger.complete()
+                drained = time.perf_counter() - started - elapsed
+                log_bytes = sum(entry.stat().st_size for entry in os.scandir(log_dir) if entry.is_file())
+                results.append({
+                    "key": f"logging/{name}",
+                    "files": valid,
+                    "per_file_us": round(elapsed / max(1, count) * 1e6, 2),
+                    "drain_seconds": round(drained, 3),
+                    "log_bytes": log_bytes
+                })
+                print(
+                    f"logging/{name}: {results[-1]['per_file_us']} µs/ファイル, "
+                    f"書き出し待ち {results[-1]['drain_seconds']}秒, ログ {log_bytes} bytes",
+                    file=sys.stderr
+                )
+    finally:
+        setup_logger(sys.stderr, "WARNING")
+    return results
+
+
+def get_ffmpeg_version(ffmpeg_path: str) -> str:
+    try:
+        result = subprocess.run([ffmpeg_path, "-version"], capture_output=True, text=True)
+        return result.stdout.splitlines()[0] if result.stdout else ""
+    except OSError:
+        return ""
+
+
+def main(argv: List[str] = None) -> int:
+    """ベンチマークのメイン処理。終了コードを返す"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    try:
+        durations = [float(value) for value in split_list(args.durations)]
+        jobs_levels = [int(value) for value in split_list(args.jobs)]
+    except ValueError as e:
+        parser.error(f"数値の指定が不正です: {str(e)}")
+    layouts = split_list(args.layouts)
+    formats = [value.lower() for value in split_list(args.formats)]
+    presets = split_list(args.presets)
+    for layout in layouts:
+        if layout not in CHANNEL_LAYOUTS:
+            parser.error(f"不明なチャンネル構成です: {layout}")
+    for output_format in formats:
+        if output_format not in ("mp3", "wav", "mp4"):
+            parser.error(f"サポートされていない出力フォーマットです: {output_format}")
+    for preset in presets:
+        if preset not in QUALITY_PRESETS:
+            parser.error(f"不明な品質設定です: {preset}")
+    if args.validation_files is not None and args.validation_files < 1:
+        parser.error("--validation-files には1以上を指定してください")
+    if not durations or not jobs_levels or min(jobs_levels) < 1 or args.repeat < 1:
+        parser.error("長さ・並列数・実行回数は1つ以上、並列数と実行回数は1以上を指定してください")
+
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            parser.error(f"基準値を読み込めませんでした: {str(e)}")
+
+    # 結果以外の出力（デバッグ出力やログ）はすべて標準エラー出力に回す
+    with contextlib.redirect_stdout(sys.stderr):
+        from .utils.logger import logger, setup_logger
+        setup_logger(sys.stderr, "WARNING")
+
+        if args.validation_files:
+            work_dir = args.work_dir or tempfile.mkdtemp(prefix="convert_benchmark_")
+            try:
+                results = run_logging_benchmark(args.validation_files, work_dir)
+            finally:
+                if not args.work_dir:
+                    shutil.rmtree(work_dir, ignore_errors=True)
+            report = {
+                "version": REPORT_VERSION,
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "platform": platform.platform(),
+                "python": platform.python_version(),
+                "settings": {"validation_files": args.validation_files},
+                "results": results
+            }
+            text = json.dumps(report, indent=4, ensure_ascii=False)
+            if args.output:
+                with open(args.output, "w", encoding="utf-8") as f:
+                    f.write(text + "\n")
+            else:
+                sys.__stdout__.write(text + "\n")
+            return EXIT_OK
+
+        try:
+            from .services.ffmpeg_wrapper import FFmpegWrapper
+            ffmpeg = FFmpegWrapper()
+        except Exception as e:
+            logger.error("FFmpegを初期化できませんでした: {}", e)
+            return EXIT_ENVIRONMENT
+
+        work_dir = args.work_dir or tempfile.mkdtemp(prefix="convert_benchmark_")
+        try:
+            media = generate_media(ffmpeg.ffmpeg_path, work_dir, durations, layouts, "mp4" in formats)
+        except Exception as e:
+            logger.error(str(e))
+            return EXIT_ENVIRONMENT
+
+        results: List[Dict[str, Any]] = []
+        try:
+            for case in build_cases(formats, presets):
+                for jobs in jobs_levels:
+                    runs = [
+                        run_case(ffmpeg, media, case, jobs, os.path.join(work_dir, "out"))
+                        for _ in range(args.repeat)
+                    ]
+                    best = max(runs, key=lambda run: run.media_seconds_per_second)
+                    print(
+                        f"{best.key}: {best.files_per_second} files/s, "
+                        f"{best.media_seconds_per_second} 秒/秒, 最大RSS {best.peak_rss_mb} MB",
+                        file=sys.stderr
+                    )
+                    results.append(asdict(best))
+        finally:
+            if not args.work_dir:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+    report: Dict[str, Any] = {
+        "version": REPORT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "ffmpeg": get_ffmpeg_version(ffmpeg.ffmpeg_path),
+        "rss_method": RssSampler().method,
+        "settings": {
+            "durations": durations,
+            "layouts": layouts,
+            "formats": formats,
+            "presets": presets,
+            "jobs": jobs_levels,
+            "repeat": args.repeat
+        },
+        "results": results
+    }
+    exit_code = EXIT_OK
+    if baseline is not None:
+        if baseline.get("settings", {}).get("durations") != durations or \
+                baseline.get("settings", {}).get("layouts") != layouts:
+            print("警告: 基準値とテスト用メディアの設定が異なるため、比較結果は参考値です", file=sys.stderr)
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        report["baseline"] = os.path.abspath(args.baseline)
+        report["regressions"] = regressions
+        for regression in regressions:
+            print(
+                f"性能低下: {regression['key']} {regression['metric']}: "
+                f"{regression['baseline']} -> {regression['current']}",
+                file=sys.stderr
+            )
+        if regressions:
+            exit_code = EXIT_REGRESSION
+
+    text = json.dumps(report, indent=4, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
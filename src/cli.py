@@ -0,0 +1,272 @@
+"""GUIを使わずにバッチ変換を行うコマンドラインエントリーポイント
+
+使用例:
+    python -m src.cli -f mp3 input.wav music_dir "records/**/*.flac"
+    find /data -name "*.mov" | python -m src.cli -f mp4 -q high_compression -
+    python -m src.cli -f mp3 --journal jobs.sqlite3 music_dir   # 進捗をジャーナルに記録
+    python -m src.cli --journal jobs.sqlite3 --resume            # 中断したバッチを再開
+    python -m src.cli -f mp3 --profile music_dir                 # 処理時間の内訳をlogs/profile_*.txtに出力
+
+tkinter/tkinterdnd2は読み込まないため、ディスプレイの無いサーバーでも動作する。
+"""
+import argparse
+import contextlib
+import glob
+import json
+import os
+import sys
+from typing import Any, Dict, Iterable, Iterator, List, TextIO
+
+# 終了コード
+EXIT_OK = 0            # すべて成功
+EXIT_FAILED = 1        # 変換に失敗したファイルがある
+EXIT_NO_INPUT = 2      # 引数の誤り、または変換対象のファイルが無い
+EXIT_ENVIRONMENT = 3   # FFmpegが使えないなど実行環境の問題
+EXIT_INTERRUPTED = 130
+
+SUPPORTED_OUTPUT_FORMATS = ["mp3", "wav", "mp4"]
+QUALITY_PRESETS = ["normal", "medium_compression", "high_compression", "ultra_compression", "hell_compression"]
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """コマンドライン引数の定義"""
+    parser = argparse.ArgumentParser(
+        prog="python -m src.cli",
+        description="オーディオ・動画ファイルをMP3/WAV/MP4に一括変換します（GUI不要）"
+    )
+    parser.add_argument(
+        "inputs",
+        nargs="*",
+        help="ファイル、ディレクトリ、globパターン。'-' で標準入力から1行1パスで読み込む"
+    )
+    parser.add_argument(
+        "-f", "--format",
+        default="mp3",
+        help="出力フォーマット（カンマ区切りで複数指定すると1回のデコードで全形式に出力）"
+    )
+    parser.add_argument(
+        "-q", "--quality",
+        default="normal",
+        help="MP4の品質設定（カンマ区切りで複数指定可）: " + ", ".join(QUALITY_PRESETS)
+    )
+    parser.add_argument("--overwrite", action="store_true", help="上書きモード（元のファイルと同じ名前で保存）")
+    parser.add_argument(
+        "--normalize",
+        action="store_true",
+        help="MP3/WAVの出力をEBU R128（loudnorm）の2パスでラウドネス正規化（解析結果はキャッシュして再利用）"
+    )
+    parser.add_argument("-j", "--jobs", type=int, default=0, help="同時変換数（0で設定ファイルの値）")
+    parser.add_argument("--stdin", action="store_true", help="標準入力から1行1パスで入力ファイルを読み込む")
+    parser.add_argument(
+        "--follow-symlinks",
+        action="store_true",
+        help="ディレクトリの走査でシンボリックリンクをたどる（同じディレクトリは一度だけ走査）"
+    )
+    parser.add_argument("--journal", metavar="PATH", help="ジョブの状態を記録するジャーナルファイル（中断後の再開に使用）")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="--journalの記録から再開（完了済みを飛ばし、一時ファイルを削除して未完了のジョブのみ実行）"
+    )
+    parser.add_argument("--json", action="store_true", help="結果をJSON Lines形式で出力")
+    parser.add_argument("-v", "--verbose", action="store_true", help="詳細なログを標準エラー出力に表示")
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="",
+        metavar="PATH",
+        help="cProfile・tracemalloc・FFmpegの-benchmarkで計測し、レポートを書き出す（省略時はlogs/profile_日時.txt）"
+    )
+    return parser
+
+
+def parse_targets(formats: str, qualities: str) -> List[Dict[str, str]]:
+    """-f/-q の指定を出力先の一覧に変換"""
+    targets = []
+    quality_list = [q.strip() for q in qualities.split(",") if q.strip()] or ["normal"]
+    for output_format in (f.strip().lower() for f in formats.split(",")):
+        if not output_format:
+            continue
+        if output_format not in SUPPORTED_OUTPUT_FORMATS:
+            raise ValueError(f"サポートされていない出力フォーマットです: {output_format}")
+        if output_format == "mp4":
+            for quality in quality_list:
+                if quality not in QUALITY_PRESETS:
+                    raise ValueError(f"不明な品質設定です: {quality}")
+                targets.append({"format": "mp4", "quality_preset": quality})
+        else:
+            targets.append({"format": output_format})
+    if not targets:
+        raise ValueError("出力フォーマットが指定されていません")
+    return targets
+
+
+def read_path_list(stream: TextIO) -> Iterator[str]:
+    """1行1パスのリストを読み込む（空行は無視）"""
+    for line in stream:
+        path = line.strip()
+        if path:
+            yield path
+
+
+def iter_input_paths(inputs: Iterable[str], use_stdin: bool) -> Iterator[str]:
+    """引数をパスに展開して逐次返す（ディレクトリはそのまま返し、走査はコントローラーが行う）"""
+    if use_stdin:
+        yield from read_path_list(sys.stdin)
+    for item in inputs:
+        if item == "-":
+            yield from read_path_list(sys.stdin)
+        elif any(char in item for char in "*?["):
+            for path in glob.iglob(item, recursive=True):
+                if os.path.isfile(path):
+                    yield path
+        else:
+            yield item
+
+
+def format_result(result: Dict[str, Any], as_json: bool) -> str:
+    """変換結果を1行の文字列に変換"""
+    if as_json:
+        return json.dumps(result, ensure_ascii=False, default=str)
+    if result.get("skipped"):
+        return f"SKIP\t{result['input_path']}\t{result['output_path']}"
+    if result["status"] == "success":
+        return f"OK\t{result['input_path']}\t{result['output_path']}"
+    error = str(result.get("error", "")).strip().splitlines()
+    return f"NG\t{result['input_path']}\t{error[-1] if error else ''}"
+
+
+def open_journal(args: argparse.Namespace, controller: Any) -> Any:
+    """ジョブジャーナルを開いてコントローラーに設定する
+
+    再開時は前回中断したジョブの後始末を行い、新規実行時は前回の記録を消去する。
+    """
+    from .services.job_journal import JobJournal
+    journal = JobJournal(os.path.abspath(args.journal))
+    if args.resume:
+        unfinished = journal.recover()
+        stats = journal.stats()
+        print(f"再開: 完了済み {stats['done']}件 / 未完了 {len(unfinished)}件", file=sys.stderr)
+    else:
+        journal.reset()
+    controller.set_journal(journal)
+    return journal
+
+
+def main(argv: List[str] = None) -> int:
+    """CLIのメイン処理。終了コードを返す"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    try:
+        targets = parse_targets(args.format, args.quality)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.resume and not args.journal:
+        parser.error("--resumeには--journalの指定が必要です")
+    if not args.inputs and not args.stdin and not args.resume:
+        parser.error("入力ファイルを指定してください")
+
+    if args.profile is not None:
+        from .utils.profiler import ProfileSession
+        with ProfileSession(args.profile or None):
+            return run(args, targets)
+    return run(args, targets)
+
+
+def run(args: argparse.Namespace, targets: List[Dict[str, str]]) -> int:
+    """変換を実行して結果を出力する。終了コードを返す"""
+    result_stream = sys.stdout
+    succeeded = failed = skipped = 0
+
+    # 結果以外の出力（デバッグ出力やログ）はすべて標準エラー出力に回す
+    with contextlib.redirect_stdout(sys.stderr):
+        from .utils.config_loader import config
+        from .utils.logger import apply_logging_settings, logger
+        apply_logging_settings(config.get_logging_settings(), sys.stderr, "DEBUG" if args.verbose else "WARNING")
+
+        try:
+            from .controllers.converter_controller import ConverterController
+            controller = ConverterController()
+        except Exception as e:
+            logger.error("変換の準備に失敗しました: {}", e)
+            return EXIT_ENVIRONMENT
+
+        inputs = args.inputs
+        overwrite = args.overwrite
+        normalize = args.normalize or controller.normalize_loudness  # 設定ファイルで有効な場合も含む
+        if args.journal:
+            try:
+                journal = open_journal(args, controller)
+            except Exception as e:
+                logger.error("ジョブジャーナルを開けませんでした: {}", e)
+                return EXIT_ENVIRONMENT
+            if args.resume:
+                # 入力・出力形式・上書きモード・ラウドネス正規化は前回の指定を引き継ぐ（入力を指定した場合はそちらを優先）
+                inputs = inputs or journal.get_meta("inputs", [])
+                targets = journal.get_meta("targets", targets)
+                overwrite = journal.get_meta("overwrite", overwrite)
+                normalize = journal.get_meta("normalize", normalize)
+                if journal.get_meta("stdin", False) and not args.stdin:
+                    logger.warning("前回は標準入力から読み込んだため、同じ一覧を再度標準入力から渡してください")
+            else:
+                journal.set_meta("inputs", [i if i == "-" else os.path.abspath(i) for i in inputs])
+                journal.set_meta("targets", targets)
+                journal.set_meta("overwrite", overwrite)
+                journal.set_meta("normalize", normalize)
+                journal.set_meta("stdin", args.stdin or "-" in inputs)
+
+        controller.set_overwrite_mode(overwrite)
+        controller.set_follow_symlinks(args.follow_symlinks)
+        controller.set_loudness_normalization(normalize)
+        if args.jobs > 0:
+            controller.set_max_workers(args.jobs)
+
+        # 検証で除外されたファイルも失敗として数え、結果に出力する
+        rejected: List[Dict[str, Any]] = []
+
+        def on_invalid(path: str, reason: str) -> None:
+            rejected.append({"input_path": path, "error": reason, "status": "error"})
+
+        input_paths = iter_input_paths(inputs, args.stdin)
+        if len(targets) == 1:
+            target = targets[0]
+            if target.get("quality_preset"):
+                controller.set_quality_preset(target["quality_preset"])
+            results = controller.iter_convert(input_paths, target["format"], on_invalid)
+        else:
+            results = controller.iter_convert_multi(input_paths, targets, on_invalid)
+
+        def with_rejected(results: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+            for result in results:
+                while rejected:
+                    yield rejected.pop(0)
+                yield result
+            while rejected:
+                yield rejected.pop(0)
+
+        try:
+            for result in with_rejected(results):
+                if result.get("skipped"):
+                    skipped += 1
+                elif result["status"] == "success":
+                    succeeded += 1
+                else:
+                    failed += 1
+                result_stream.write(format_result(result, args.json) + "\n")
+                result_stream.flush()
+        except KeyboardInterrupt:
+            logger.warning("中断されました")
+            return EXIT_INTERRUPTED
+
+    summary = f"完了: 成功 {succeeded}件 / 失敗 {failed}件"
+    if skipped:
+        summary += f" / 完了済みのためスキップ {skipped}件"
+    print(summary, file=sys.stderr)
+    if succeeded == 0 and failed == 0 and skipped == 0:
+        return EXIT_NO_INPUT
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,24 @@
-from typing import List, Dict, Optional, Callable
-from ..services.ffmpeg_wrapper import FFmpegWrapper
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Deque, Iterable, Iterator, List, Dict, Optional, Callable, Tuple, Union
+from ..services.batch_scheduler import BatchScheduler, ScheduledJob
+from ..services.conversion_cache import ConversionCache, link_or_copy
+from ..services.conversion_planner import ConversionPlan, ConversionPlanner
+from ..services.execution_lanes import LANE_AUDIO, LANE_COPY, LANE_VIDEO, LaneExecutor, default_lane_limits
+from ..services.ffmpeg_runner import ProgressCallback
+from ..services.ffmpeg_wrapper import FFmpegWrapper, get_temp_output_path
 from ..services.file_handler import FileHandler
+from ..services.job_journal import JobJournal, JournalEntry
+from ..services.job_metrics import JobMetrics, MetricsRegistry, job_metrics_scope
+from ..services.media_probe import MediaInfo
+from ..services.micro_batch import MicroBatchJob, MicroBatchPolicy, split_batch_future
+from ..services.output_allocator import OutputPathAllocator
+from ..services.progress_aggregator import ProgressAggregator, ProgressSnapshot
 from ..utils.logger import logger
+from ..utils.profiler import record_job as record_profiled_job
 from ..utils.config_loader import config
 
 class ConverterController:
@@ -10,9 +27,51 @@ class ConverterController:
     def __init__(self):
         self.ffmpeg = FFmpegWrapper()
         self.file_handler = FileHandler()
+        self.planner = ConversionPlanner()
         self.progress_callback: Optional[Callable[[str, float], None]] = None
         self.quality_preset = "normal"  # デフォルトの品質設定
         self.overwrite_mode = False  # デフォルトは安全モード
+        self.follow_symlinks = False  # ディレクトリの走査でシンボリックリンクをたどるか
+        self.normalize_loudness = bool(config.get_loudness_settings().get("enabled", False))  # MP3/WAVのラウドネス正規化
+        self.micro_batch = MicroBatchPolicy(config.get_micro_batch_settings())  # 短いファイルをまとめて変換
+        self.max_workers = self._get_default_max_workers()
+        self.progress = ProgressAggregator()
+        self.conversion_cache = self._create_conversion_cache()
+        self.journal: Optional[JobJournal] = None
+        self.scheduler = BatchScheduler(config.resolve_path(config.get_cache_settings()["scheduler_stats_path"]))
+        self._lanes: Optional[LaneExecutor] = None
+        self.metrics = MetricsRegistry()
+        self._lanes_lock = threading.Lock()
+
+    def _create_conversion_cache(self) -> Optional[ConversionCache]:
+        """設定で有効な場合のみ変換キャッシュを作成"""
+        settings = config.get_cache_settings()
+        if not settings.get("conversion_cache_enabled", False):
+            return None
+        try:
+            return ConversionCache(
+                config.resolve_path(settings["conversion_cache_dir"]),
+                int(settings["conversion_cache_max_size_mb"]),
+                bool(settings["conversion_cache_use_hardlinks"])
+            )
+        except Exception as e:
+            logger.warning("変換キャッシュを開けませんでした。キャッシュ無しで続行します: {}", e)
+            return None
+
+    def _get_default_max_workers(self) -> int:
+        """設定から並列数を取得（0または未設定の場合はCPUコア数）"""
+        max_workers = config.get_app_settings().get("max_workers", 0)
+        if not max_workers or max_workers < 1:
+            max_workers = os.cpu_count() or 1
+        return max_workers
+
+    def get_progress(self) -> ProgressSnapshot:
+        """現在の進捗（見積もりの処理時間で重み付けした全体の進捗、変換中のジョブ、レーンごとの速度と残り時間）"""
+        return self.progress.snapshot()
+
+    def get_eta_seconds(self) -> Optional[float]:
+        """実行中のバッチの残り時間の見込み（秒）"""
+        return self.progress.snapshot().eta_seconds
 
     def set_progress_callback(self, callback: Callable[[str, float], None]) -> None:
         """進捗コールバックを設定"""
@@ -26,64 +85,990 @@ class ConverterController:
         """上書きモードを設定"""
         self.overwrite_mode = overwrite_mode
 
-    def convert_files(self, file_paths: List[str], output_format: str) -> List[Dict[str, str]]:
-        """複数のファイルを変換"""
-        results = []
+    def set_follow_symlinks(self, follow_symlinks: bool) -> None:
+        """ディレクトリの走査でシンボリックリンクをたどるかを設定"""
+        self.follow_symlinks = follow_symlinks
+
+    def set_loudness_normalization(self, enabled: bool) -> None:
+        """MP3/WAVの出力をラウドネス正規化するかを設定"""
+        self.normalize_loudness = enabled
+
+    def set_micro_batching(self, enabled: bool) -> None:
+        """convert_filesで短いファイルをまとめて変換するかを設定"""
+        self.micro_batch.enabled = enabled
+
+    def set_max_workers(self, max_workers: int) -> None:
+        """同時に実行する変換ジョブ数を設定"""
+        if max_workers < 1:
+            raise ValueError(f"並列数は1以上を指定してください: {max_workers}")
+        self.max_workers = max_workers
+        with self._lanes_lock:
+            lanes, self._lanes = self._lanes, None
+        if lanes is not None:
+            # 実行中のバッチは古いレーンでそのまま完了させる
+            lanes.shutdown(wait=False)
+
+    def set_journal(self, journal: Optional[JobJournal]) -> None:
+        """ジョブジャーナルを設定（iter_convert/iter_convert_multiで完了済みのジョブを飛ばす）"""
+        self.journal = journal
+
+    def convert_files(
+        self,
+        file_paths: List[str],
+        output_format: str,
+        on_invalid: Optional[Callable[[str, str], None]] = None,
+        limit_files: bool = True
+    ) -> List[Dict[str, str]]:
+        """複数のファイルを並列で変換（結果は入力順に返す）
+
+        on_invalidには検証で除外したファイルが通知される。
+        limit_files=False の場合は設定の最大ファイル数（app.max_files）で打ち切らない。
+        """
+        validation_timings: Dict[str, float] = {}
+        valid_files = self.file_handler.validate_files(file_paths, validation_timings, on_invalid, limit_files)
+        total_files = len(valid_files)
+        if total_files == 0:
+            return []
+
+        # 出力パスは並列実行前に決定し、同一バッチ内での名前の衝突を防ぐ
+        allocator = OutputPathAllocator()
+        output_paths = [
+            self._allocate_output_path(file_path, output_format, allocator)
+            for file_path in valid_files
+        ]
+
+        self.progress.start_batch(total_files)
+        max_workers = min(self.max_workers, total_files)
+        self.ffmpeg.governor.set_expected_jobs(max_workers)
+        logger.info("{}個のファイルを最大{}並列で変換します", total_files, max_workers)
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="converter") as executor:
+            cache_keys = self._get_cache_keys(executor, valid_files, output_format)
+            probe_results = list(executor.map(self._timed_probe, valid_files))
+        media_infos = [media_info for media_info, _ in probe_results]
+        job_metrics = [
+            self._new_job_metrics(file_path, media_info, validation_timings.get(file_path), probe_seconds)
+            for file_path, (media_info, probe_seconds) in zip(valid_files, probe_results)
+        ]
+
+        # 処理時間の長いものから実行し、最後に長いジョブが残らないようにする
+        cost_keys = [self._cost_key(media_info, output_format) for media_info in media_infos]
+        schedule = self.scheduler.order([
+            ScheduledJob(i, [cost_keys[i]], media_infos[i].duration if media_infos[i] else None)
+            for i in range(total_files)
+        ])
+
+        lanes = self._get_lanes()
+        # 同じ内容・同じ設定のファイルは最初の1件だけ変換し、残りはその結果を再利用する
+        leaders: Dict[str, int] = {}
+        duplicates: Dict[int, List[int]] = {}
+        futures: Dict[int, Future] = {}
+        with lanes.holding():
+            to_convert: List[int] = []
+            for job in schedule:
+                i = job.index
+                file_path, cache_key = valid_files[i], cache_keys[i]
+                if cache_key is not None and cache_key in leaders:
+                    duplicates[leaders[cache_key]].append(i)
+                    # 重複ファイルは変換結果のコピーのみ
+                    self.progress.plan_job(i + 1, file_path, LANE_COPY, self.scheduler.estimate("copy", None), None)
+                    continue
+                lane = self._lane_of(cost_keys[i])
+                self.progress.plan_job(i + 1, file_path, lane, job.estimated_cost, job.duration)
+                if cache_key is not None:
+                    leaders[cache_key] = i
+                    duplicates[i] = []
+                to_convert.append(i)
+
+            # 短いファイルはまとめて1回のFFmpegで変換する（グループの先頭の順番でまとめて投入）
+            batches = {
+                group[0]: group for group in self.micro_batch.group(
+                    [i for i in to_convert if self._can_micro_batch(cost_keys[i], media_infos[i], job_metrics[i])],
+                    max_workers
+                )
+            }
+            batched = {i for group in batches.values() for i in group}
+            for i in to_convert:
+                if i in batches:
+                    group = batches[i]
+                    batch_jobs = []
+                    for j in group:
+                        job_metrics[j].submitted_at = time.monotonic()
+                        batch_jobs.append(MicroBatchJob(
+                            j + 1, valid_files[j], output_paths[j], media_infos[j], job_metrics[j], cache_keys[j]
+                        ))
+                    batch_future = lanes.submit(
+                        LANE_AUDIO, self._convert_micro_batch, batch_jobs, output_format, total_files
+                    )
+                    futures.update(zip(group, split_batch_future(batch_future, len(group))))
+                    continue
+                if i in batched:
+                    continue
+                job_metrics[i].submitted_at = time.monotonic()
+                futures[i] = lanes.submit(
+                    self._lane_of(cost_keys[i]), self._convert_file, valid_files[i], output_format, output_paths[i],
+                    i + 1, total_files, cache_keys[i], media_infos[i], job_metrics[i]
+                )
+
+        results: List[Optional[Dict[str, Any]]] = [None] * total_files
+        duplicate_futures: Dict[int, Future] = {}
+        for i, future in sorted(futures.items()):
+            results[i] = future.result()
+            for duplicate_index in duplicates.get(i, []):
+                duplicate_futures[duplicate_index] = lanes.submit(
+                    LANE_COPY, self._reuse_result, results[i], valid_files[duplicate_index],
+                    output_paths[duplicate_index], duplicate_index + 1, total_files
+                )
+        for i, future in duplicate_futures.items():
+            results[i] = future.result()
+
+        allocator.release_unused()
+        self._log_cache_stats()
+        self._export_metrics()
+        self.scheduler.save()
+        return results
+
+    def iter_convert(
+        self,
+        file_paths: Iterable[str],
+        output_format: str,
+        on_invalid: Optional[Callable[[str, str], None]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """件数の制限なくファイルを変換し、結果を入力順に逐次返す
+
+        入力は必要な分だけ読み進めるため、巨大なファイル一覧やジェネレータも扱える。
+        ディレクトリを渡すと再帰的に走査し、見つかったファイルから順に変換を始める。
+        同一バッチ内の重複排除は行わない（変換キャッシュは使用する）。
+        on_invalidには検証で除外したファイルが通知される。
+        """
+        allocator = OutputPathAllocator()
+        encode_params = self.get_encode_params(output_format)
+        self.progress.start_batch(0)
+
+        def prepare(file_path: str) -> Union[str, Exception]:
+            return self._allocate_output_path(file_path, output_format, allocator)
+
+        def convert(file_path: str, output_path: Union[str, Exception], index: int) -> Dict[str, Any]:
+            cache_key = self._get_cache_key(file_path, encode_params)
+            return self._convert_file(file_path, output_format, output_path, index, 0, cache_key)
+
+        def skipped(file_path: str, entry: JournalEntry) -> Dict[str, Any]:
+            return self._skipped_result(file_path, entry.output_paths[0], output_format)
+
+        journal_params = dict(encode_params, overwrite_mode=self.overwrite_mode)
+        prepare, convert = self._with_journal(journal_params, prepare, convert, lambda output_path: [output_path], skipped)
+        valid_files = self.file_handler.iter_input_files(file_paths, on_invalid, self.follow_symlinks)
+        yield from self._iter_ordered(valid_files, prepare, convert, self._lane_of_format(output_format))
+        allocator.release_unused()
+        self._log_cache_stats()
+        self._export_metrics()
+        self.scheduler.save()
+
+    def iter_convert_multi(
+        self,
+        file_paths: Iterable[str],
+        targets: List[Dict[str, str]],
+        on_invalid: Optional[Callable[[str, str], None]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """iter_convertの複数形式版（1回のデコードで各ファイルを複数の形式に変換）"""
+        targets = self._normalize_targets(targets)
+        allocator = OutputPathAllocator()
+        self.progress.start_batch(0)
+
+        def prepare(file_path: str) -> List[Dict[str, Any]]:
+            return self._plan_multi_outputs(file_path, targets, allocator)
+
+        def convert(file_path: str, outputs: List[Dict[str, Any]], index: int) -> List[Dict[str, Any]]:
+            return self._convert_file_multi(file_path, outputs, index, 0)
+
+        def skipped(file_path: str, entry: JournalEntry) -> List[Dict[str, Any]]:
+            return [
+                dict(self._skipped_result(file_path, output_path, target["format"]),
+                     quality_preset=target["quality_preset"])
+                for target, output_path in zip(targets, entry.output_paths)
+            ]
+
+        def output_paths_of(outputs: List[Dict[str, Any]]) -> List[Union[str, Exception]]:
+            return [output["output_path"] for output in outputs]
+
+        journal_params = {"targets": targets, "overwrite_mode": self.overwrite_mode}
+        if self.normalize_loudness:
+            journal_params["loudness"] = config.get_loudness_settings()
+        prepare, convert = self._with_journal(journal_params, prepare, convert, output_paths_of, skipped)
+        valid_files = self.file_handler.iter_input_files(file_paths, on_invalid, self.follow_symlinks)
+        try:
+            for results in self._iter_ordered(valid_files, prepare, convert, self._lane_of_targets(targets)):
+                yield from results
+        finally:
+            # 途中で中断された場合も、学習した見積もり係数と計測結果は残す
+            allocator.release_unused()
+            self._log_cache_stats()
+            self._export_metrics()
+            self.scheduler.save()
+
+    def _iter_ordered(
+        self,
+        file_paths: Iterable[str],
+        prepare: Callable[[str], Any],
+        convert: Callable[[str, Any, int], Any],
+        lane: str = LANE_AUDIO
+    ) -> Iterator[Any]:
+        """実行レーンでconvertを実行し、結果を入力順に返す
+
+        prepare（出力パスの割り当てなど）は入力順に決まるように呼び出し側のスレッドで行う。
+        実行中・待機中のジョブは並列数の2倍までに抑え、入力を先読みしすぎないようにする。
+        """
+        window = self.max_workers * 2
+        pending: Deque[Future] = deque()
+        lanes = self._get_lanes()
+        try:
+            for index, file_path in enumerate(file_paths, 1):
+                # 総数が分からないため、実行待ちの件数から同時実行数を見込む
+                self.ffmpeg.governor.set_expected_jobs(min(len(pending) + 1, self.max_workers))
+                pending.append(lanes.submit(lane, convert, file_path, prepare(file_path), index))
+                while len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            # 途中で中断された場合、まだ開始していないジョブは取り消す
+            for future in pending:
+                future.cancel()
+
+    def _get_lanes(self) -> LaneExecutor:
+        """動画・音声・ストリームコピーのレーンを持つエグゼキューターを取得（初回に作成）
+
+        同時に実行される複数のバッチで共有し、動画のバッチの実行中でも音声のジョブは音声レーンで進める。
+        再エンコードの同時実行数の合計は並列数までとし、ストリームコピーのレーンは別枠とする。
+        """
+        with self._lanes_lock:
+            if self._lanes is None:
+                limits = default_lane_limits(self.max_workers, config.get_execution_lane_settings())
+                logger.info("実行レーンを作成しました: {}", limits)
+                self._lanes = LaneExecutor(limits, max_total=self.max_workers, thread_name_prefix="converter")
+            return self._lanes
+
+    def _lane_of(self, cost_key: str) -> str:
+        """変換方法（スケジューラーの係数のキー）から実行レーンを決める"""
+        if cost_key == "copy":
+            return LANE_COPY
+        if cost_key.startswith("mp4"):
+            return LANE_VIDEO
+        return LANE_AUDIO
+
+    def _lane_of_format(self, output_format: str) -> str:
+        """プローブ前に決める実行レーン（変換方法はプローブするまで分からないため、出力形式で決める）"""
+        return LANE_VIDEO if output_format == "mp4" else LANE_AUDIO
+
+    def _lane_of_targets(self, targets: List[Dict[str, Any]]) -> str:
+        """複数形式への変換の実行レーン（MP4を含む場合は動画レーン）"""
+        return LANE_VIDEO if any(target["format"] == "mp4" for target in targets) else LANE_AUDIO
+
+    def _with_journal(
+        self,
+        params: Dict[str, Any],
+        prepare: Callable[[str], Any],
+        convert: Callable[[str, Any, int], Any],
+        output_paths_of: Callable[[Any], List[Union[str, Exception]]],
+        skipped: Callable[[str, JournalEntry], Any]
+    ) -> Tuple[Callable[[str], Any], Callable[[str, Any, int], Any]]:
+        """prepare/convertにジョブジャーナルへの記録を組み込む（ジャーナル未設定ならそのまま返す）
+
+        完了済みのジョブは出力パスを割り当てずに前回の結果を返し、
+        それ以外は実行前に出力先と一時ファイルを記録して、終了後に成否を記録する。
+        """
+        journal = self.journal
+        if journal is None:
+            return prepare, convert
+
+        def journaled_prepare(file_path: str) -> Tuple[str, Optional[JournalEntry], Any]:
+            job_key = journal.make_key(file_path, params)
+            completed = journal.find_completed(job_key)
+            if completed is not None:
+                return job_key, completed, None
+            prepared = prepare(file_path)
+            output_paths = [path for path in output_paths_of(prepared) if isinstance(path, str)]
+            temp_paths = [f"{path}{suffix}" for path in output_paths for suffix in (".cache_tmp", ".segments")]
+            temp_paths.extend(filter(None, (get_temp_output_path(file_path, path) for path in output_paths)))
+            journal.mark_queued(job_key, file_path, params, output_paths, temp_paths)
+            return job_key, None, prepared
+
+        def journaled_convert(file_path: str, job: Tuple[str, Optional[JournalEntry], Any], index: int) -> Any:
+            job_key, completed, prepared = job
+            if completed is not None:
+                logger.info("ジャーナルで完了済みのためスキップします: {}", file_path)
+                self._finish_file(index, 0)
+                return skipped(file_path, completed)
+
+            journal.mark_running(job_key)
+            result = convert(file_path, prepared, index)
+            errors = [r.get("error", "") for r in (result if isinstance(result, list) else [result])
+                      if r["status"] != "success"]
+            if errors:
+                journal.mark_failed(job_key, errors[0])
+            else:
+                journal.mark_done(job_key)
+            return result
+
+        return journaled_prepare, journaled_convert
+
+    def _skipped_result(self, file_path: str, output_path: str, output_format: str) -> Dict[str, Any]:
+        """ジャーナルで完了済みのジョブの結果"""
+        return {
+            "input_path": file_path,
+            "output_path": output_path,
+            "new_format": output_format,
+            "skipped": True,
+            "status": "success"
+        }
+
+    def _export_metrics(self) -> None:
+        """ジョブの計測結果の集計を設定されたファイルに書き出す"""
+        settings = config.get_metrics_settings()
+        self.metrics.write(
+            config.resolve_path(settings["prometheus_path"]) if settings.get("prometheus_path") else None,
+            config.resolve_path(settings["json_path"]) if settings.get("json_path") else None
+        )
+
+    def _log_cache_stats(self) -> None:
+        """キャッシュのヒット率をログに出力"""
+        if self.conversion_cache is not None:
+            stats = self.conversion_cache.stats()
+            logger.info("変換キャッシュ: ヒット {}件 / ミス {}件", stats['hits'], stats['misses'])
+        if self.ffmpeg.prober.cache is not None:
+            self.ffmpeg.prober.cache.flush()
+            stats = self.ffmpeg.prober.cache.stats()
+            logger.info("プローブキャッシュ: ヒット {}件 / ミス {}件", stats['hits'], stats['misses'])
+        if self.normalize_loudness and self.ffmpeg.normalizer.cache is not None:
+            stats = self.ffmpeg.normalizer.cache.stats()
+            logger.info("ラウドネスキャッシュ: ヒット {}件 / ミス {}件", stats['hits'], stats['misses'])
+
+    def _allocate_output_path(
+        self,
+        file_path: str,
+        output_format: str,
+        allocator: OutputPathAllocator,
+        variant: Optional[str] = None
+    ) -> Union[str, Exception]:
+        """出力パスを決めて確保（失敗した場合は例外をそのまま返し、ファイル単位のエラーにする）
+
+        安全モードではallocatorが空のファイルを作成して名前を確保する。
+        上書きモードでは元のファイルと同じ名前のため確保は不要。
+        """
+        try:
+            if self.overwrite_mode:
+                return self.file_handler.get_output_path(file_path, output_format, True, variant=variant)
+            return allocator.allocate(file_path, output_format, variant)
+        except Exception as e:
+            logger.error("出力パスの割り当てに失敗しました: {}: {}", file_path, e)
+            return e
+
+    def convert_files_multi(
+        self,
+        file_paths: List[str],
+        targets: List[Dict[str, str]]
+    ) -> List[Dict[str, Any]]:
+        """1回のデコードで各ファイルを複数の形式に変換
+
+        targets の各要素は {"format": "mp3"} や {"format": "mp4", "quality_preset": "high_compression"}。
+        結果は入力ファイル順・targets順に、出力ごとに1件ずつ返す。
+        """
+        targets = self._normalize_targets(targets)
         valid_files = self.file_handler.validate_files(file_paths)
         total_files = len(valid_files)
+        if total_files == 0 or not targets:
+            return []
 
-        for i, file_path in enumerate(valid_files, 1):
-            try:
-                # 進捗を更新
-                if self.progress_callback:
-                    progress = (i - 1) / total_files * 100
-                    self.progress_callback(f"ファイルを処理中 ({i}/{total_files}): {file_path}", progress)
+        allocator = OutputPathAllocator()
+        jobs = [self._plan_multi_outputs(file_path, targets, allocator) for file_path in valid_files]
 
-                # ファイル情報を取得
-                file_info = self.ffmpeg.get_audio_info(file_path)
+        self.progress.start_batch(total_files)
+        max_workers = min(self.max_workers, total_files)
+        self.ffmpeg.governor.set_expected_jobs(max_workers)
+        logger.info("{}個のファイルを{}形式に最大{}並列で変換します", total_files, len(targets), max_workers)
 
-                # 動画ファイルかどうかに基づいて進捗メッセージを更新
-                if file_info.get("is_video", False) and self.progress_callback:
-                    if output_format == "mp4":
-                        self.progress_callback(f"動画ファイルを変換中 ({i}/{total_files}): {file_path}", progress)
-                    else:
-                        self.progress_callback(f"動画ファイルから音声を抽出中 ({i}/{total_files}): {file_path}", progress)
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="converter") as executor:
+            probe_results = list(executor.map(self._timed_probe, valid_files))
+        media_infos = [media_info for media_info, _ in probe_results]
+        job_metrics = [
+            self._new_job_metrics(file_path, media_info, probe_seconds=probe_seconds)
+            for file_path, (media_info, probe_seconds) in zip(valid_files, probe_results)
+        ]
+        schedule = self.scheduler.order([
+            ScheduledJob(
+                i,
+                [self.scheduler.cost_key(target["format"], target["quality_preset"]) for target in targets],
+                media_infos[i].duration if media_infos[i] else None
+            )
+            for i in range(total_files)
+        ])
+        lane = self._lane_of_targets(targets)
+        for job in schedule:
+            self.progress.plan_job(job.index + 1, valid_files[job.index], lane, job.estimated_cost, job.duration)
 
-                # 出力パスを生成（上書きモード設定を使用）
-                output_path = self.file_handler.get_output_path(file_path, output_format, self.overwrite_mode)
+        lanes = self._get_lanes()
+        futures: Dict[int, Future] = {}
+        with lanes.holding():
+            for job in schedule:
+                job_metrics[job.index].submitted_at = time.monotonic()
+                futures[job.index] = lanes.submit(
+                    lane, self._convert_file_multi, valid_files[job.index], jobs[job.index],
+                    job.index + 1, total_files, media_infos[job.index], job_metrics[job.index]
+                )
+        results = []
+        for i in range(total_files):
+            results.extend(futures[i].result())
+        allocator.release_unused()
+        self._export_metrics()
+        self.scheduler.save()
+        return results
 
-                # 変換を実行（動画変換 vs 音声変換）
-                if output_format == "mp4":
-                    converted_path = self.ffmpeg.convert_video(file_path, output_format, output_path, self.quality_preset)
-                else:
-                    converted_path = self.ffmpeg.convert_audio(file_path, output_format, output_path)
+    def _normalize_targets(self, targets: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+        """出力先の指定を正規化（MP4で品質設定が無ければ現在の設定を使う）"""
+        return [
+            {
+                "format": target["format"],
+                "quality_preset": target.get("quality_preset", self.quality_preset) if target["format"] == "mp4" else None
+            }
+            for target in targets
+        ]
+
+    def _plan_multi_outputs(
+        self,
+        file_path: str,
+        targets: List[Dict[str, Any]],
+        allocator: OutputPathAllocator
+    ) -> List[Dict[str, Any]]:
+        """1ファイル分の出力先一覧を作成"""
+        # 同じ形式を複数出力する場合は品質設定名をファイル名に付けて区別する
+        format_counts: Dict[str, int] = {}
+        for target in targets:
+            format_counts[target["format"]] = format_counts.get(target["format"], 0) + 1
+
+        outputs = []
+        for target in targets:
+            variant = target["quality_preset"] if format_counts[target["format"]] > 1 else None
+            output_path = self._allocate_output_path(file_path, target["format"], allocator, variant)
+            outputs.append(dict(target, output_path=output_path))
+        return outputs
 
-                # 結果を記録
-                results.append({
+    def _convert_file_multi(
+        self,
+        file_path: str,
+        outputs: List[Dict[str, Any]],
+        index: int,
+        total_files: int,
+        media_info: Optional[MediaInfo] = None,
+        metrics: Optional[JobMetrics] = None
+    ) -> List[Dict[str, Any]]:
+        """1ファイルを複数形式に変換し、出力ごとの結果を返す（ワーカースレッドで実行）
+
+        media_infoを渡した場合はプローブを省略する。FFmpegの実行は1回のため、処理時間の内訳（"metrics"）は
+        全出力で共通の値とし、集計には出力形式をまとめたラベル（例: mp3+mp4）で1ジョブとして加える。
+        """
+        started = time.monotonic()
+        if metrics is None:
+            metrics = self._new_job_metrics(file_path, media_info)
+        metrics.mark_started()
+        try:
+            for output in outputs:
+                if isinstance(output["output_path"], Exception):
+                    raise output["output_path"]
+
+            self._start_file(file_path, index, total_files, self._lane_of_targets(outputs))
+
+            if media_info is None:
+                media_info, metrics.probe_seconds = self._timed_probe(file_path, raise_errors=True)
+            if media_info is None:
+                raise RuntimeError(f"ファイル情報が取得できないため複数形式に変換できません: {file_path}")
+            metrics.media_duration = media_info.duration
+            file_info = media_info.to_info_dict()
+
+            file_progress = self._make_file_progress_callback(file_path, index, total_files)
+            encode_started = time.monotonic()
+            with job_metrics_scope(metrics):
+                self.ffmpeg.convert_multi(
+                    file_path, outputs, media_info.has_audio, media_info.has_video,
+                    media_info.duration, file_progress, self.normalize_loudness
+                )
+            metrics.finish_encode(time.monotonic() - encode_started, None)
+            metrics.output_bytes = sum(os.path.getsize(output["output_path"]) for output in outputs)
+            # 実際にかかった時間から、各出力形式の見積もり係数を学習
+            self.scheduler.record_combined(
+                [self.scheduler.cost_key(output["format"], output["quality_preset"]) for output in outputs],
+                media_info.duration, time.monotonic() - started
+            )
+
+            results = [
+                {
                     "input_path": file_path,
-                    "output_path": converted_path,
+                    "output_path": output["output_path"],
                     "original_format": file_info["format"],
-                    "new_format": output_format,
+                    "new_format": output["format"],
+                    "quality_preset": output["quality_preset"],
                     "original_info": file_info,
+                    "conversion_mode": "transcode",
                     "status": "success"
-                })
-
-                # 最終進捗を更新
-                if self.progress_callback:
-                    progress = i / total_files * 100
-                    self.progress_callback(f"ファイルの変換が完了しました ({i}/{total_files})", progress)
+                }
+                for output in outputs
+            ]
 
-            except Exception as e:
-                logger.error(f"ファイルの変換中にエラーが発生しました: {str(e)}")
-                results.append({
+        except Exception as e:
+            logger.error("ファイルの変換中にエラーが発生しました: {}", e)
+            results = [
+                {
                     "input_path": file_path,
+                    "new_format": output["format"],
+                    "quality_preset": output["quality_preset"],
                     "error": str(e),
                     "status": "error"
-                })
-                continue
+                }
+                for output in outputs
+            ]
 
+        metrics.finish_job(time.monotonic() - started)
+        metrics_dict = metrics.to_dict()
+        for result in results:
+            result["metrics"] = dict(metrics_dict)
+        presets = [output["quality_preset"] for output in outputs if output["quality_preset"]]
+        self.metrics.observe(
+            "+".join(output["format"] for output in outputs), ",".join(presets) or None,
+            results[0]["status"] if results else "error", metrics
+        )
+        record_profiled_job(file_path, metrics_dict)
+        self._finish_file(index, total_files)
         return results
 
+    def _convert_file(
+        self,
+        file_path: str,
+        output_format: str,
+        output_path: Union[str, Exception],
+        index: int,
+        total_files: int,
+        cache_key: Optional[str] = None,
+        media_info: Optional[MediaInfo] = None,
+        metrics: Optional[JobMetrics] = None
+    ) -> Dict[str, Any]:
+        """1ファイルを変換し、結果を辞書で返す（ワーカースレッドで実行）
+
+        media_infoを渡した場合はプローブを省略する。処理時間の内訳は結果の"metrics"に入れる。
+        """
+        started = time.monotonic()
+        if metrics is None:
+            metrics = self._new_job_metrics(file_path, media_info)
+        metrics.mark_started()
+        try:
+            if isinstance(output_path, Exception):
+                raise output_path
+
+            # 進捗を更新
+            self._start_file(file_path, index, total_files, self._lane_of_format(output_format))
+
+            # ファイル情報を取得（ffprobeの実行は1ファイル1回）
+            if media_info is None:
+                media_info, metrics.probe_seconds = self._timed_probe(file_path, raise_errors=True)
+                metrics.media_duration = media_info.duration if media_info else None
+            if media_info is not None:
+                file_info = media_info.to_info_dict()
+            else:
+                file_info = self.ffmpeg.get_fallback_info(file_path)
+
+            # 動画ファイルかどうかに基づいて進捗メッセージを更新
+            if file_info.get("is_video", False):
+                if output_format == "mp4":
+                    self._report_progress(f"動画ファイルを変換中 ({index}/{total_files}): {file_path}", total_files)
+                else:
+                    self._report_progress(f"動画ファイルから音声を抽出中 ({index}/{total_files}): {file_path}", total_files)
+
+            # ストリームコピーで済むか判定
+            plan = self.planner.plan(media_info, output_format, self.quality_preset, self.normalize_loudness)
+            logger.info("変換方法: {} ({}): {}", plan.mode, plan.reason, file_path)
+
+            # 同じ内容・同じ設定の変換結果がキャッシュにあればそれを使う
+            encode_started = time.monotonic()
+            cache_hit = cache_key is not None and self.conversion_cache.fetch(cache_key, output_path)
+            if cache_hit:
+                converted_path = output_path
+                metrics.finish_encode(time.monotonic() - encode_started, converted_path)
+            else:
+                file_progress = self._make_file_progress_callback(file_path, index, total_files)
+                with job_metrics_scope(metrics):
+                    converted_path, plan = self._run_conversion(
+                        file_path, output_format, output_path, media_info, plan, file_progress
+                    )
+                metrics.finish_encode(time.monotonic() - encode_started, converted_path)
+                logger.info(
+                    "変換時間: {}秒 (待ち {}秒, {}倍速, CPU {}秒): {}", metrics.encode_seconds,
+                    metrics.queue_wait_seconds, metrics.realtime_factor, metrics.cpu_user_seconds, file_path
+                )
+                if cache_key is not None:
+                    self.conversion_cache.store(cache_key, converted_path)
+                # 実際にかかった時間からスケジューラーの見積もり係数を学習
+                self.scheduler.record(
+                    self._cost_key(media_info, output_format, plan),
+                    media_info.duration if media_info else None,
+                    time.monotonic() - started
+                )
+
+            result = self._success_result(file_path, converted_path, output_format, file_info, cache_hit, plan)
+
+        except Exception as e:
+            logger.error("ファイルの変換中にエラーが発生しました: {}", e)
+            result = {
+                "input_path": file_path,
+                "error": str(e),
+                "status": "error"
+            }
+
+        metrics.finish_job(time.monotonic() - started)
+        result["metrics"] = metrics.to_dict()
+        self.metrics.observe(output_format, self._preset_of(output_format), result["status"], metrics)
+        record_profiled_job(file_path, result["metrics"])
+        self._finish_file(index, total_files)
+        return result
+
+    def _success_result(
+        self,
+        file_path: str,
+        converted_path: str,
+        output_format: str,
+        file_info: Dict[str, Any],
+        cache_hit: bool,
+        plan: ConversionPlan
+    ) -> Dict[str, Any]:
+        """変換に成功したファイルの結果"""
+        return {
+            "input_path": file_path,
+            "output_path": converted_path,
+            "original_format": file_info["format"],
+            "new_format": output_format,
+            "original_info": file_info,
+            "cache_hit": cache_hit,
+            "conversion_mode": plan.mode,
+            "conversion_reason": plan.reason,
+            "status": "success"
+        }
+
+    def _can_micro_batch(self, cost_key: str, media_info: Optional[MediaInfo], metrics: JobMetrics) -> bool:
+        """まとめて変換できるか（音声の再エンコードで、短く小さいファイルのみ）
+
+        ラウドネス正規化はファイルごとに解析が必要なため、まとめずに1ファイルずつ変換する。
+        """
+        if self.normalize_loudness or self._lane_of(cost_key) != LANE_AUDIO:
+            return False
+        return self.micro_batch.is_eligible(media_info, metrics.input_bytes)
+
+    def _convert_micro_batch(
+        self,
+        jobs: List[MicroBatchJob],
+        output_format: str,
+        total_files: int
+    ) -> List[Dict[str, Any]]:
+        """短いファイルをまとめて1回のFFmpegで変換し、ファイルごとの結果をjobsの順に返す（ワーカースレッドで実行）
+
+        まとめた変換に失敗した場合は、どのファイルが原因かを結果に反映するため1ファイルずつ変換し直す。
+        変換キャッシュにあるファイルはキャッシュから配置し、まとめる対象から外す。
+        """
+        results: Dict[int, Dict[str, Any]] = {}
+        batch: List[MicroBatchJob] = []
+        for job in jobs:
+            if isinstance(job.output_path, Exception):
+                # 出力パスの割り当てに失敗したファイルはエラーの結果にする
+                results[job.index] = self._convert_file(
+                    job.file_path, output_format, job.output_path, job.index, total_files,
+                    job.cache_key, job.media_info, job.metrics
+                )
+                continue
+            job.metrics.mark_started()
+            self._start_file(job.file_path, job.index, total_files, self._lane_of_format(output_format))
+            fetch_started = time.monotonic()
+            if job.cache_key is not None and self.conversion_cache.fetch(job.cache_key, job.output_path):
+                plan = self.planner.plan(job.media_info, output_format, self.quality_preset, self.normalize_loudness)
+                results[job.index] = self._finish_micro_batch_job(
+                    job, output_format, plan, time.monotonic() - fetch_started, total_files, cache_hit=True
+                )
+            else:
+                batch.append(job)
+
+        if batch:
+            started = time.monotonic()
+            try:
+                self.ffmpeg.convert_audio_batch(
+                    [(job.file_path, job.output_path) for job in batch], output_format,
+                    max(job.media_info.duration for job in batch),
+                    self._make_batch_progress_callback(batch, total_files)
+                )
+            except Exception as e:
+                logger.warning("まとめた変換に失敗したため1ファイルずつ変換します: {}", e)
+                for job in batch:
+                    results[job.index] = self._convert_file(
+                        job.file_path, output_format, job.output_path, job.index, total_files,
+                        job.cache_key, job.media_info, job.metrics
+                    )
+            else:
+                elapsed = time.monotonic() - started
+                plan = ConversionPlan("transcode", f"短いファイル{len(batch)}件をまとめて変換")
+                for job in batch:
+                    results[job.index] = self._finish_micro_batch_job(
+                        job, output_format, plan, elapsed / len(batch), total_files
+                    )
+                    results[job.index]["micro_batch_size"] = len(batch)
+
+        return [results[job.index] for job in jobs]
+
+    def _finish_micro_batch_job(
+        self,
+        job: MicroBatchJob,
+        output_format: str,
+        plan: ConversionPlan,
+        encode_seconds: float,
+        total_files: int,
+        cache_hit: bool = False
+    ) -> Dict[str, Any]:
+        """まとめて変換したファイルの結果を記録（エンコード時間はまとめた件数で等分した値）
+
+        まとめた実行の時間は1ファイルの変換時間を表さないため、スケジューラーの学習には使わない。
+        """
+        job.metrics.finish_encode(encode_seconds, job.output_path)
+        if job.cache_key is not None and not cache_hit:
+            self.conversion_cache.store(job.cache_key, job.output_path)
+        result = self._success_result(
+            job.file_path, job.output_path, output_format, job.media_info.to_info_dict(), cache_hit, plan
+        )
+        job.metrics.finish_job(encode_seconds)
+        result["metrics"] = job.metrics.to_dict()
+        self.metrics.observe(output_format, None, "success", job.metrics)
+        record_profiled_job(job.file_path, result["metrics"])
+        self._finish_file(job.index, total_files)
+        return result
+
+    def _run_conversion(
+        self,
+        file_path: str,
+        output_format: str,
+        output_path: str,
+        media_info: Optional[MediaInfo],
+        plan: ConversionPlan,
+        progress_callback: ProgressCallback
+    ) -> Tuple[str, ConversionPlan]:
+        """判定に従って変換を実行（ストリームコピーに失敗した場合は再エンコード）"""
+        duration = media_info.duration if media_info else None
+        if plan.stream_copy:
+            try:
+                return self._convert_with(
+                    file_path, output_format, output_path, duration, progress_callback, True
+                ), plan
+            except Exception as e:
+                logger.warning("ストリームコピーに失敗したため再エンコードします: {}: {}", file_path, e)
+                plan = ConversionPlan("transcode", "ストリームコピーに失敗したため")
+        return self._convert_with(
+            file_path, output_format, output_path, duration, progress_callback, False
+        ), plan
+
+    def _convert_with(
+        self,
+        file_path: str,
+        output_format: str,
+        output_path: str,
+        duration: Optional[float],
+        progress_callback: ProgressCallback,
+        stream_copy: bool
+    ) -> str:
+        """変換を実行（動画変換 vs 音声変換）"""
+        if output_format == "mp4":
+            return self.ffmpeg.convert_video(
+                file_path, output_format, output_path, self.quality_preset,
+                duration, progress_callback, stream_copy
+            )
+        return self.ffmpeg.convert_audio(
+            file_path, output_format, output_path, duration, progress_callback, stream_copy,
+            self.normalize_loudness
+        )
+
+    def _reuse_result(
+        self,
+        source_result: Dict[str, Any],
+        file_path: str,
+        output_path: Union[str, Exception],
+        index: int,
+        total_files: int
+    ) -> Dict[str, Any]:
+        """同一バッチ内で内容が重複するファイルに、変換済みの結果を配置する"""
+        try:
+            if isinstance(output_path, Exception):
+                raise output_path
+            if source_result["status"] != "success":
+                raise RuntimeError(f"重複元ファイルの変換に失敗しました: {source_result['input_path']}")
+
+            link_or_copy(source_result["output_path"], output_path, self.conversion_cache.use_hardlinks)
+            logger.info("重複ファイルの変換結果を再利用しました: {} -> {}", file_path, output_path)
+            result = dict(source_result)
+            metrics = self._new_job_metrics(file_path, None)
+            metrics.output_bytes = os.path.getsize(output_path)
+            result.update({
+                "input_path": file_path,
+                "output_path": output_path,
+                "cache_hit": True,
+                "duplicate_of": source_result["input_path"],
+                "metrics": metrics.to_dict()
+            })
+
+        except Exception as e:
+            logger.error("ファイルの変換中にエラーが発生しました: {}", e)
+            result = {
+                "input_path": file_path,
+                "error": str(e),
+                "status": "error"
+            }
+
+        self._finish_file(index, total_files)
+        return result
+
+    def _start_file(self, file_path: str, index: int, total_files: int, lane: str = LANE_AUDIO) -> None:
+        """ファイルの処理の開始を進捗に記録（laneは事前に登録していないジョブの実行レーン）"""
+        self.progress.start_job(index, file_path, lane)
+        self._report_progress(f"ファイルを処理中 ({index}/{total_files}): {file_path}", total_files)
+
+    def _finish_file(self, index: int, total_files: int) -> None:
+        """完了数を更新して全体の進捗を通知"""
+        completed = self.progress.finish_job(index)
+        self._report_progress(f"ファイルの変換が完了しました ({completed}/{total_files})", total_files)
+
+    def _new_job_metrics(
+        self,
+        file_path: str,
+        media_info: Optional[MediaInfo],
+        validation_seconds: Optional[float] = None,
+        probe_seconds: Optional[float] = None
+    ) -> JobMetrics:
+        """ジョブの計測を開始（入力サイズと再生時間はこの時点で記録）"""
+        metrics = JobMetrics(
+            validation_seconds=round(validation_seconds, 6) if validation_seconds is not None else None,
+            probe_seconds=round(probe_seconds, 6) if probe_seconds is not None else None,
+            media_duration=media_info.duration if media_info else None
+        )
+        try:
+            metrics.input_bytes = os.path.getsize(file_path)
+        except OSError:
+            pass
+        return metrics
+
+    def _timed_probe(self, file_path: str, raise_errors: bool = False) -> Tuple[Optional[MediaInfo], float]:
+        """プローブしてかかった時間（秒）と合わせて返す"""
+        started = time.perf_counter()
+        if raise_errors:
+            media_info = self.ffmpeg.get_media_info(file_path)
+        else:
+            media_info = self._probe_for_schedule(file_path)
+        return media_info, time.perf_counter() - started
+
+    def _preset_of(self, output_format: str) -> Optional[str]:
+        return self.quality_preset if output_format == "mp4" else None
+
+    def _probe_for_schedule(self, file_path: str) -> Optional[MediaInfo]:
+        """スケジューリング用のプローブ（失敗してもバッチは止めず、変換時に改めて扱う）"""
+        try:
+            return self.ffmpeg.get_media_info(file_path)
+        except Exception as e:
+            logger.warning("ファイル情報を取得できませんでした: {}: {}", file_path, e)
+            return None
+
+    def _cost_key(
+        self,
+        media_info: Optional[MediaInfo],
+        output_format: str,
+        plan: Optional[ConversionPlan] = None
+    ) -> str:
+        """スケジューラーの係数のキー（変換方法が未定の場合は判定してから決める）"""
+        if plan is None:
+            plan = self.planner.plan(media_info, output_format, self.quality_preset, self.normalize_loudness)
+        return self.scheduler.cost_key(output_format, self.quality_preset, plan.stream_copy)
+
+    def get_encode_params(self, output_format: str) -> Dict[str, Any]:
+        """出力結果を決めるエンコード設定（変換キャッシュのキーに使用）"""
+        params = {
+            "format": output_format,
+            "settings": config.get_format_settings(output_format),
+            "quality_preset": self.quality_preset if output_format == "mp4" else None
+        }
+        # 正規化しない場合のキーは従来と同じにして、既存のキャッシュとジャーナルをそのまま使う
+        if self.normalize_loudness and output_format != "mp4":
+            params["loudness"] = config.get_loudness_settings()
+        return params
+
+    def _get_cache_keys(
+        self,
+        executor: ThreadPoolExecutor,
+        file_paths: List[str],
+        output_format: str
+    ) -> List[Optional[str]]:
+        """各ファイルの変換キャッシュキーを並列で計算（キャッシュ無効時は全てNone）"""
+        if self.conversion_cache is None:
+            return [None] * len(file_paths)
+        encode_params = self.get_encode_params(output_format)
+
+        def make_key(file_path: str) -> Optional[str]:
+            return self._get_cache_key(file_path, encode_params)
+
+        return list(executor.map(make_key, file_paths))
+
+    def _get_cache_key(self, file_path: str, encode_params: Dict[str, Any]) -> Optional[str]:
+        """1ファイルの変換キャッシュキーを計算（キャッシュ無効時や計算失敗時はNone）"""
+        if self.conversion_cache is None:
+            return None
+        try:
+            return self.conversion_cache.make_key(file_path, encode_params)
+        except Exception as e:
+            logger.warning("変換キャッシュのキーを計算できませんでした: {}: {}", file_path, e)
+            return None
+
+    def _make_file_progress_callback(self, file_path: str, index: int, total_files: int) -> ProgressCallback:
+        """FFmpegの進捗を全体の進捗に反映するコールバックを生成"""
+        file_name = os.path.basename(file_path)
+
+        def on_progress(progress: Dict[str, Any]) -> None:
+            fraction = progress.get("fraction")
+            self.progress.update_job(index, fraction, progress.get("out_time"), progress.get("speed"))
+            if fraction is not None:
+                detail = f"{fraction * 100:.0f}%"
+            elif progress.get("out_time") is not None:
+                detail = f"{progress['out_time']:.0f}秒"
+            else:
+                return
+            if progress.get("speed"):
+                detail += f" ({progress['speed']:.2f}x)"
+            self._report_progress(f"変換中 ({index}/{total_files}): {file_name} {detail}", total_files)
+
+        return on_progress
+
+    def _make_batch_progress_callback(self, jobs: List[MicroBatchJob], total_files: int) -> ProgressCallback:
+        """まとめた変換の進捗を各ファイルの進捗に反映するコールバックを生成
+
+        FFmpegは最も進んだ出力の位置を報告するため、各ファイルはその位置と自身の長さから割合を求める。
+        """
+        def on_progress(progress: Dict[str, Any]) -> None:
+            out_time = progress.get("out_time")
+            if out_time is None:
+                return
+            for job in jobs:
+                duration = job.media_info.duration
+                fraction = min(out_time / duration, 1.0) if duration else 1.0
+                self.progress.update_job(job.index, fraction, min(out_time, duration or 0.0), progress.get("speed"))
+            self._report_progress(f"短いファイル{len(jobs)}件をまとめて変換中: {out_time:.0f}秒", total_files)
+
+        return on_progress
+
+    def _report_progress(self, message: str, total_files: int) -> None:
+        """進捗のメッセージを記録し、コールバックが設定されていれば全体の進捗を通知
+
+        GUIはコールバックを使わず、self.progressを一定間隔で読み出して描画する。
+        """
+        self.progress.set_message(message)
+        # 総数が分からない逐次変換（iter_convert）では全体の進捗は通知しない
+        if self.progress_callback and total_files > 0:
+            self.progress_callback(message, self.progress.snapshot().percent)
+
     def get_supported_formats(self) -> List[str]:
         """サポートされている出力フォーマットを取得"""
         return ["mp3", "wav", "mp4"]
@@ -0,0 +1,264 @@
+import asyncio
+import os
+import subprocess
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, Optional, Set, Union
+from .ffmpeg_runner import FFmpegRunResult, ProgressCallback, add_progress_args, build_progress
+from .ffmpeg_wrapper import FFmpegWrapper, get_temp_output_path
+from ..utils.logger import logger
+from ..utils.config_loader import config
+
+
+@dataclass
+class AsyncJob:
+    """非同期エンジンで実行する1件の変換ジョブ"""
+    input_path: str
+    output_format: str
+    output_path: str
+    quality_preset: str = "normal"
+    stream_copy: bool = False
+    duration: Optional[float] = None  # 指定すると進捗の割合も通知する
+    timeout: Optional[float] = None   # 秒（Noneの場合はエンジンの既定値）
+
+
+class AsyncConversionEngine:
+    """asyncio上でFFmpegを実行する変換エンジン
+
+    同時実行数の制限、タスクのキャンセル（FFmpegを終了させて一時ファイルを削除）、
+    ジョブごとのタイムアウトに対応する。コマンドはFFmpegWrapperと同じものを使う。
+    """
+
+    def __init__(
+        self,
+        ffmpeg: Optional[FFmpegWrapper] = None,
+        max_concurrency: int = 0,
+        default_timeout: Optional[float] = None,
+        kill_grace_seconds: float = 5.0,
+        stderr_tail_lines: int = 200
+    ):
+        self.ffmpeg = ffmpeg or FFmpegWrapper()
+        app_settings = config.get_app_settings()
+        if max_concurrency < 1:
+            max_concurrency = app_settings.get("max_workers", 0) or os.cpu_count() or 1
+        self.max_concurrency = max_concurrency
+        if default_timeout is None:
+            default_timeout = app_settings.get("job_timeout_seconds", 0) or None
+        self.default_timeout = default_timeout
+        self.kill_grace_seconds = kill_grace_seconds
+        self.stderr_tail_lines = stderr_tail_lines
+        self._semaphores: Dict[asyncio.AbstractEventLoop, asyncio.Semaphore] = {}
+        self._tasks: Set["asyncio.Task[Any]"] = set()
+
+    async def convert(self, job: AsyncJob, progress_callback: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """1件変換して結果を返す
+
+        失敗・タイムアウトはstatusが"error"の結果として返す。
+        タスクがキャンセルされた場合はFFmpegを終了させ、一時ファイルを削除してからCancelledErrorを送出する。
+        """
+        async with self._get_semaphore():
+            started = time.monotonic()
+            actual_output_path = get_temp_output_path(job.input_path, job.output_path) or job.output_path
+            timeout = job.timeout if job.timeout is not None else self.default_timeout
+            try:
+                if not os.path.exists(job.input_path):
+                    raise FileNotFoundError(f"入力ファイルが見つかりません: {job.input_path}")
+                if job.output_format == "mp4":
+                    command = self.ffmpeg.build_video_command(
+                        job.input_path, actual_output_path, job.quality_preset, job.stream_copy
+                    )
+                else:
+                    command = self.ffmpeg.build_audio_command(
+                        job.input_path, job.output_format, actual_output_path, job.stream_copy
+                    )
+
+                logger.info("変換を開始: {} -> {}", job.input_path, job.output_path)
+                result = await self._run(command, timeout, job.duration, progress_callback)
+                if result.returncode != 0:
+                    raise RuntimeError(f"変換中にエラーが発生しました: {result.stderr}")
+                if actual_output_path != job.output_path:
+                    os.replace(actual_output_path, job.output_path)
+
+                logger.info("変換が完了しました: {}", job.output_path)
+                return self._make_result(job, started, status="success", output_path=job.output_path)
+
+            except asyncio.TimeoutError:
+                self._remove_partial_output(job, actual_output_path)
+                logger.error("変換がタイムアウトしました（{}秒）: {}", timeout, job.input_path)
+                return self._make_result(
+                    job, started, status="error", timed_out=True,
+                    error=f"変換がタイムアウトしました（{timeout}秒）"
+                )
+            except asyncio.CancelledError:
+                self._remove_partial_output(job, actual_output_path)
+                logger.warning("変換がキャンセルされました: {}", job.input_path)
+                raise
+            except Exception as e:
+                self._remove_partial_output(job, actual_output_path)
+                logger.error("変換中にエラーが発生しました: {}", e)
+                return self._make_result(job, started, status="error", error=str(e))
+
+    async def iter_results(
+        self,
+        jobs: Union[Iterable[AsyncJob], AsyncIterable[AsyncJob]],
+        progress_callback: Optional[ProgressCallback] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """ジョブを並列で実行し、終わったものから結果を返す
+
+        ジョブは必要な分だけ読み進める（実行中・待機中は同時実行数の2倍まで）。
+        反復を途中でやめた場合や呼び出し側がキャンセルされた場合は、残りのジョブをキャンセルする。
+        """
+        window = self.max_concurrency * 2
+        pending: Set["asyncio.Task[Dict[str, Any]]"] = set()
+        try:
+            async for job in self._iter_jobs(jobs):
+                pending.add(self._start(job, progress_callback))
+                while len(pending) >= window:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield task.result()
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    def cancel_all(self) -> None:
+        """実行中・待機中のジョブをすべてキャンセル（イベントループのスレッドから呼ぶ）
+
+        他のスレッドからは loop.call_soon_threadsafe(engine.cancel_all) で呼び出す。
+        """
+        for task in list(self._tasks):
+            task.cancel()
+
+    def _start(
+        self,
+        job: AsyncJob,
+        progress_callback: Optional[ProgressCallback]
+    ) -> "asyncio.Task[Dict[str, Any]]":
+        """ジョブをタスクとして開始し、cancel_allの対象に登録"""
+        task = asyncio.ensure_future(self.convert(job, progress_callback))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _iter_jobs(self, jobs: Union[Iterable[AsyncJob], AsyncIterable[AsyncJob]]) -> AsyncIterator[AsyncJob]:
+        if hasattr(jobs, "__aiter__"):
+            async for job in jobs:
+                yield job
+        else:
+            for job in jobs:
+                yield job
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """実行中のイベントループ用のセマフォを取得（Python 3.8/3.9ではループごとに作る必要がある）"""
+        loop = asyncio.get_event_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphores = {loop: semaphore}
+        return semaphore
+
+    async def _run(
+        self,
+        command: list,
+        timeout: Optional[float],
+        duration: Optional[float],
+        progress_callback: Optional[ProgressCallback]
+    ) -> FFmpegRunResult:
+        """FFmpegを実行し、タイムアウト・キャンセル時はプロセスを終了させる"""
+        process = await asyncio.create_subprocess_exec(
+            *add_progress_args(command),
+            stdin=subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        stderr_tail: deque = deque(maxlen=self.stderr_tail_lines)
+        try:
+            progress, _, returncode = await asyncio.wait_for(
+                asyncio.gather(
+                    self._read_progress(process.stdout, duration, progress_callback),
+                    self._drain_stderr(process.stderr, stderr_tail),
+                    process.wait()
+                ),
+                timeout
+            )
+        except BaseException:
+            await self._stop_process(process)
+            raise
+        return FFmpegRunResult(returncode, list(stderr_tail), progress)
+
+    async def _stop_process(self, process: "asyncio.subprocess.Process") -> None:
+        """FFmpegを終了させる（猶予時間内に終わらなければ強制終了）"""
+        if process.returncode is not None:
+            return
+        try:
+            process.terminate()
+            await asyncio.wait_for(process.wait(), self.kill_grace_seconds)
+        except ProcessLookupError:
+            return
+        except asyncio.TimeoutError:
+            logger.warning("FFmpegが終了しないため強制終了します (pid={})", process.pid)
+            try:
+                process.kill()
+            except ProcessLookupError:
+                return
+            await process.wait()
+
+    async def _read_progress(
+        self,
+        stream: asyncio.StreamReader,
+        duration: Optional[float],
+        progress_callback: Optional[ProgressCallback]
+    ) -> Dict[str, Any]:
+        """-progress の key=value ブロックを解析して通知"""
+        block: Dict[str, str] = {}
+        last_progress: Dict[str, Any] = {}
+        async for raw_line in stream:
+            key, sep, value = raw_line.decode("utf-8", errors="replace").strip().partition("=")
+            if not sep:
+                continue
+            if key != "progress":
+                block[key] = value
+                continue
+
+            last_progress = build_progress(block, value, duration)
+            block = {}
+            if progress_callback:
+                try:
+                    progress_callback(last_progress)
+                except Exception as e:
+                    logger.error("進捗コールバックでエラーが発生しました: {}", e)
+        return last_progress
+
+    async def _drain_stderr(self, stream: asyncio.StreamReader, stderr_tail: deque) -> None:
+        """標準エラー出力を読み捨てつつ末尾だけを保持"""
+        async for raw_line in stream:
+            line = raw_line.decode("utf-8", errors="replace").rstrip()
+            if line:
+                stderr_tail.append(line)
+
+    def _remove_partial_output(self, job: AsyncJob, actual_output_path: str) -> None:
+        """書きかけの出力（上書きモードの場合は一時ファイル）を削除"""
+        if os.path.normpath(actual_output_path) == os.path.normpath(job.input_path):
+            return
+        if os.path.exists(actual_output_path):
+            try:
+                os.remove(actual_output_path)
+                logger.debug("書きかけの出力を削除しました: {}", actual_output_path)
+            except OSError as e:
+                logger.warning("書きかけの出力を削除できませんでした: {}: {}", actual_output_path, e)
+
+    def _make_result(self, job: AsyncJob, started: float, **fields: Any) -> Dict[str, Any]:
+        result = {
+            "input_path": job.input_path,
+            "new_format": job.output_format,
+            "elapsed": time.monotonic() - started
+        }
+        result.update(fields)
+        return result
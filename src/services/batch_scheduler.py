@@ -0,0 +1,135 @@
+import json
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from ..utils.logger import logger
+
+# 再生時間1秒あたりの変換時間（秒）の初期値。実行結果から学習して更新する
+DEFAULT_COST_FACTORS: Dict[str, float] = {
+    "copy": 0.005,
+    "wav": 0.01,
+    "mp3": 0.03,
+    "mp4:normal": 0.5,
+    "mp4:medium_compression": 0.5,
+    "mp4:high_compression": 0.6,
+    "mp4:ultra_compression": 0.9,
+    "mp4:hell_compression": 0.8
+}
+
+# 再生時間に関係なく1ファイルごとにかかる時間（プロセス起動・プローブなど）
+PER_FILE_OVERHEAD = 0.3
+
+
+@dataclass
+class ScheduledJob:
+    """スケジューリング対象の1ジョブ"""
+    index: int
+    cost_keys: List[str]  # 複数形式に出力する場合は出力ごとのキー
+    duration: Optional[float]
+    estimated_cost: float = 0.0
+
+
+class BatchScheduler:
+    """ジョブの処理時間を見積もり、長いものから順に実行する（LPT）スケジューラー
+
+    見積もりは「再生時間 × 変換方法ごとの係数」。係数は実行結果から指数移動平均で学習し、
+    JSONファイルに保存して次回以降の実行に引き継ぐ。
+    """
+
+    def __init__(self, stats_path: Optional[str] = None, learning_rate: float = 0.3):
+        self.stats_path = stats_path
+        self.learning_rate = learning_rate
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.cost_factors: Dict[str, float] = dict(DEFAULT_COST_FACTORS)
+        if stats_path and os.path.exists(stats_path):
+            self._load()
+
+    @staticmethod
+    def cost_key(output_format: str, quality_preset: Optional[str] = None, stream_copy: bool = False) -> str:
+        """変換方法を表す係数のキー"""
+        if stream_copy:
+            return "copy"
+        if output_format == "mp4":
+            return f"mp4:{quality_preset or 'normal'}"
+        return output_format
+
+    def estimate(self, cost_key: str, duration: Optional[float]) -> float:
+        """処理時間の見積もり（秒）"""
+        with self._lock:
+            factor = self.cost_factors.get(cost_key, DEFAULT_COST_FACTORS["mp3"])
+        return PER_FILE_OVERHEAD + factor * (duration or 0.0)
+
+    def order(self, jobs: List[ScheduledJob]) -> List[ScheduledJob]:
+        """見積もりの大きい順に並べ替えたジョブを返す
+
+        再生時間が不明なジョブには、判明しているジョブの平均を使う。
+        """
+        known = [job.duration for job in jobs if job.duration]
+        fallback = sum(known) / len(known) if known else 0.0
+        for job in jobs:
+            job.estimated_cost = sum(self.estimate(key, job.duration or fallback) for key in job.cost_keys)
+        # 同じ見積もりなら入力順を保つ
+        return sorted(jobs, key=lambda job: (-job.estimated_cost, job.index))
+
+    def record(self, cost_key: str, duration: Optional[float], elapsed: float) -> None:
+        """実行結果から係数を学習"""
+        if not duration or duration <= 0 or elapsed <= 0:
+            return
+        observed = max(elapsed - PER_FILE_OVERHEAD, 0.0) / duration
+        with self._lock:
+            current = self.cost_factors.get(cost_key)
+            if current is None:
+                self.cost_factors[cost_key] = observed
+            else:
+                self.cost_factors[cost_key] = current + self.learning_rate * (observed - current)
+            self._dirty = True
+
+    def record_combined(self, cost_keys: List[str], duration: Optional[float], elapsed: float) -> None:
+        """1回の実行で複数形式に出力した結果から学習
+
+        出力ごとの時間は分からないため、見積もりと実際の比率で各キーの係数を同じ割合だけ補正する。
+        """
+        if not cost_keys or not duration or duration <= 0 or elapsed <= 0:
+            return
+        with self._lock:
+            factors = {key: self.cost_factors.get(key, DEFAULT_COST_FACTORS["mp3"]) for key in set(cost_keys)}
+            predicted = sum(factors[key] for key in cost_keys)
+            if predicted <= 0:
+                return
+            ratio = (max(elapsed - PER_FILE_OVERHEAD, 0.0) / duration) / predicted
+            for key, current in factors.items():
+                self.cost_factors[key] = current + self.learning_rate * (current * ratio - current)
+            self._dirty = True
+
+    def save(self) -> None:
+        """学習した係数を保存（一時ファイルに書いてから置き換える）"""
+        if not self.stats_path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            factors = dict(self.cost_factors)
+            self._dirty = False
+        try:
+            directory = os.path.dirname(self.stats_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temp_path = f"{self.stats_path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"cost_factors": factors}, f, indent=4, ensure_ascii=False)
+            os.replace(temp_path, self.stats_path)
+        except OSError as e:
+            logger.warning("スケジューラーの学習結果を保存できませんでした: {}", e)
+
+    def _load(self) -> None:
+        """保存済みの係数を読み込む（壊れている場合は初期値のまま）"""
+        try:
+            with open(self.stats_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            for key, value in data.get("cost_factors", {}).items():
+                if isinstance(value, (int, float)) and value >= 0:
+                    self.cost_factors[key] = float(value)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("スケジューラーの学習結果を読み込めませんでした: {}", e)
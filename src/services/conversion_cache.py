@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from typing import Any, Dict
+from .probe_cache import file_identity
+from ..utils.logger import logger
+
+
+def link_or_copy(source_path: str, destination_path: str, use_hardlink: bool = True) -> None:
+    """ハードリンク（失敗時はコピー）で一時ファイルを作り、置き換えで出力を確定"""
+    temp_path = f"{destination_path}.cache_tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    try:
+        if not use_hardlink:
+            raise OSError("ハードリンクは無効です")
+        os.link(source_path, temp_path)
+    except OSError:
+        shutil.copyfile(source_path, temp_path)
+    try:
+        os.replace(temp_path, destination_path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class ConversionCache:
+    """入力内容のハッシュとエンコード設定をキーにした変換結果のキャッシュ"""
+
+    HASH_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, cache_dir: str, max_size_mb: int = 2048, use_hardlinks: bool = True):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_mb * 1024 * 1024
+        self.use_hardlinks = use_hardlinks
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(cache_dir, "index.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # 入力ファイルのハッシュ値（stat情報が変わらない限り再計算しない）
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS content_hashes (
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                digest TEXT NOT NULL,
+                PRIMARY KEY (path, size, mtime_ns, inode)
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                file_name TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+        logger.info("変換キャッシュを開きました: {}", cache_dir)
+
+    def content_digest(self, file_path: str) -> str:
+        """ファイル内容のハッシュ値を取得（変更が無ければ前回の値を再利用）"""
+        key = file_identity(file_path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT digest FROM content_hashes WHERE path = ? AND size = ? AND mtime_ns = ? AND inode = ?",
+                key
+            ).fetchone()
+        if row is not None:
+            return row[0]
+
+        hasher = hashlib.blake2b(digest_size=20)
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(self.HASH_CHUNK_SIZE), b""):
+                hasher.update(chunk)
+        digest = hasher.hexdigest()
+
+        with self._lock:
+            self._conn.execute("DELETE FROM content_hashes WHERE path = ?", (key[0],))
+            self._conn.execute(
+                "INSERT INTO content_hashes (path, size, mtime_ns, inode, digest) VALUES (?, ?, ?, ?, ?)",
+                key + (digest,)
+            )
+            self._conn.commit()
+        return digest
+
+    def make_key(self, file_path: str, encode_params: Dict[str, Any]) -> str:
+        """入力内容とエンコード設定からキャッシュキーを生成"""
+        hasher = hashlib.blake2b(digest_size=20)
+        hasher.update(self.content_digest(file_path).encode("ascii"))
+        hasher.update(json.dumps(encode_params, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        return hasher.hexdigest()
+
+    def fetch(self, key: str, output_path: str) -> bool:
+        """キャッシュにあれば出力パスに配置してTrueを返す"""
+        with self._lock:
+            row = self._conn.execute("SELECT file_name FROM entries WHERE key = ?", (key,)).fetchone()
+        cached_path = os.path.join(self.cache_dir, row[0]) if row else None
+        if cached_path is None or not os.path.exists(cached_path):
+            with self._lock:
+                self.misses += 1
+                if row is not None:
+                    self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    self._conn.commit()
+            return False
+
+        link_or_copy(cached_path, output_path, self.use_hardlinks)
+        with self._lock:
+            self.hits += 1
+            self._conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        logger.info("変換キャッシュを使用しました: {}", output_path)
+        return True
+
+    def store(self, key: str, output_path: str) -> None:
+        """変換結果をキャッシュに登録（失敗しても変換結果には影響させない）"""
+        ext = os.path.splitext(output_path)[1]
+        file_name = f"{key}{ext}"
+        try:
+            link_or_copy(output_path, os.path.join(self.cache_dir, file_name), self.use_hardlinks)
+            size = os.path.getsize(output_path)
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, file_name, size, last_access) VALUES (?, ?, ?, ?)",
+                    (key, file_name, size, time.time())
+                )
+                self._evict()
+                self._conn.commit()
+        except Exception as e:
+            logger.warning("変換キャッシュへの登録に失敗しました: {}", e)
+
+    def stats(self) -> Dict[str, int]:
+        """ヒット数・ミス数を取得"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    def _evict(self) -> None:
+        """合計サイズが上限を超えた分を古いものから削除（ロック取得済みで呼ぶ）"""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_size_bytes:
+            return
+        rows = self._conn.execute("SELECT key, file_name, size FROM entries ORDER BY last_access ASC").fetchall()
+        for key, file_name, size in rows:
+            if total <= self.max_size_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, file_name))
+            except FileNotFoundError:
+                pass
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
@@ -0,0 +1,126 @@
+from dataclasses import dataclass
+from typing import Dict, Optional
+from .ffmpeg_wrapper import get_video_preset
+from .media_probe import MediaInfo, StreamInfo
+from ..utils.config_loader import config
+
+# 出力フォーマットごとに、コピーで済ませられる音声コーデック
+AUDIO_COPY_CODECS = {
+    "mp3": "mp3",
+    "wav": "pcm_s16le"
+}
+
+# ビットレート比較の許容誤差（VBRや平均値のずれを吸収）
+BITRATE_TOLERANCE = 1.05
+
+
+def parse_bitrate(value: Optional[str]) -> Optional[int]:
+    """"192k" や "1.5M" 形式のビットレートをbpsに変換"""
+    if not value:
+        return None
+    value = str(value).strip().lower()
+    multiplier = 1
+    if value.endswith("k"):
+        multiplier, value = 1000, value[:-1]
+    elif value.endswith("m"):
+        multiplier, value = 1000000, value[:-1]
+    try:
+        return int(float(value) * multiplier)
+    except ValueError:
+        return None
+
+
+@dataclass
+class ConversionPlan:
+    """変換方法の判定結果"""
+    mode: str  # "copy" または "transcode"
+    reason: str
+
+    @property
+    def stream_copy(self) -> bool:
+        return self.mode == "copy"
+
+
+class ConversionPlanner:
+    """プローブ結果から、ストリームコピーで済むか再エンコードが必要かを判定するクラス"""
+
+    def plan(
+        self,
+        media_info: Optional[MediaInfo],
+        output_format: str,
+        quality_preset: str = "normal",
+        normalize_loudness: bool = False
+    ) -> ConversionPlan:
+        """変換方法を判定（音声をラウドネス正規化する場合は常に再エンコード）"""
+        if media_info is None:
+            return ConversionPlan("transcode", "ファイル情報が取得できないため")
+        if output_format == "mp4":
+            return self._plan_video(media_info, quality_preset)
+        if normalize_loudness:
+            return ConversionPlan("transcode", "ラウドネスを正規化するため")
+        return self._plan_audio(media_info, output_format)
+
+    def _plan_audio(self, media_info: MediaInfo, output_format: str) -> ConversionPlan:
+        """MP3/WAV出力の判定"""
+        audio = media_info.audio
+        if audio is None:
+            return ConversionPlan("transcode", "音声ストリームが見つからないため")
+
+        copy_codec = AUDIO_COPY_CODECS.get(output_format)
+        if audio.codec_name != copy_codec:
+            return ConversionPlan("transcode", f"コーデックが異なるため ({audio.codec_name} -> {copy_codec})")
+
+        settings = config.get_format_settings(output_format)
+        mismatch = self._audio_format_mismatch(audio, settings)
+        if mismatch:
+            return ConversionPlan("transcode", mismatch)
+
+        if output_format == "mp3":
+            target_bitrate = parse_bitrate(settings.get("bitrate", "192k"))
+            if not self._within_bitrate(audio.bit_rate, target_bitrate):
+                return ConversionPlan("transcode", "ビットレートが出力設定を超えるため")
+
+        return ConversionPlan("copy", f"{audio.codec_name}の音声が出力設定を満たしているため")
+
+    def _plan_video(self, media_info: MediaInfo, quality_preset: str) -> ConversionPlan:
+        """MP4出力の判定"""
+        video = media_info.video
+        audio = media_info.audio
+        if video is None:
+            return ConversionPlan("transcode", "映像ストリームが見つからないため")
+        if video.codec_name != "h264":
+            return ConversionPlan("transcode", f"映像コーデックが異なるため ({video.codec_name} -> h264)")
+        if audio is not None and audio.codec_name != "aac":
+            return ConversionPlan("transcode", f"音声コーデックが異なるため ({audio.codec_name} -> aac)")
+
+        preset = get_video_preset(quality_preset)
+        if preset["max_height"] and (video.height is None or video.height > preset["max_height"]):
+            return ConversionPlan("transcode", f"解像度を{preset['max_height']}pに縮小するため")
+        if preset["video_bitrate"] and not self._within_bitrate(
+            video.bit_rate, parse_bitrate(preset["video_bitrate"])
+        ):
+            return ConversionPlan("transcode", "映像ビットレートが品質設定を超えるため")
+        if audio is not None and preset["audio_bitrate"] and not self._within_bitrate(
+            audio.bit_rate, parse_bitrate(preset["audio_bitrate"])
+        ):
+            return ConversionPlan("transcode", "音声ビットレートが品質設定を超えるため")
+
+        return ConversionPlan("copy", "H.264/AACのためMP4への入れ直しのみ")
+
+    def _audio_format_mismatch(self, audio: StreamInfo, settings: Dict[str, str]) -> Optional[str]:
+        """サンプルレート・チャンネル数が出力設定と異なる場合は理由を返す"""
+        sample_rate = settings.get("sample_rate", "44100")
+        if audio.sample_rate is None or str(audio.sample_rate) != str(sample_rate):
+            return f"サンプルレートが異なるため ({audio.sample_rate} -> {sample_rate})"
+        channels = settings.get("channels", "2")
+        if audio.channels is None or str(audio.channels) != str(channels):
+            return f"チャンネル数が異なるため ({audio.channels} -> {channels})"
+        return None
+
+    def _within_bitrate(self, actual: Optional[int], target: Optional[int]) -> bool:
+        """ビットレートが目標以下か（目標が無い場合は常にTrue、実際の値が不明な場合はFalse）"""
+        if target is None:
+            return True
+        if actual is None:
+            return False
+        return actual <= target * BITRATE_TOLERANCE
@@ -0,0 +1,200 @@
+import threading
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, wait as futures_wait
+from typing import Any, Callable, Deque, Dict, Iterator, Optional, Set, Tuple
+
+# 実行レーン（ジョブの重さの種類）
+LANE_VIDEO = "video"  # 動画の再エンコード
+LANE_AUDIO = "audio"  # 音声の再エンコード
+LANE_COPY = "copy"    # ストリームコピー・変換結果の再利用
+
+# 空きを借りる順番（短く終わるジョブを優先）
+BORROW_PRIORITY = [LANE_COPY, LANE_AUDIO, LANE_VIDEO]
+
+
+def default_lane_limits(max_workers: int, overrides: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+    """並列数からレーンごとの同時実行数を決める（overridesで0より大きい値を指定したレーンはその値）
+
+    並列数を動画と音声で分け合い、ストリームコピーはI/Oが中心のため並列数とは別に1枠を用意する。
+    並列数が1の場合は動画レーンの枠を0とし、動画のジョブは音声レーンが空いたときに枠を借りて実行する
+    （ストリームコピーの実行中でも借りられる）。
+    """
+    video = max_workers // 2
+    limits = {
+        LANE_VIDEO: video,
+        LANE_AUDIO: max(1, max_workers - video),
+        LANE_COPY: 1
+    }
+    for lane, limit in (overrides or {}).items():
+        if lane in limits and limit and limit > 0:
+            limits[lane] = int(limit)
+    return limits
+
+
+class LaneExecutor:
+    """レーンごとに同時実行数と待ち行列を持つエグゼキューター
+
+    各レーンは自分の枠まで同時に実行でき、他のレーンに待ちジョブが無ければその空き枠も借りて実行する。
+    重い動画のジョブが並んでいても、音声のジョブは音声レーンの枠ですぐに実行される。
+    借りた枠はジョブが終わると返却される（実行中のジョブを止めることはしない）。
+    max_totalを指定すると、枠を借りるのは全体の実行数がmax_total未満の場合に限る。
+    ストリームコピーのレーンの枠は並列数とは別枠のため全体の実行数に数えず、他のレーンには貸さない。
+    """
+
+    def __init__(self, limits: Dict[str, int], max_total: Optional[int] = None, thread_name_prefix: str = "lane"):
+        self.limits = {lane: max(0, limit) for lane, limit in limits.items()}
+        self.capacity = max(1, sum(self.limits.values()))
+        self.max_total = max_total or self.capacity
+        # 取り消し時のコールバックがロック取得中に呼ばれるため再入可能なロックを使う
+        self._lock = threading.RLock()
+        self._queues: Dict[str, Deque[Tuple[Future, Callable[..., Any], tuple]]] = {
+            lane: deque() for lane in self.limits
+        }
+        # レーンごとの実行中のジョブ数と、使用中の枠の数（貸している枠を含む）
+        self._running: Dict[str, int] = {lane: 0 for lane in self.limits}
+        self._used_slots: Dict[str, int] = {lane: 0 for lane in self.limits}
+        self._pending: Set[Future] = set()
+        self._held = 0
+        self._shutdown = False
+        self._executor = ThreadPoolExecutor(max_workers=self.capacity, thread_name_prefix=thread_name_prefix)
+
+    def submit(self, lane: str, fn: Callable[..., Any], *args: Any) -> Future:
+        """ジョブをレーンの待ち行列に追加（不明なレーンは音声レーンとして扱う）"""
+        if lane not in self._queues:
+            lane = LANE_AUDIO if LANE_AUDIO in self._queues else next(iter(self._queues))
+        future: Future = Future()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("シャットダウン後はジョブを追加できません")
+            self._queues[lane].append((future, fn, args))
+            self._pending.add(future)
+            future.add_done_callback(self._discard)
+            self._dispatch()
+        return future
+
+    @contextmanager
+    def holding(self) -> Iterator[None]:
+        """ブロック内で追加したジョブは、ブロックを抜けるまで開始しない
+
+        バッチ全体を待ち行列に入れてから開始することで、先に追加したレーンのジョブが
+        後から追加するレーンの枠を借りてしまうのを防ぐ。
+        """
+        with self._lock:
+            self._held += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._held -= 1
+                self._dispatch()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """レーンごとの実行中・待ちジョブ数"""
+        with self._lock:
+            return {
+                lane: {"limit": self.limits[lane], "running": self._running[lane], "queued": len(self._queues[lane])}
+                for lane in self.limits
+            }
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False) -> None:
+        """新しいジョブの受付を終了する
+
+        wait=Trueなら全ジョブの完了を待ち、cancel_futures=Trueなら開始前のジョブを取り消す。
+        """
+        with self._lock:
+            self._shutdown = True
+            self._held = 0
+            if cancel_futures:
+                for queue in self._queues.values():
+                    while queue:
+                        queue.popleft()[0].cancel()
+            self._dispatch()
+            pending = list(self._pending)
+        if wait:
+            futures_wait(pending)
+            self._executor.shutdown(wait=True)
+        else:
+            self._release_if_drained()
+
+    def __enter__(self) -> "LaneExecutor":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.shutdown(wait=True)
+
+    def _dispatch(self) -> None:
+        """実行できるジョブを開始する（ロック取得済みで呼ぶ）"""
+        if self._held:
+            return
+        # 自分のレーンの枠で実行
+        for lane, queue in self._queues.items():
+            while queue and self._used_slots[lane] < self.limits[lane]:
+                self._start(lane, lane)
+
+        # 待ちジョブの無いレーンの空き枠を借りて実行（短く終わるレーンから）
+        for lane in sorted(self._queues, key=self._borrow_order):
+            queue = self._queues[lane]
+            while queue and self._budget_used() < self.max_total:
+                lender = self._find_lender(lane)
+                if lender is None:
+                    return
+                self._start(lane, lender)
+
+    def _budget_used(self) -> int:
+        """max_totalと比べる実行数（別枠のストリームコピーのレーンの枠は数えない）"""
+        return sum(used for lane, used in self._used_slots.items() if lane != LANE_COPY)
+
+    def _find_lender(self, borrower: str) -> Optional[str]:
+        """borrowerに枠を貸せるレーン（待ちジョブが無く、空き枠のあるレーン）
+
+        ストリームコピーのレーンの枠はI/Oの軽いジョブ用のため、他のレーンには貸さない。
+        """
+        for lane, queue in self._queues.items():
+            if lane == LANE_COPY and borrower != LANE_COPY:
+                continue
+            if not queue and self._used_slots[lane] < self.limits[lane]:
+                return lane
+        return None
+
+    def _discard(self, future: Future) -> None:
+        with self._lock:
+            self._pending.discard(future)
+
+    def _borrow_order(self, lane: str) -> int:
+        return BORROW_PRIORITY.index(lane) if lane in BORROW_PRIORITY else len(BORROW_PRIORITY)
+
+    def _start(self, lane: str, slot: str) -> None:
+        """laneの待ち行列の先頭のジョブを、slotのレーンの枠で開始（ロック取得済みで呼ぶ）"""
+        future, fn, args = self._queues[lane].popleft()
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            self._executor.submit(self._run, lane, slot, future, fn, args)
+        except RuntimeError as e:
+            # インタープリター終了中などでスレッドを起動できない
+            future.set_exception(e)
+            return
+        self._running[lane] += 1
+        self._used_slots[slot] += 1
+
+    def _run(self, lane: str, slot: str, future: Future, fn: Callable[..., Any], args: tuple) -> None:
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        finally:
+            with self._lock:
+                self._running[lane] -= 1
+                self._used_slots[slot] -= 1
+                self._dispatch()
+                if self._shutdown:
+                    self._release_if_drained()
+
+    def _release_if_drained(self) -> None:
+        """シャットダウン後、待ち行列が空になったらワーカースレッドを終了させる"""
+        with self._lock:
+            if not any(self._queues.values()):
+                self._executor.shutdown(wait=False)
@@ -0,0 +1,215 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .job_metrics import record_ffmpeg_run
+from ..utils.logger import logger
+from ..utils.profiler import is_profiling, parse_benchmark
+
+# 進捗コールバック: {"out_time": 秒, "speed": 倍速, "fraction": 0.0〜1.0, "progress": "continue"/"end"}
+ProgressCallback = Callable[[Dict[str, Any]], None]
+
+
+def parse_timestamp(value: str) -> Optional[float]:
+    """"HH:MM:SS.xx" 形式の時刻を秒に変換（解析できない場合はNone）"""
+    try:
+        parts = value.strip().split(":")
+        seconds = 0.0
+        for part in parts:
+            seconds = seconds * 60 + float(part)
+        return seconds if seconds >= 0 else None
+    except (ValueError, AttributeError):
+        return None
+
+
+def parse_speed(value: str) -> Optional[float]:
+    """"1.23x" 形式の速度を数値に変換（解析できない場合はNone）"""
+    try:
+        return float(value.strip().rstrip("x"))
+    except (ValueError, AttributeError):
+        return None
+
+
+def add_progress_args(command: List[str]) -> List[str]:
+    """FFmpegのコマンドに -progress pipe:1 を追加（進捗は標準出力に key=value で出力される）"""
+    return [command[0], "-hide_banner", "-nostats", "-progress", "pipe:1"] + command[1:]
+
+
+def build_progress(block: Dict[str, str], state: str, duration: Optional[float]) -> Dict[str, Any]:
+    """-progress の1ブロック分の出力を進捗情報の辞書に変換"""
+    out_time = None
+    # out_time_us と out_time_ms はどちらもマイクロ秒単位
+    for key in ("out_time_us", "out_time_ms"):
+        raw = block.get(key, "")
+        if raw and raw != "N/A":
+            try:
+                out_time = max(int(raw), 0) / 1_000_000
+                break
+            except ValueError:
+                pass
+    if out_time is None and block.get("out_time"):
+        out_time = parse_timestamp(block["out_time"])
+
+    fraction = None
+    if state == "end":
+        fraction = 1.0
+    elif out_time is not None and duration:
+        fraction = min(out_time / duration, 1.0)
+
+    return {
+        "out_time": out_time,
+        "speed": parse_speed(block.get("speed", "")),
+        "fraction": fraction,
+        "progress": state
+    }
+
+
+def decode_wait_status(status: int) -> int:
+    """waitの終了ステータスをsubprocessと同じ形式の終了コードに変換（シグナルで終了した場合は負の番号）
+
+    os.waitstatus_to_exitcodeはPython 3.9以降にしか無いため、3.8でも動くように自前で変換する。
+    """
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    if os.WIFEXITED(status):
+        return os.WEXITSTATUS(status)
+    raise ValueError(f"不明な終了ステータスです: {status}")
+
+
+def wait_with_rusage(process: subprocess.Popen) -> Tuple[int, Optional[Dict[str, Any]]]:
+    """子プロセスの終了を待ち、終了コードと資源使用量を返す
+
+    POSIXではos.wait4でCPU時間と最大RSSを取得する。使えない環境では通常のwaitを行い、資源使用量はNone。
+    """
+    if not hasattr(os, "wait4"):
+        return process.wait(), None
+    try:
+        _, status, usage = os.wait4(process.pid, 0)
+    except ChildProcessError:
+        # 既に回収済み（他の経路でwaitされた場合）
+        return process.wait(), None
+    process.returncode = decode_wait_status(status)
+    return process.returncode, {
+        "user_cpu_seconds": usage.ru_utime,
+        "system_cpu_seconds": usage.ru_stime,
+        # macOSはバイト、Linuxなどはキロバイト単位
+        "max_rss_kb": usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+    }
+
+
+class FFmpegRunResult:
+    """FFmpegの実行結果"""
+
+    def __init__(
+        self,
+        returncode: int,
+        stderr_tail: List[str],
+        progress: Dict[str, Any],
+        elapsed: Optional[float] = None,
+        rusage: Optional[Dict[str, Any]] = None,
+        benchmark: Optional[Dict[str, float]] = None
+    ):
+        self.returncode = returncode
+        self.stderr_tail = stderr_tail
+        self.progress = progress
+        self.elapsed = elapsed
+        # 子プロセスのCPU時間と最大メモリ（os.wait4が使えない環境ではNone）
+        self.rusage = rusage
+        # -benchmark の結果（プロファイリング時のみ）
+        self.benchmark = benchmark
+
+    @property
+    def stderr(self) -> str:
+        """保持している標準エラー出力の末尾を文字列で取得"""
+        return "\n".join(self.stderr_tail)
+
+
+class FFmpegRunner:
+    """FFmpegの -progress 出力を逐次読み取りながら実行するランナー"""
+
+    def __init__(self, stderr_tail_lines: int = 200):
+        self.stderr_tail_lines = stderr_tail_lines
+
+    def run(
+        self,
+        command: List[str],
+        duration: Optional[float] = None,
+        progress_callback: Optional[ProgressCallback] = None
+    ) -> FFmpegRunResult:
+        """コマンドを実行し、進捗をコールバックで通知する
+
+        command[0] はFFmpegの実行ファイル。標準出力は -progress 用に使用し、
+        標準エラー出力は末尾の stderr_tail_lines 行のみ保持する。
+        """
+        command = add_progress_args(command)
+        if is_profiling():
+            # エンコーダー自体の時間を計測（終了時に標準エラー出力に出る）
+            command.insert(1, "-benchmark")
+        started = time.monotonic()
+        process = subprocess.Popen(
+            command,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            errors="replace"
+        )
+
+        stderr_tail: deque = deque(maxlen=self.stderr_tail_lines)
+        stderr_thread = threading.Thread(
+            target=self._drain_stderr,
+            args=(process, stderr_tail),
+            daemon=True
+        )
+        stderr_thread.start()
+
+        progress: Dict[str, Any] = {}
+        rusage = None
+        try:
+            progress = self._read_progress(process, duration, progress_callback)
+        finally:
+            returncode, rusage = wait_with_rusage(process)
+            stderr_thread.join()
+
+        ended = time.monotonic()
+        benchmark = parse_benchmark(stderr_tail) if is_profiling() else None
+        result = FFmpegRunResult(returncode, list(stderr_tail), progress, ended - started, rusage, benchmark)
+        record_ffmpeg_run(rusage, progress.get("speed"), (started, ended), benchmark)
+        return result
+
+    def _drain_stderr(self, process: subprocess.Popen, stderr_tail: deque) -> None:
+        """標準エラー出力を読み捨てつつ末尾だけを保持"""
+        for line in process.stderr:
+            line = line.rstrip()
+            if line:
+                stderr_tail.append(line)
+
+    def _read_progress(
+        self,
+        process: subprocess.Popen,
+        duration: Optional[float],
+        progress_callback: Optional[ProgressCallback]
+    ) -> Dict[str, Any]:
+        """-progress の key=value ブロックを解析して通知"""
+        block: Dict[str, str] = {}
+        last_progress: Dict[str, Any] = {}
+        for line in process.stdout:
+            key, sep, value = line.strip().partition("=")
+            if not sep:
+                continue
+            if key != "progress":
+                block[key] = value
+                continue
+
+            last_progress = build_progress(block, value, duration)
+            block = {}
+            if progress_callback:
+                try:
+                    progress_callback(last_progress)
+                except Exception as e:
+                    logger.error("進捗コールバックでエラーが発生しました: {}", e)
+        return last_progress
@@ -1,72 +1,197 @@
 import os
 import subprocess
-from typing import Dict, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .ffmpeg_runner import FFmpegRunner, ProgressCallback
+from .loudness import LoudnessCache, LoudnessNormalizer
+from .media_probe import MediaInfo, MediaProber
+from .probe_cache import ProbeCache
+from .segmented_encoder import SegmentedEncoder
+from .thread_governor import JOB_AUDIO, JOB_COPY, JOB_VIDEO, ThreadGovernor, apply_thread_args
 from ..utils.logger import logger
 from ..utils.config_loader import config
 
+# MP4の品質設定ごとのエンコードパラメータ
+VIDEO_QUALITY_PRESETS: Dict[str, Dict[str, Any]] = {
+    "medium_compression": {  # まあまあ圧縮
+        "label": "まあまあ圧縮",
+        "crf": "23",              # 中程度の圧縮
+        "preset": "medium",       # バランス重視
+        "video_bitrate": "1500k", # 動画ビットレート
+        "audio_bitrate": "128k",  # 音声ビットレート
+        "max_height": None
+    },
+    "high_compression": {  # めちゃ圧縮
+        "label": "めちゃ圧縮",
+        "crf": "28",              # 高圧縮（品質は少し下がる）
+        "preset": "slow",         # 圧縮効率重視
+        "video_bitrate": "500k",  # 動画ビットレート制限
+        "audio_bitrate": "64k",   # 音声ビットレート制限
+        "max_height": 720         # 720pにリサイズ
+    },
+    "ultra_compression": {  # 鬼圧縮
+        "label": "鬼圧縮",
+        "crf": "35",              # 超高圧縮（品質は大幅に下がる）
+        "preset": "veryslow",     # 最高圧縮効率
+        "video_bitrate": "200k",  # 超低動画ビットレート
+        "audio_bitrate": "32k",   # 超低音声ビットレート
+        "max_height": 480         # 480pにリサイズ（さらに小さく）
+    },
+    "hell_compression": {  # 地獄圧縮
+        "label": "地獄圧縮",
+        "crf": "40",              # 地獄レベルの圧縮（品質は激しく劣化）
+        "preset": "veryslow",     # 最高圧縮効率
+        "video_bitrate": "100k",  # 激低動画ビットレート
+        "audio_bitrate": "24k",   # 激低音声ビットレート
+        "max_height": 360         # 360pにリサイズ（激小）
+    },
+    "normal": {  # デフォルト設定
+        "label": "デフォルト",
+        "crf": "20",              # 高品質
+        "preset": "medium",
+        "video_bitrate": None,
+        "audio_bitrate": "192k",
+        "max_height": None
+    }
+}
+
+
+def get_video_preset(quality_preset: str) -> Dict[str, Any]:
+    """品質設定名からエンコードパラメータを取得（不明な場合はデフォルト）"""
+    return VIDEO_QUALITY_PRESETS.get(quality_preset, VIDEO_QUALITY_PRESETS["normal"])
+
+
+def get_temp_output_path(input_path: str, output_path: str) -> Optional[str]:
+    """入力と出力が同じファイルの場合（上書きモード）に使う一時ファイルのパス（不要ならNone）"""
+    if os.path.normpath(input_path) != os.path.normpath(output_path):
+        return None
+    base, ext = os.path.splitext(output_path)
+    return f"{base}_tmp{ext}"
+
+
+def build_audio_encode_args(output_format: str) -> List[str]:
+    """MP3/WAVのエンコード引数を設定ファイルの値から生成"""
+    format_settings = config.get_format_settings(output_format)
+    if output_format == "mp3":
+        return [
+            "-acodec", "libmp3lame",  # MP3エンコーダーを指定
+            "-b:a", format_settings.get("bitrate", "192k"),
+            "-ar", format_settings.get("sample_rate", "44100"),
+            "-ac", format_settings.get("channels", "2")
+        ]
+    if output_format == "wav":
+        return [
+            "-acodec", "pcm_s16le",  # WAVエンコーダーを指定
+            "-ar", format_settings.get("sample_rate", "44100"),
+            "-ac", format_settings.get("channels", "2")
+        ]
+    return []
+
+
+def build_video_encode_args(quality_preset: str, include_scale: bool = True) -> List[str]:
+    """品質設定に応じたH.264/AACのエンコード引数を生成
+
+    include_scale=False の場合、リサイズはフィルタグラフ側で行う前提で -vf を付けない。
+    """
+    preset = get_video_preset(quality_preset)
+    args = [
+        "-c:v", "libx264",  # H.264エンコーダーを指定
+        "-c:a", "aac",      # AACオーディオエンコーダーを指定
+        "-crf", preset["crf"],
+        "-preset", preset["preset"]
+    ]
+    if preset["video_bitrate"]:
+        args.extend(["-b:v", preset["video_bitrate"]])
+    if preset["audio_bitrate"]:
+        args.extend(["-b:a", preset["audio_bitrate"]])
+    if include_scale and preset["max_height"]:
+        args.extend(["-vf", f"scale=-2:{preset['max_height']}"])
+    logger.debug("{}設定を適用", preset['label'])
+    return args
+
+
 class FFmpegWrapper:
     """FFmpegを実行するためのラッパークラス"""
 
     def __init__(self):
-        print("デバッグ: FFmpegWrapperの初期化開始")
+        logger.debug("FFmpegWrapperの初期化開始")
         self.ffmpeg_path = config.get_ffmpeg_path()
-        print(f"デバッグ: FFmpegのパス: {self.ffmpeg_path}")
+        logger.debug("FFmpegのパス: {}", self.ffmpeg_path)
+        self.runner = FFmpegRunner()
+        self.prober = MediaProber(config.get_ffprobe_path(), self._create_probe_cache())
+        app_settings = config.get_app_settings()
+        self.governor = ThreadGovernor(
+            cpu_share=float(app_settings.get("cpu_share", 0.9)),
+            max_threads_per_job=int(app_settings.get("max_threads_per_job", 16))
+        )
+        self.segmented_encoder = SegmentedEncoder(
+            self.ffmpeg_path, config.get_ffprobe_path(), self.runner,
+            config.get_segmented_encoding_settings(), self.governor
+        )
+        self.normalizer = LoudnessNormalizer(
+            self.ffmpeg_path, self.runner, self.governor,
+            config.get_loudness_settings(), self._create_loudness_cache()
+        )
         self._verify_ffmpeg()
 
+    def _create_probe_cache(self) -> Optional[ProbeCache]:
+        """設定に応じてプローブキャッシュを作成（失敗してもキャッシュ無しで続行）"""
+        settings = config.get_cache_settings()
+        if not settings.get("probe_cache_enabled", True):
+            return None
+        try:
+            return ProbeCache(
+                config.resolve_path(settings["probe_cache_path"]),
+                int(settings["probe_cache_max_entries"])
+            )
+        except Exception as e:
+            logger.warning("プローブキャッシュを開けませんでした。キャッシュ無しで続行します: {}", e)
+            return None
+
+    def _create_loudness_cache(self) -> Optional[LoudnessCache]:
+        """設定に応じてラウドネスキャッシュを作成（失敗してもキャッシュ無しで続行）"""
+        settings = config.get_cache_settings()
+        if not settings.get("loudness_cache_enabled", True):
+            return None
+        try:
+            return LoudnessCache(config.resolve_path(settings["loudness_cache_path"]))
+        except Exception as e:
+            logger.warning("ラウドネスキャッシュを開けませんでした。キャッシュ無しで続行します: {}", e)
+            return None
+
     def _verify_ffmpeg(self) -> None:
         """FFmpegが利用可能か確認"""
-        print(f"デバッグ: FFmpegの検証開始")
+        logger.debug("FFmpegの検証開始")
         if not os.path.exists(self.ffmpeg_path):
-            print(f"エラー: FFmpegが見つかりません: {self.ffmpeg_path}")
-            logger.error(f"FFmpegが見つかりません: {self.ffmpeg_path}")
+            logger.error("FFmpegが見つかりません: {}", self.ffmpeg_path)
             raise FileNotFoundError(f"FFmpegが見つかりません: {self.ffmpeg_path}")
 
         try:
-            print("デバッグ: FFmpegバージョンの確認を実行")
+            logger.debug("FFmpegバージョンの確認を実行")
             result = subprocess.run(
                 [self.ffmpeg_path, "-version"],
                 capture_output=True,
                 text=True
             )
             if result.returncode != 0:
-                print(f"エラー: FFmpegの実行に失敗: {result.stderr}")
+                logger.error("FFmpegの実行に失敗: {}", result.stderr)
                 raise RuntimeError("FFmpegの実行に失敗しました")
-            print("デバッグ: FFmpegの検証が完了")
+            logger.debug("FFmpegの検証が完了")
             logger.info("FFmpegの検証が完了しました")
+            if not os.path.exists(self.prober.ffprobe_path):
+                logger.warning("ffprobeが見つかりません。ファイル情報は取得できません: {}", self.prober.ffprobe_path)
         except Exception as e:
-            print(f"エラー: FFmpegの検証中にエラー発生: {str(e)}")
-            logger.error(f"FFmpegの検証中にエラーが発生しました: {str(e)}")
+            logger.error("FFmpegの検証中にエラーが発生しました: {}", e)
             raise
 
-    def convert_audio(
+    def build_audio_command(
         self,
         input_path: str,
         output_format: str,
-        output_path: Optional[str] = None
-    ) -> str:
-        """オーディオファイルを変換"""
-        if not os.path.exists(input_path):
-            logger.error(f"入力ファイルが見つかりません: {input_path}")
-            raise FileNotFoundError(f"入力ファイルが見つかりません: {input_path}")
-
-        # 出力パスが指定されていない場合、入力ファイルと同じディレクトリに作成
-        if output_path is None:
-            base_path = os.path.splitext(input_path)[0]
-            output_path = f"{base_path}_converted.{output_format}"
-
-        # 入力ファイルと出力ファイルが同じ場合（上書きモード）、一時ファイルを使用
-        temp_output_path = None
-        if os.path.normpath(input_path) == os.path.normpath(output_path):
-            base, ext = os.path.splitext(output_path)
-            temp_output_path = f"{base}_tmp{ext}"
-            actual_output_path = temp_output_path
-            print(f"デバッグ: 上書きモードのため一時ファイルを使用: {temp_output_path}")
-        else:
-            actual_output_path = output_path
-
-        # フォーマット設定を取得
-        format_settings = config.get_format_settings(output_format)
-
+        output_path: str,
+        stream_copy: bool = False,
+        audio_filter: Optional[str] = None
+    ) -> List[str]:
+        """MP3/WAVへの変換コマンドを生成（output_pathには実際に書き込むパスを指定）"""
         # 入力ファイルの拡張子を取得
         input_ext = os.path.splitext(input_path)[1].lower().lstrip(".")
         is_video = input_ext in ["mp4", "mkv", "mov"]
@@ -81,47 +206,131 @@ class FFmpegWrapper:
 
         # 動画ファイルの場合、音声抽出の最適化設定を追加
         if is_video:
-            print(f"デバッグ: 動画ファイルからの音声抽出を実行: {input_path}")
-            logger.info(f"動画ファイルからの音声抽出を実行: {input_path}")
+            logger.debug("動画ファイルからの音声抽出を実行: {}", input_path)
+            logger.info("動画ファイルからの音声抽出を実行: {}", input_path)
 
         # フォーマット固有の設定を追加
-        if output_format == "mp3":
+        if stream_copy:
+            # 既に出力設定を満たしているためエンコードせずにコピー
             command.extend([
-                "-acodec", "libmp3lame",  # MP3エンコーダーを指定
-                "-b:a", format_settings.get("bitrate", "192k"),
-                "-ar", format_settings.get("sample_rate", "44100"),
-                "-ac", format_settings.get("channels", "2")
+                "-map", "0:a:0",
+                "-c:a", "copy"
             ])
-        elif output_format == "wav":
+            logger.debug("ストリームコピーで変換")
+        else:
+            if audio_filter:
+                command.extend(["-af", audio_filter])
+            command.extend(build_audio_encode_args(output_format))
+
+        command.append(output_path)
+        return command
+
+    def build_video_command(
+        self,
+        input_path: str,
+        output_path: str,
+        quality_preset: str = "normal",
+        stream_copy: bool = False
+    ) -> List[str]:
+        """MP4への変換コマンドを生成（output_pathには実際に書き込むパスを指定）"""
+        # コマンドを構築
+        command = [
+            self.ffmpeg_path,
+            "-i", input_path,
+            "-y"  # 既存ファイルを上書き
+        ]
+
+        if stream_copy:
+            # 既にH.264/AACのためエンコードせずにMP4へ入れ直す
             command.extend([
-                "-acodec", "pcm_s16le",  # WAVエンコーダーを指定
-                "-ar", format_settings.get("sample_rate", "44100"),
-                "-ac", format_settings.get("channels", "2")
+                "-map", "0:v:0",
+                "-map", "0:a:0?",
+                "-c", "copy",
+                "-movflags", "+faststart"
             ])
+            logger.debug("ストリームコピーで変換")
+        else:
+            command.extend(build_video_encode_args(quality_preset))
 
-        command.append(actual_output_path)
+        command.append(output_path)
+        return command
+
+    def convert_audio(
+        self,
+        input_path: str,
+        output_format: str,
+        output_path: Optional[str] = None,
+        duration: Optional[float] = None,
+        progress_callback: Optional[ProgressCallback] = None,
+        stream_copy: bool = False,
+        normalize: bool = False
+    ) -> str:
+        """オーディオファイルを変換（durationを指定すると進捗の割合も通知）
+
+        stream_copy=True の場合は音声ストリームを再エンコードせずにコピーする。
+        normalize=True の場合はEBU R128（loudnorm）の2パスでラウドネスを正規化する。
+        1パス目の解析結果はキャッシュされ、同じ入力では解析を省略する。
+        """
+        if not os.path.exists(input_path):
+            logger.error("入力ファイルが見つかりません: {}", input_path)
+            raise FileNotFoundError(f"入力ファイルが見つかりません: {input_path}")
+
+        # 出力パスが指定されていない場合、入力ファイルと同じディレクトリに作成
+        if output_path is None:
+            base_path = os.path.splitext(input_path)[0]
+            output_path = f"{base_path}_converted.{output_format}"
+
+        # 入力ファイルと出力ファイルが同じ場合（上書きモード）、一時ファイルを使用
+        temp_output_path = get_temp_output_path(input_path, output_path)
+        if temp_output_path:
+            actual_output_path = temp_output_path
+            logger.debug("上書きモードのため一時ファイルを使用: {}", temp_output_path)
+        else:
+            actual_output_path = output_path
 
-        logger.info(f"変換を開始: {input_path} -> {output_path}")
-        print(f"デバッグ: 実行するコマンド: {' '.join(command)}")
         try:
-            result = subprocess.run(
-                command,
-                capture_output=True,
-                text=True
+            audio_filter = None
+            if normalize:
+                # 正規化するにはエンコードが必要なためストリームコピーはしない
+                stream_copy = False
+                audio_filter, progress_callback = self._prepare_loudness_filter(
+                    input_path, duration, progress_callback
+                )
+
+            command = self.build_audio_command(
+                input_path, output_format, actual_output_path, stream_copy, audio_filter
+            )
+            logger.info("変換を開始: {} -> {}", input_path, output_path)
+            logger.opt(lazy=True).debug("実行するコマンド: {}", lambda: ' '.join(command))
+
+            # 長い録音は時間で分割して並列にエンコード（正規化する場合は全体で1回のエンコードにする）
+            segmented = not normalize and self.segmented_encoder.should_segment(output_format, duration, stream_copy) and (
+                self._try_segmented(
+                    input_path,
+                    lambda: self.segmented_encoder.encode_audio(
+                        input_path, actual_output_path, build_audio_encode_args(output_format),
+                        int(config.get_format_settings(output_format).get("sample_rate", "44100")),
+                        duration, progress_callback
+                    )
+                )
             )
 
-            if result.returncode != 0:
-                logger.error(f"変換中にエラーが発生しました: {result.stderr}")
-                raise RuntimeError(f"変換中にエラーが発生しました: {result.stderr}")
+            if not segmented:
+                with self.governor.lease(JOB_COPY if stream_copy else JOB_AUDIO) as threads:
+                    result = self.runner.run(apply_thread_args(command, threads), duration, progress_callback)
+
+                if result.returncode != 0:
+                    logger.error("変換中にエラーが発生しました: {}", result.stderr)
+                    raise RuntimeError(f"変換中にエラーが発生しました: {result.stderr}")
 
             # 一時ファイルを使用した場合、元ファイルを置き換え
             if temp_output_path:
-                print(f"デバッグ: 一時ファイルを元ファイルに置き換え: {temp_output_path} -> {output_path}")
+                logger.debug("一時ファイルを元ファイルに置き換え: {} -> {}", temp_output_path, output_path)
                 if os.path.exists(output_path):
                     os.remove(output_path)
                 os.rename(temp_output_path, output_path)
 
-            logger.info(f"変換が完了しました: {output_path}")
+            logger.info("変換が完了しました: {}", output_path)
             return output_path
 
         except Exception as e:
@@ -129,10 +338,65 @@ class FFmpegWrapper:
             if temp_output_path and os.path.exists(temp_output_path):
                 try:
                     os.remove(temp_output_path)
-                    print(f"デバッグ: 一時ファイルを削除しました: {temp_output_path}")
+                    logger.debug("一時ファイルを削除しました: {}", temp_output_path)
                 except:
                     pass
-            logger.error(f"変換中にエラーが発生しました: {str(e)}")
+            logger.error("変換中にエラーが発生しました: {}", e)
+            raise
+
+    def convert_audio_batch(
+        self,
+        jobs: List[Tuple[str, str]],
+        output_format: str,
+        duration: Optional[float] = None,
+        progress_callback: Optional[ProgressCallback] = None
+    ) -> List[str]:
+        """複数の短いファイルを1回のFFmpegでMP3/WAVに変換（jobsは (入力パス, 出力パス) の一覧）
+
+        入力ごとに -i を並べ、i番目の入力の音声をi番目の出力に割り当てる。
+        各出力は一時ファイルに書き込み、全体が成功した場合のみ出力パスに置き換えるため、
+        失敗した場合に書きかけのファイルが出力パスに残ることはない。
+        durationには最も長い入力の長さを指定する（進捗は最も長い出力に合わせて通知される）。
+        """
+        for input_path, _ in jobs:
+            if not os.path.exists(input_path):
+                logger.error("入力ファイルが見つかりません: {}", input_path)
+                raise FileNotFoundError(f"入力ファイルが見つかりません: {input_path}")
+
+        command = [self.ffmpeg_path, "-y"]
+        for input_path, _ in jobs:
+            command.extend(["-i", input_path])
+        encode_args = build_audio_encode_args(output_format)
+        temp_paths = [f"{output_path}.part" for _, output_path in jobs]
+        for i, temp_path in enumerate(temp_paths):
+            # 一時ファイルの拡張子からは形式が分からないため明示する
+            command.extend(["-map", f"{i}:a:0"] + encode_args + ["-f", output_format, temp_path])
+
+        logger.info("{}個のファイルをまとめて変換を開始: {}", len(jobs), [input_path for input_path, _ in jobs])
+        logger.opt(lazy=True).debug("実行するコマンド: {}", lambda: ' '.join(command))
+        try:
+            with self.governor.lease(JOB_AUDIO) as threads:
+                result = self.runner.run(apply_thread_args(command, threads, temp_paths), duration, progress_callback)
+
+            if result.returncode != 0:
+                logger.error("まとめた変換中にエラーが発生しました: {}", result.stderr)
+                raise RuntimeError(f"まとめた変換中にエラーが発生しました: {result.stderr}")
+
+            for temp_path, (_, output_path) in zip(temp_paths, jobs):
+                os.replace(temp_path, output_path)
+
+            logger.info("{}個のファイルのまとめた変換が完了しました", len(jobs))
+            return [output_path for _, output_path in jobs]
+
+        except Exception:
+            # 書きかけの一時ファイルを削除（置き換え済みの出力は完成しているため残す）
+            for temp_path in temp_paths:
+                if os.path.exists(temp_path):
+                    try:
+                        os.remove(temp_path)
+                        logger.debug("一時ファイルを削除しました: {}", temp_path)
+                    except OSError:
+                        pass
             raise
 
     def convert_video(
@@ -140,11 +404,17 @@ class FFmpegWrapper:
         input_path: str,
         output_format: str,
         output_path: Optional[str] = None,
-        quality_preset: str = "normal"
+        quality_preset: str = "normal",
+        duration: Optional[float] = None,
+        progress_callback: Optional[ProgressCallback] = None,
+        stream_copy: bool = False
     ) -> str:
-        """動画ファイルを変換（mp4への変換用）"""
+        """動画ファイルを変換（mp4への変換用）
+
+        stream_copy=True の場合は映像・音声をコピーしてMP4に入れ直す。
+        """
         if not os.path.exists(input_path):
-            logger.error(f"入力ファイルが見つかりません: {input_path}")
+            logger.error("入力ファイルが見つかりません: {}", input_path)
             raise FileNotFoundError(f"入力ファイルが見つかりません: {input_path}")
 
         # 出力パスが指定されていない場合、入力ファイルと同じディレクトリに作成
@@ -153,105 +423,47 @@ class FFmpegWrapper:
             output_path = f"{base_path}_converted.{output_format}"
 
         # 入力ファイルと出力ファイルが同じ場合（上書きモード）、一時ファイルを使用
-        temp_output_path = None
-        if os.path.normpath(input_path) == os.path.normpath(output_path):
-            base, ext = os.path.splitext(output_path)
-            temp_output_path = f"{base}_tmp{ext}"
+        temp_output_path = get_temp_output_path(input_path, output_path)
+        if temp_output_path:
             actual_output_path = temp_output_path
-            print(f"デバッグ: 上書きモードのため一時ファイルを使用: {temp_output_path}")
+            logger.debug("上書きモードのため一時ファイルを使用: {}", temp_output_path)
         else:
             actual_output_path = output_path
 
-        # フォーマット設定を取得
-        format_settings = config.get_format_settings(output_format)
-
-        # 入力ファイルの拡張子を取得
-        input_ext = os.path.splitext(input_path)[1].lower().lstrip(".")
-
-        print(f"デバッグ: 動画ファイルの変換を開始: {input_path}")
-        logger.info(f"動画ファイルの変換を開始: {input_path}")
-
-        # コマンドを構築
-        command = [
-            self.ffmpeg_path,
-            "-i", input_path,
-            "-y"  # 既存ファイルを上書き
-        ]
+        logger.debug("動画ファイルの変換を開始: {}", input_path)
+        logger.info("動画ファイルの変換を開始: {}", input_path)
 
-        # フォーマット固有の設定を追加
-        if output_format == "mp4":
-            command.extend([
-                "-c:v", "libx264",  # H.264エンコーダーを指定
-                "-c:a", "aac",      # AACオーディオエンコーダーを指定
-            ])
+        command = self.build_video_command(input_path, actual_output_path, quality_preset, stream_copy)
 
-            # 品質設定に応じてエンコード設定を調整
-            if quality_preset == "high_compression":  # めちゃ圧縮
-                command.extend([
-                    "-crf", "28",        # 高圧縮（品質は少し下がる）
-                    "-preset", "slow",   # 圧縮効率重視
-                    "-b:v", "500k",      # 動画ビットレート制限
-                    "-b:a", "64k",       # 音声ビットレート制限
-                    "-vf", "scale=-2:720"  # 720pにリサイズ
-                ])
-                print("デバッグ: めちゃ圧縮設定を適用")
-            elif quality_preset == "ultra_compression":  # 鬼圧縮
-                command.extend([
-                    "-crf", "35",        # 超高圧縮（品質は大幅に下がる）
-                    "-preset", "veryslow", # 最高圧縮効率
-                    "-b:v", "200k",      # 超低動画ビットレート
-                    "-b:a", "32k",       # 超低音声ビットレート
-                    "-vf", "scale=-2:480"  # 480pにリサイズ（さらに小さく）
-                ])
-                print("デバッグ: 鬼圧縮設定を適用")
-            elif quality_preset == "hell_compression":  # 地獄圧縮
-                command.extend([
-                    "-crf", "40",        # 地獄レベルの圧縮（品質は激しく劣化）
-                    "-preset", "veryslow", # 最高圧縮効率
-                    "-b:v", "100k",      # 激低動画ビットレート
-                    "-b:a", "24k",       # 激低音声ビットレート
-                    "-vf", "scale=-2:360"  # 360pにリサイズ（激小）
-                ])
-                print("デバッグ: 地獄圧縮設定を適用（覚悟してください）")
-            elif quality_preset == "medium_compression":  # まあまあ圧縮
-                command.extend([
-                    "-crf", "23",        # 中程度の圧縮
-                    "-preset", "medium", # バランス重視
-                    "-b:v", "1500k",     # 動画ビットレート
-                    "-b:a", "128k",      # 音声ビットレート
-                ])
-                print("デバッグ: まあまあ圧縮設定を適用")
-            else:  # デフォルト設定
-                command.extend([
-                    "-crf", "20",        # 高品質
-                    "-preset", "medium",
-                    "-b:a", "192k",
-                ])
-                print("デバッグ: デフォルト設定を適用")
-
-        command.append(actual_output_path)
-
-        logger.info(f"動画変換を開始: {input_path} -> {output_path}")
-        print(f"デバッグ: 実行するコマンド: {' '.join(command)}")
+        logger.info("動画変換を開始: {} -> {}", input_path, output_path)
+        logger.opt(lazy=True).debug("実行するコマンド: {}", lambda: ' '.join(command))
         try:
-            result = subprocess.run(
-                command,
-                capture_output=True,
-                text=True
+            # 長い動画はキーフレーム位置で分割して並列にエンコード
+            segmented = self.segmented_encoder.should_segment(output_format, duration, stream_copy) and (
+                self._try_segmented(
+                    input_path,
+                    lambda: self._encode_video_segmented(
+                        input_path, actual_output_path, quality_preset, duration, progress_callback
+                    )
+                )
             )
 
-            if result.returncode != 0:
-                logger.error(f"動画変換中にエラーが発生しました: {result.stderr}")
-                raise RuntimeError(f"動画変換中にエラーが発生しました: {result.stderr}")
+            if not segmented:
+                with self.governor.lease(JOB_COPY if stream_copy else JOB_VIDEO) as threads:
+                    result = self.runner.run(apply_thread_args(command, threads), duration, progress_callback)
+
+                if result.returncode != 0:
+                    logger.error("動画変換中にエラーが発生しました: {}", result.stderr)
+                    raise RuntimeError(f"動画変換中にエラーが発生しました: {result.stderr}")
 
             # 一時ファイルを使用した場合、元ファイルを置き換え
             if temp_output_path:
-                print(f"デバッグ: 一時ファイルを元ファイルに置き換え: {temp_output_path} -> {output_path}")
+                logger.debug("一時ファイルを元ファイルに置き換え: {} -> {}", temp_output_path, output_path)
                 if os.path.exists(output_path):
                     os.remove(output_path)
                 os.rename(temp_output_path, output_path)
 
-            logger.info(f"動画変換が完了しました: {output_path}")
+            logger.info("動画変換が完了しました: {}", output_path)
             return output_path
 
         except Exception as e:
@@ -259,116 +471,216 @@ class FFmpegWrapper:
             if temp_output_path and os.path.exists(temp_output_path):
                 try:
                     os.remove(temp_output_path)
-                    print(f"デバッグ: 一時ファイルを削除しました: {temp_output_path}")
+                    logger.debug("一時ファイルを削除しました: {}", temp_output_path)
                 except:
                     pass
-            logger.error(f"動画変換中にエラーが発生しました: {str(e)}")
+            logger.error("動画変換中にエラーが発生しました: {}", e)
             raise
 
-    def get_audio_info(self, file_path: str) -> Dict[str, str]:
-        """オーディオファイルの情報を取得"""
-        if not os.path.exists(file_path):
-            logger.error(f"ファイルが見つかりません: {file_path}")
-            raise FileNotFoundError(f"ファイルが見つかりません: {file_path}")
-
+    def _prepare_loudness_filter(
+        self,
+        input_path: str,
+        duration: Optional[float],
+        progress_callback: Optional[ProgressCallback]
+    ) -> Tuple[str, Optional[ProgressCallback]]:
+        """正規化のフィルタと、エンコードの進捗を通知するコールバックを用意
+
+        解析を実行する場合は、進捗の前半を解析、後半をエンコードに割り当てる。
+        """
+        measurement = self.normalizer.cached_measurement(input_path)
+        if measurement is not None:
+            return self.normalizer.build_filter(measurement), progress_callback
+        if progress_callback is None:
+            return self.normalizer.build_filter(self.normalizer.analyze(input_path, duration)), None
+
+        def scaled(offset: float) -> ProgressCallback:
+            def on_progress(progress: Dict[str, Any]) -> None:
+                fraction = progress.get("fraction")
+                if fraction is not None:
+                    progress = dict(progress, fraction=offset + fraction * 0.5)
+                progress_callback(progress)
+            return on_progress
+
+        measurement = self.normalizer.analyze(input_path, duration, scaled(0.0))
+        return self.normalizer.build_filter(measurement), scaled(0.5)
+
+    def _encode_video_segmented(
+        self,
+        input_path: str,
+        output_path: str,
+        quality_preset: str,
+        duration: float,
+        progress_callback: Optional[ProgressCallback]
+    ) -> bool:
+        """MP4の分割エンコード（映像が無い場合は分割しない）"""
+        media_info = self.get_media_info(input_path)
+        if media_info is None or not media_info.has_video:
+            return False
+        encode_args = build_video_encode_args(quality_preset)
+        audio_args = build_video_encode_args(quality_preset, include_scale=False) if media_info.has_audio else None
+        return self.segmented_encoder.encode_video(
+            input_path, output_path, encode_args, audio_args, duration, progress_callback
+        )
+
+    def _try_segmented(self, input_path: str, encode: Callable[[], bool]) -> bool:
+        """分割エンコードを試す（失敗した場合は通常のエンコードに切り替えるためFalseを返す）"""
         try:
-            # 入力ファイルの拡張子を取得
-            input_ext = os.path.splitext(file_path)[1].lower().lstrip(".")
-            is_video = input_ext in ["mp4", "mkv", "mov"]
+            return encode()
+        except Exception as e:
+            logger.warning("分割エンコードに失敗したため通常の方法で変換します: {}: {}", input_path, e)
+            return False
 
-            print(f"デバッグ: ファイル情報の取得開始: {file_path}")
-            result = subprocess.run(
-                [
-                    self.ffmpeg_path,
-                    "-i", file_path
-                ],
-                capture_output=True,
-                text=True
-            )
+    def convert_multi(
+        self,
+        input_path: str,
+        outputs: List[Dict[str, Any]],
+        has_audio: bool = True,
+        has_video: bool = False,
+        duration: Optional[float] = None,
+        progress_callback: Optional[ProgressCallback] = None,
+        normalize: bool = False
+    ) -> List[str]:
+        """1回のデコードで複数の形式に出力
+
+        outputs の各要素は {"format", "output_path", "quality_preset"}。
+        映像はsplit、音声はasplitで分岐し、品質設定ごとに縮小してから各出力へ渡す。
+        normalize=True の場合はMP3/WAVの出力だけをラウドネス正規化する（解析は1回）。
+        """
+        if not os.path.exists(input_path):
+            logger.error("入力ファイルが見つかりません: {}", input_path)
+            raise FileNotFoundError(f"入力ファイルが見つかりません: {input_path}")
+
+        video_outputs = [o for o in outputs if o["format"] == "mp4"]
+        if not has_audio and (len(video_outputs) < len(outputs) or not has_video):
+            raise RuntimeError(f"音声ストリームが無いため音声形式に変換できません: {input_path}")
+
+        # フィルタグラフを構築（映像は品質設定ごとに縮小、音声は出力数だけ分岐）
+        filters = []
+        video_labels: List[str] = []
+        if video_outputs and has_video:
+            split_labels = [f"[vsplit{i}]" for i in range(len(video_outputs))]
+            filters.append(f"[0:v:0]split={len(video_outputs)}{''.join(split_labels)}")
+            for i, target in enumerate(video_outputs):
+                max_height = get_video_preset(target.get("quality_preset", "normal"))["max_height"]
+                if max_height:
+                    filters.append(f"{split_labels[i]}scale=-2:{max_height}[v{i}]")
+                    video_labels.append(f"[v{i}]")
+                else:
+                    video_labels.append(split_labels[i])
+        audio_labels: List[str] = []
+        if has_audio:
+            audio_labels = [f"[a{i}]" for i in range(len(outputs))]
+            filters.append(f"[0:a:0]asplit={len(outputs)}{''.join(audio_labels)}")
+            if normalize and len(video_outputs) < len(outputs):
+                loudness_filter, progress_callback = self._prepare_loudness_filter(
+                    input_path, duration, progress_callback
+                )
+                for i, target in enumerate(outputs):
+                    if target["format"] != "mp4":
+                        filters.append(f"{audio_labels[i]}{loudness_filter}[n{i}]")
+                        audio_labels[i] = f"[n{i}]"
 
-            # FFmpegは情報を標準エラーに出力する
-            output = result.stderr if result.stderr else ""
-
-            # 基本的な情報を抽出
-            info = {
-                "format": "unknown",
-                "duration": "unknown",
-                "bitrate": "unknown",
-                "channels": "unknown",
-                "sample_rate": "unknown",
-                "is_video": is_video
-            }
-
-            # 出力から情報を解析
-            if "Audio: " in output:
-                print(f"デバッグ: オーディオ情報を検出")
-                audio_lines = [line for line in output.split('\n') if "Audio: " in line]
-                if audio_lines:
-                    audio_line = audio_lines[0]
-                    audio_parts = audio_line.split("Audio: ")
-                    if len(audio_parts) > 1:
-                        format_parts = audio_parts[1].split(",")
-                        if format_parts:
-                            info["format"] = format_parts[0]
-
-                    if "Hz" in audio_line:
-                        try:
-                            hz_parts = audio_line.split("Hz")
-                            if hz_parts and len(hz_parts) > 0:
-                                sample_rate_parts = hz_parts[0].split()
-                                if sample_rate_parts:
-                                    info["sample_rate"] = sample_rate_parts[-1]
-                        except (IndexError, ValueError) as e:
-                            print(f"デバッグ: サンプルレート情報の抽出に失敗: {str(e)}")
-
-                    if "stereo" in audio_line:
-                        info["channels"] = "2"
-                    elif "mono" in audio_line:
-                        info["channels"] = "1"
-                    elif "channels" in audio_line:
-                        try:
-                            channel_parts = [part for part in audio_line.split(", ") if "channel" in part]
-                            if channel_parts and len(channel_parts) > 0:
-                                channel_info = channel_parts[0]
-                                channel_value = channel_info.split()
-                                if channel_value and len(channel_value) > 0:
-                                    info["channels"] = channel_value[0]
-                        except (IndexError, ValueError) as e:
-                            print(f"デバッグ: チャンネル情報の抽出に失敗: {str(e)}")
+        command = [
+            self.ffmpeg_path,
+            "-i", input_path,
+            "-y",  # 既存ファイルを上書き
+            "-filter_complex", ";".join(filters)
+        ]
+
+        # 出力ごとにマッピングとエンコード設定を追加（上書きモードは一時ファイルに出力）
+        temp_paths: Dict[str, str] = {}
+        video_index = 0
+        for i, target in enumerate(outputs):
+            output_path = target["output_path"]
+            actual_output_path = get_temp_output_path(input_path, output_path) or output_path
+            if actual_output_path != output_path:
+                temp_paths[output_path] = actual_output_path
+
+            if target["format"] == "mp4":
+                # 映像が無い入力は単独変換と同様に音声のみのMP4にする
+                if video_labels:
+                    command.extend(["-map", video_labels[video_index]])
+                    video_index += 1
+                if has_audio:
+                    command.extend(["-map", audio_labels[i]])
+                command.extend(build_video_encode_args(target.get("quality_preset", "normal"), include_scale=False))
             else:
-                print(f"デバッグ: オーディオ情報が検出されませんでした")
+                command.extend(["-map", audio_labels[i]])
+                command.extend(build_audio_encode_args(target["format"]))
+            command.append(actual_output_path)
 
-            if "Duration: " in output:
-                print(f"デバッグ: デュレーション情報を検出")
-                try:
-                    duration_parts = output.split("Duration: ")
-                    if len(duration_parts) > 1:
-                        duration_line = duration_parts[1].split(",")[0]
-                        info["duration"] = duration_line.strip()
-                except (IndexError, ValueError) as e:
-                    print(f"デバッグ: デュレーション情報の抽出に失敗: {str(e)}")
-
-            if "bitrate: " in output:
-                print(f"デバッグ: ビットレート情報を検出")
-                try:
-                    bitrate_parts = [part for part in output.split() if "kb/s" in part]
-                    if bitrate_parts and len(bitrate_parts) > 0:
-                        info["bitrate"] = bitrate_parts[0]
-                except (IndexError, ValueError) as e:
-                    print(f"デバッグ: ビットレート情報の抽出に失敗: {str(e)}")
+        logger.info("複数形式への変換を開始: {} -> {}", input_path, [o['output_path'] for o in outputs])
+        logger.opt(lazy=True).debug("実行するコマンド: {}", lambda: ' '.join(command))
+        try:
+            job_class = JOB_VIDEO if any(o["format"] == "mp4" for o in outputs) else JOB_AUDIO
+            actual_output_paths = [temp_paths.get(o["output_path"], o["output_path"]) for o in outputs]
+            with self.governor.lease(job_class) as threads:
+                result = self.runner.run(
+                    apply_thread_args(command, threads, actual_output_paths), duration, progress_callback
+                )
 
-            print(f"デバッグ: 取得したファイル情報: {info}")
-            return info
+            if result.returncode != 0:
+                logger.error("複数形式への変換中にエラーが発生しました: {}", result.stderr)
+                raise RuntimeError(f"複数形式への変換中にエラーが発生しました: {result.stderr}")
+
+            # 一時ファイルを使用した場合、元ファイルを置き換え
+            for output_path, temp_output_path in temp_paths.items():
+                logger.debug("一時ファイルを元ファイルに置き換え: {} -> {}", temp_output_path, output_path)
+                os.replace(temp_output_path, output_path)
+
+            logger.info("複数形式への変換が完了しました: {}", input_path)
+            return [o["output_path"] for o in outputs]
+
+        except Exception as e:
+            # エラー時に一時ファイルをクリーンアップ
+            for temp_output_path in temp_paths.values():
+                if os.path.exists(temp_output_path):
+                    try:
+                        os.remove(temp_output_path)
+                        logger.debug("一時ファイルを削除しました: {}", temp_output_path)
+                    except OSError:
+                        pass
+            logger.error("複数形式への変換中にエラーが発生しました: {}", e)
+            raise
 
+    def probe(self, file_path: str) -> MediaInfo:
+        """ffprobeでファイルを解析してMediaInfoを返す"""
+        if not os.path.exists(file_path):
+            logger.error("ファイルが見つかりません: {}", file_path)
+            raise FileNotFoundError(f"ファイルが見つかりません: {file_path}")
+        return self.prober.probe(file_path)
+
+    def get_media_info(self, file_path: str) -> Optional[MediaInfo]:
+        """MediaInfoを取得（解析に失敗した場合はNone）"""
+        if not os.path.exists(file_path):
+            logger.error("ファイルが見つかりません: {}", file_path)
+            raise FileNotFoundError(f"ファイルが見つかりません: {file_path}")
+        try:
+            return self.prober.probe(file_path)
         except Exception as e:
-            logger.error(f"ファイル情報の取得中にエラーが発生しました: {str(e)}")
-            print(f"エラー詳細: {str(e)}")
+            logger.error("ファイル情報の取得中にエラーが発生しました: {}", e)
+            return None
+
+    def get_audio_info(self, file_path: str) -> Dict[str, Any]:
+        """オーディオファイルの情報を取得"""
+        media_info = self.get_media_info(file_path)
+        if media_info is None:
             # エラーが発生しても基本情報を返す
-            return {
-                "format": "unknown",
-                "duration": "unknown",
-                "bitrate": "unknown",
-                "channels": "unknown",
-                "sample_rate": "unknown",
-                "is_video": input_ext in ["mp4", "mkv", "mov"]
-            }
\ No newline at end of file
+            return self.get_fallback_info(file_path)
+        info = media_info.to_info_dict()
+        logger.debug("取得したファイル情報: {}", info)
+        return info
+
+    def get_fallback_info(self, file_path: str) -> Dict[str, Any]:
+        """ファイル情報が取得できない場合の基本情報（拡張子から動画か判定）"""
+        input_ext = os.path.splitext(file_path)[1].lower().lstrip(".")
+        return {
+            "format": "unknown",
+            "duration": "unknown",
+            "duration_seconds": None,
+            "bitrate": "unknown",
+            "channels": "unknown",
+            "sample_rate": "unknown",
+            "is_video": input_ext in ["mp4", "mkv", "mov"],
+            "video_codec": None
+        }
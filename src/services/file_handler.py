@@ -1,5 +1,6 @@
 import os
-from typing import List, Set
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 from ..utils.logger import logger
 from ..utils.config_loader import config
 
@@ -7,87 +8,246 @@ class FileHandler:
     """ファイル操作を行うハンドラークラス"""
 
     def __init__(self):
-        print("デバッグ: FileHandlerの初期化開始")
+        logger.debug("FileHandlerの初期化開始")
         self.max_files = config.get_app_settings().get("max_files", 20)
         self.supported_formats: Set[str] = {
             # 入力として受け付ける形式
             "mp3", "wav", "aac", "m4a", "wma", "ogg", "flac",
             "mkv", "mp4", "mov"  # 動画フォーマットを追加（movも追加）
         }
-        print(f"デバッグ: サポートされているフォーマット: {self.supported_formats}")
+        logger.debug("サポートされているフォーマット: {}", self.supported_formats)
 
-    def validate_files(self, file_paths: List[str]) -> List[str]:
-        """ファイルの検証を行い、有効なファイルパスのリストを返す"""
-        valid_files = []
+    def validate_files(
+        self,
+        file_paths: List[str],
+        timings: Optional[Dict[str, float]] = None,
+        on_invalid: Optional[Callable[[str, str], None]] = None,
+        limit_files: bool = True
+    ) -> List[str]:
+        """ファイルの検証を行い、有効なファイルパスのリストを返す
 
-        print(f"デバッグ: 検証開始 - 入力ファイル数: {len(file_paths)}")
-        if len(file_paths) > self.max_files:
-            print(f"警告: ファイル数が制限を超えています（最大{self.max_files}個）")
-            logger.warning(f"ファイル数が制限を超えています。最初の{self.max_files}個のファイルのみ処理します。")
+        timingsを指定すると、有効なファイルごとの検証にかかった時間（秒）を記録する。
+        limit_files=True の場合は設定の最大ファイル数までに制限し、超えた分はon_invalidに通知する。
+        """
+        logger.debug("検証開始 - 入力ファイル数: {}", len(file_paths))
+        if limit_files and len(file_paths) > self.max_files:
+            logger.warning("ファイル数が制限を超えています。最初の{}個のファイルのみ処理します。", self.max_files)
+            if on_invalid:
+                for file_path in file_paths[self.max_files:]:
+                    on_invalid(file_path, f"ファイル数の上限（{self.max_files}個）を超えています")
             file_paths = file_paths[:self.max_files]
 
+        valid_files = list(self.iter_valid_files(file_paths, on_invalid, timings))
+        logger.debug("検証完了 - 有効なファイル数: {}", len(valid_files))
+        return valid_files
+
+    def iter_valid_files(
+        self,
+        file_paths: Iterable[str],
+        on_invalid: Optional[Callable[[str, str], None]] = None,
+        timings: Optional[Dict[str, float]] = None
+    ) -> Iterator[str]:
+        """ファイルを1件ずつ検証し、有効なパスを逐次返す（件数の制限なし）
+
+        on_invalidを指定すると、除外したファイルのパスと理由を通知する。
+        timingsを指定すると、有効なファイルごとの検証にかかった時間（秒）を記録する。
+        """
         for file_path in file_paths:
+            started = time.perf_counter()
             try:
-                print(f"\nデバッグ: ファイルの検証: {file_path}")
+                logger.debug("ファイルの検証: {}", file_path)
                 # パスの正規化
                 normalized_path = os.path.normpath(file_path)
-                print(f"デバッグ: 正規化されたパス: {normalized_path}")
+                logger.debug("正規化されたパス: {}", normalized_path)
 
                 # ファイルの存在確認
                 if not os.path.exists(normalized_path):
-                    print(f"エラー: ファイルが見つかりません: {normalized_path}")
-                    logger.error(f"ファイルが見つかりません: {normalized_path}")
+                    logger.error("ファイルが見つかりません: {}", normalized_path)
+                    if on_invalid:
+                        on_invalid(normalized_path, "ファイルが見つかりません")
                     continue
 
                 # ファイル拡張子の確認
                 ext = os.path.splitext(normalized_path)[1].lower().lstrip(".")
-                print(f"デバッグ: ファイル拡張子: {ext}")
+                logger.debug("ファイル拡張子: {}", ext)
 
                 if ext not in self.supported_formats:
-                    print(f"警告: サポートされていない形式です: {ext}")
-                    logger.warning(f"サポートされていないファイル形式です: {normalized_path}")
+                    logger.warning("サポートされていないファイル形式です: {}", normalized_path)
+                    if on_invalid:
+                        on_invalid(normalized_path, f"サポートされていないファイル形式です: {ext}")
                     continue
 
-                valid_files.append(normalized_path)
-                print(f"デバッグ: ファイルの検証が完了しました: {normalized_path}")
-                logger.info(f"ファイルの検証が完了しました: {normalized_path}")
+                logger.debug("ファイルの検証が完了しました: {}", normalized_path)
+                if timings is not None:
+                    timings[normalized_path] = time.perf_counter() - started
+                yield normalized_path
 
             except Exception as e:
-                print(f"エラー: ファイルの検証中にエラーが発生: {str(e)}")
-                logger.error(f"ファイルの検証中にエラーが発生しました: {str(e)}")
+                logger.error("ファイルの検証中にエラーが発生しました: {}", e)
+                if on_invalid:
+                    on_invalid(file_path, str(e))
                 continue
 
-        print(f"\nデバッグ: 検証完了 - 有効なファイル数: {len(valid_files)}")
-        return valid_files
+    def iter_input_files(
+        self,
+        paths: Iterable[str],
+        on_invalid: Optional[Callable[[str, str], None]] = None,
+        follow_symlinks: bool = False
+    ) -> Iterator[str]:
+        """ファイルとディレクトリの混在した入力から、有効なファイルのパスを逐次返す（件数の制限なし）
+
+        ディレクトリはscan_directoryで再帰的に走査し、サポートされている形式のファイルだけを返す
+        （対象外の形式のファイルは除外として通知しない）。ファイルはiter_valid_filesと同じ検証を行う。
+        """
+        for path in paths:
+            normalized_path = os.path.normpath(path)
+            if not os.path.isdir(normalized_path):
+                yield from self.iter_valid_files((path,), on_invalid)
+                continue
+            logger.debug("ディレクトリの走査: {}", normalized_path)
+            for entry in self.scan_directory(normalized_path, follow_symlinks, on_invalid):
+                yield entry.path
+
+    def split_directories(self, paths: List[str]) -> Tuple[List[str], List[str]]:
+        """パスの一覧を (ファイル, ディレクトリ) に分ける（入力の順序は保つ）
+
+        パスごとにstatすると、ネットワークドライブでは1件ごとに往復が発生するため、
+        親ディレクトリをos.scandirで1回だけ読み、DirEntryの種類の情報で判定する。
+        一覧に無いパスや、親ディレクトリを読み取れない場合はos.path.isdirで判定する。
+        """
+        wanted: Dict[str, Set[str]] = {}
+        for path in paths:
+            parent, name = os.path.split(os.path.normpath(path))
+            wanted.setdefault(parent, set()).add(os.path.normcase(name))
+
+        is_directory: Dict[Tuple[str, str], bool] = {}
+        for parent, names in wanted.items():
+            try:
+                with os.scandir(parent or ".") as entries:
+                    for entry in entries:
+                        name = os.path.normcase(entry.name)
+                        if name in names:
+                            try:
+                                is_directory[(parent, name)] = entry.is_dir()
+                            except OSError:
+                                continue
+            except OSError as e:
+                logger.debug("ディレクトリを読み取れないため1件ずつ判定します: {}: {}", parent, e)
 
-    def get_output_path(self, input_path: str, output_format: str, overwrite_mode: bool = False) -> str:
-        """出力ファイルパスを生成"""
+        files: List[str] = []
+        directories: List[str] = []
+        for path in paths:
+            parent, name = os.path.split(os.path.normpath(path))
+            found = is_directory.get((parent, os.path.normcase(name)))
+            if found is None:
+                found = os.path.isdir(path)
+            (directories if found else files).append(path)
+        return files, directories
+
+    def scan_directory(
+        self,
+        root: str,
+        follow_symlinks: bool = False,
+        on_error: Optional[Callable[[str, str], None]] = None
+    ) -> Iterator[os.DirEntry]:
+        """ディレクトリをos.scandirで再帰的に走査し、サポートされている形式のファイルのDirEntryを逐次返す
+
+        ディレクトリごとに名前順で、ファイルを返してからサブディレクトリに進む（os.walkと同じ順序）。
+        種類の判定はDirEntryがディレクトリの読み取り時に取得した情報を使うため、ファイルごとのstatは行わない
+        （サイズなどはentry.stat()で取得でき、Windowsでは追加のシステムコールも不要）。
+        シンボリックリンクはfollow_symlinks=Trueの場合のみたどり、同じディレクトリを二度走査しない。
+        読み取れないディレクトリはon_errorに通知して飛ばす。
+        """
+        supported = self.supported_formats
+        visited: Set[Tuple[int, int]] = set()
+        if follow_symlinks:
+            root_stat = os.stat(root)
+            visited.add((root_stat.st_dev, root_stat.st_ino))
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            files: List[os.DirEntry] = []
+            subdirectories: List[os.DirEntry] = []
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=follow_symlinks):
+                                subdirectories.append(entry)
+                                continue
+                            ext = entry.name.rpartition(".")[2].lower() if "." in entry.name else ""
+                            if ext in supported and entry.is_file(follow_symlinks=follow_symlinks):
+                                files.append(entry)
+                        except OSError as e:
+                            logger.warning("ファイルの種類を判定できませんでした: {}: {}", entry.path, e)
+            except OSError as e:
+                logger.warning("ディレクトリを読み取れませんでした: {}: {}", directory, e)
+                if on_error:
+                    on_error(directory, f"ディレクトリを読み取れませんでした: {e}")
+                continue
+
+            files.sort(key=lambda entry: entry.name)
+            yield from files
+
+            next_directories = []
+            for entry in sorted(subdirectories, key=lambda entry: entry.name):
+                if follow_symlinks:
+                    try:
+                        stat = entry.stat()
+                    except OSError as e:
+                        logger.warning("ディレクトリの情報を取得できませんでした: {}: {}", entry.path, e)
+                        continue
+                    key = (stat.st_dev, stat.st_ino)
+                    if key in visited:
+                        logger.debug("走査済みのディレクトリのため飛ばします: {}", entry.path)
+                        continue
+                    visited.add(key)
+                next_directories.append(entry.path)
+            # 名前順に走査するため逆順で積む
+            stack.extend(reversed(next_directories))
+
+    def get_output_path(
+        self,
+        input_path: str,
+        output_format: str,
+        overwrite_mode: bool = False,
+        reserved_paths: Optional[Set[str]] = None,
+        variant: Optional[str] = None
+    ) -> str:
+        """出力ファイルパスを生成
+
+        reserved_pathsに含まれるパスは使用済みとして扱う。
+        variantを指定するとファイル名に付与する（同じ形式を複数出力する場合など）。
+        """
         try:
-            print(f"デバッグ: 出力パスの生成開始 - 入力: {input_path}, 上書きモード: {overwrite_mode}")
+            logger.debug("出力パスの生成開始 - 入力: {}, 上書きモード: {}", input_path, overwrite_mode)
             directory = os.path.dirname(input_path)
             filename = os.path.splitext(os.path.basename(input_path))[0]
-            
+            if variant:
+                filename = f"{filename}_{variant}"
+
             if overwrite_mode:
                 # 上書きモード：元ファイルと同じ名前で出力
                 output_path = os.path.join(directory, f"{filename}.{output_format}")
-                print(f"デバッグ: 上書きモードで生成された出力パス: {output_path}")
+                logger.debug("上書きモードで生成された出力パス: {}", output_path)
             else:
                 # 安全モード：_convertedを付けて別名保存
                 output_path = os.path.join(directory, f"{filename}_converted.{output_format}")
-                print(f"デバッグ: 安全モードで生成された出力パス: {output_path}")
+                logger.debug("安全モードで生成された出力パス: {}", output_path)
 
                 # 同名ファイルが存在する場合、連番を付与
                 counter = 1
-                while os.path.exists(output_path):
-                    print(f"デバッグ: 同名ファイルが存在するため連番を付与: {counter}")
+                while os.path.exists(output_path) or (
+                    reserved_paths is not None and os.path.normcase(output_path) in reserved_paths
+                ):
+                    logger.debug("同名ファイルが存在するため連番を付与: {}", counter)
                     output_path = os.path.join(directory, f"{filename}_converted_{counter}.{output_format}")
                     counter += 1
 
             return output_path
 
         except Exception as e:
-            print(f"エラー: 出力パスの生成中にエラーが発生: {str(e)}")
-            logger.error(f"出力パスの生成中にエラーが発生しました: {str(e)}")
+            logger.error("出力パスの生成中にエラーが発生しました: {}", e)
             raise
 
     def cleanup_temp_files(self, file_paths: List[str]) -> None:
@@ -96,9 +256,8 @@ class FileHandler:
             try:
                 if os.path.exists(file_path):
                     os.remove(file_path)
-                    print(f"デバッグ: 一時ファイルを削除: {file_path}")
-                    logger.info(f"一時ファイルを削除しました: {file_path}")
+                    logger.debug("一時ファイルを削除: {}", file_path)
+                    logger.info("一時ファイルを削除しました: {}", file_path)
             except Exception as e:
-                print(f"エラー: 一時ファイルの削除中にエラーが発生: {str(e)}")
-                logger.error(f"一時ファイルの削除中にエラーが発生しました: {str(e)}")
+                logger.error("一時ファイルの削除中にエラーが発生しました: {}", e)
                 continue
\ No newline at end of file
@@ -0,0 +1,257 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from .output_allocator import is_unused_placeholder
+from .probe_cache import file_identity
+from ..utils.logger import logger
+
+# ジョブの状態
+STATE_QUEUED = "queued"
+STATE_RUNNING = "running"
+STATE_DONE = "done"
+STATE_FAILED = "failed"
+
+
+@dataclass
+class JournalEntry:
+    """ジャーナルに記録された1ジョブ分の情報"""
+    job_key: str
+    input_path: str
+    state: str
+    output_paths: List[str] = field(default_factory=list)
+    temp_paths: List[str] = field(default_factory=list)
+    input_identity: Optional[List[int]] = None
+    error: Optional[str] = None
+    attempts: int = 0
+
+
+class JobJournal:
+    """変換ジョブの状態をSQLiteに記録し、中断したバッチを再開できるようにするジャーナル
+
+    状態が変わるたびにコミットするため、プロセスが途中で落ちても
+    完了済みのジョブと、実行中だったジョブ（一時ファイルの後始末が必要）を判別できる。
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # 電源断でも完了の記録を失わないようにする
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_key TEXT PRIMARY KEY,
+                input_path TEXT NOT NULL,
+                params TEXT NOT NULL,
+                state TEXT NOT NULL,
+                output_paths TEXT NOT NULL,
+                temp_paths TEXT NOT NULL,
+                input_identity TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state)")
+        # バッチ全体の設定（入力の指定や出力形式など、再開時に使う）
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+        logger.info("ジョブジャーナルを開きました: {}", db_path)
+
+    @staticmethod
+    def make_key(input_path: str, params: Dict[str, Any]) -> str:
+        """入力パスと変換設定からジョブキーを生成"""
+        hasher = hashlib.blake2b(digest_size=20)
+        hasher.update(os.path.normcase(os.path.abspath(input_path)).encode("utf-8"))
+        hasher.update(json.dumps(params, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        return hasher.hexdigest()
+
+    def get(self, job_key: str) -> Optional[JournalEntry]:
+        """ジョブの記録を取得（未登録ならNone）"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_key, input_path, state, output_paths, temp_paths, input_identity, error, attempts "
+                "FROM jobs WHERE job_key = ?",
+                (job_key,)
+            ).fetchone()
+        return self._to_entry(row) if row else None
+
+    def find_completed(self, job_key: str) -> Optional[JournalEntry]:
+        """完了済みで、入力が変わっておらず出力も残っているジョブを返す"""
+        entry = self.get(job_key)
+        if entry is None or entry.state != STATE_DONE or not entry.output_paths:
+            return None
+        try:
+            if list(file_identity(entry.input_path)[1:]) != entry.input_identity:
+                return None
+        except OSError:
+            return None
+        if not all(os.path.exists(path) for path in entry.output_paths):
+            return None
+        return entry
+
+    def mark_queued(
+        self,
+        job_key: str,
+        input_path: str,
+        params: Dict[str, Any],
+        output_paths: List[str],
+        temp_paths: List[str]
+    ) -> None:
+        """ジョブを登録（再実行の場合は出力先を更新して待機状態に戻す）"""
+        try:
+            identity = json.dumps(list(file_identity(input_path)[1:]))
+        except OSError:
+            identity = None
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO jobs (job_key, input_path, params, state, output_paths, temp_paths,
+                                  input_identity, error, attempts, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, NULL, 0, ?)
+                ON CONFLICT (job_key) DO UPDATE SET
+                    state = excluded.state,
+                    output_paths = excluded.output_paths,
+                    temp_paths = excluded.temp_paths,
+                    input_identity = excluded.input_identity,
+                    error = NULL,
+                    updated_at = excluded.updated_at
+                """,
+                (
+                    job_key, input_path, json.dumps(params, sort_keys=True, ensure_ascii=False), STATE_QUEUED,
+                    json.dumps(output_paths, ensure_ascii=False), json.dumps(temp_paths, ensure_ascii=False),
+                    identity, time.time()
+                )
+            )
+            self._conn.commit()
+
+    def mark_running(self, job_key: str) -> None:
+        """ジョブの実行開始を記録"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, attempts = attempts + 1, updated_at = ? WHERE job_key = ?",
+                (STATE_RUNNING, time.time(), job_key)
+            )
+            self._conn.commit()
+
+    def mark_done(self, job_key: str) -> None:
+        """ジョブの完了を記録"""
+        self._set_state(job_key, STATE_DONE, None)
+
+    def mark_failed(self, job_key: str, error: str) -> None:
+        """ジョブの失敗を記録"""
+        self._set_state(job_key, STATE_FAILED, error)
+
+    def recover(self) -> List[JournalEntry]:
+        """前回の実行で完了しなかったジョブの一時ファイルと書きかけの出力を削除し、待機状態に戻す
+
+        削除するのは一時ファイルと、実行中・失敗だったジョブの出力のみ（入力ファイルは消さない）。
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_key, input_path, state, output_paths, temp_paths, input_identity, error, attempts "
+                "FROM jobs WHERE state != ?",
+                (STATE_DONE,)
+            ).fetchall()
+        entries = [self._to_entry(row) for row in rows]
+
+        removed = 0
+        for entry in entries:
+            leftovers = list(entry.temp_paths)
+            if entry.state in (STATE_RUNNING, STATE_FAILED):
+                leftovers.extend(entry.output_paths)
+            else:
+                # 開始前のジョブは、出力名を確保するために作成した空のファイルだけを削除
+                leftovers.extend(path for path in entry.output_paths if is_unused_placeholder(path))
+            input_path = os.path.normcase(os.path.abspath(entry.input_path))
+            for path in leftovers:
+                if os.path.normcase(os.path.abspath(path)) == input_path or not os.path.exists(path):
+                    continue
+                try:
+                    if os.path.isdir(path):
+                        # 分割エンコードの作業ディレクトリ
+                        shutil.rmtree(path)
+                    else:
+                        os.remove(path)
+                    removed += 1
+                    logger.info("中断されたジョブの一時ファイルを削除しました: {}", path)
+                except OSError as e:
+                    logger.warning("一時ファイルを削除できませんでした: {}: {}", path, e)
+
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, updated_at = ? WHERE state IN (?, ?)",
+                (STATE_QUEUED, time.time(), STATE_RUNNING, STATE_FAILED)
+            )
+            self._conn.commit()
+        logger.info("未完了のジョブ: {}件（削除したファイル: {}件）", len(entries), removed)
+        return entries
+
+    def reset(self) -> None:
+        """記録をすべて削除（新しいバッチを開始する場合）"""
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs")
+            self._conn.execute("DELETE FROM meta")
+            self._conn.commit()
+
+    def set_meta(self, name: str, value: Any) -> None:
+        """バッチ全体の設定を保存"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)",
+                (name, json.dumps(value, ensure_ascii=False))
+            )
+            self._conn.commit()
+
+    def get_meta(self, name: str, default: Any = None) -> Any:
+        """バッチ全体の設定を取得"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def stats(self) -> Dict[str, int]:
+        """状態ごとのジョブ数を取得"""
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        counts = {STATE_QUEUED: 0, STATE_RUNNING: 0, STATE_DONE: 0, STATE_FAILED: 0}
+        counts.update(dict(rows))
+        return counts
+
+    def close(self) -> None:
+        """ジャーナルを閉じる"""
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+    def _set_state(self, job_key: str, state: str, error: Optional[str]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, error = ?, updated_at = ? WHERE job_key = ?",
+                (state, error, time.time(), job_key)
+            )
+            self._conn.commit()
+
+    def _to_entry(self, row: tuple) -> JournalEntry:
+        return JournalEntry(
+            job_key=row[0],
+            input_path=row[1],
+            state=row[2],
+            output_paths=json.loads(row[3]),
+            temp_paths=json.loads(row[4]),
+            input_identity=json.loads(row[5]) if row[5] else None,
+            error=row[6],
+            attempts=row[7]
+        )
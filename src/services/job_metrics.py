@@ -0,0 +1,298 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from ..utils.logger import logger
+
+# ヒストグラムの区切り（Prometheusのle）
+ENCODE_SECONDS_BUCKETS = [0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600, 1800, 3600]
+QUEUE_WAIT_SECONDS_BUCKETS = [0.01, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900]
+REALTIME_FACTOR_BUCKETS = [0.25, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500]
+
+
+@dataclass
+class JobMetrics:
+    """1ジョブの処理時間の内訳と資源使用量（計測していない項目はNone）"""
+    validation_seconds: Optional[float] = None
+    probe_seconds: Optional[float] = None
+    queue_wait_seconds: Optional[float] = None
+    encode_seconds: Optional[float] = None
+    media_duration: Optional[float] = None
+    realtime_factor: Optional[float] = None  # 再生時間 / エンコード時間
+    ffmpeg_speed: Optional[float] = None     # FFmpegが報告した速度（複数回実行した場合は平均）
+    input_bytes: Optional[int] = None
+    output_bytes: Optional[int] = None
+    cpu_user_seconds: Optional[float] = None
+    cpu_system_seconds: Optional[float] = None
+    max_rss_kb: Optional[int] = None
+    ffmpeg_runs: int = 0
+    job_seconds: Optional[float] = None             # ワーカーでの処理全体の時間
+    ffmpeg_wall_seconds: Optional[float] = None     # FFmpegのプロセスが1つ以上動いていた時間
+    python_overhead_seconds: Optional[float] = None  # job_seconds - ffmpeg_wall_seconds
+    encoder_benchmark: Optional[Dict[str, float]] = None  # -benchmark の結果の合計（プロファイリング時のみ）
+    submitted_at: Optional[float] = field(default=None, repr=False)
+    _speeds: List[float] = field(default_factory=list, repr=False)
+    _intervals: List[Tuple[float, float]] = field(default_factory=list, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add_ffmpeg_run(
+        self,
+        rusage: Optional[Dict[str, Any]],
+        speed: Optional[float],
+        interval: Optional[Tuple[float, float]] = None,
+        benchmark: Optional[Dict[str, float]] = None
+    ) -> None:
+        """FFmpegの実行1回分のCPU時間と速度を加算（分割エンコードでは複数のスレッドから呼ばれる）
+
+        intervalはプロセスの開始・終了時刻（time.monotonic）。
+        """
+        with self._lock:
+            self.ffmpeg_runs += 1
+            if interval is not None:
+                self._intervals.append(interval)
+            if benchmark:
+                total = dict(self.encoder_benchmark or {})
+                for key, value in benchmark.items():
+                    # 最大RSSは合計ではなく最大値
+                    total[key] = max(total.get(key, 0.0), value) if key == "maxrss_kb" else total.get(key, 0.0) + value
+                self.encoder_benchmark = total
+            if speed:
+                self._speeds.append(speed)
+                self.ffmpeg_speed = round(sum(self._speeds) / len(self._speeds), 3)
+            if rusage:
+                self.cpu_user_seconds = round((self.cpu_user_seconds or 0.0) + rusage["user_cpu_seconds"], 3)
+                self.cpu_system_seconds = round((self.cpu_system_seconds or 0.0) + rusage["system_cpu_seconds"], 3)
+                self.max_rss_kb = max(self.max_rss_kb or 0, rusage["max_rss_kb"])
+
+    def mark_started(self) -> None:
+        """ワーカーで実行が始まった時点で待ち時間を確定"""
+        if self.submitted_at is not None:
+            self.queue_wait_seconds = round(time.monotonic() - self.submitted_at, 3)
+
+    def finish_encode(self, elapsed: float, output_path: Optional[str]) -> None:
+        """エンコード時間と出力サイズを記録"""
+        self.encode_seconds = round(elapsed, 3)
+        if self.media_duration and elapsed > 0:
+            self.realtime_factor = round(self.media_duration / elapsed, 2)
+        if output_path:
+            try:
+                self.output_bytes = os.path.getsize(output_path)
+            except OSError:
+                pass
+
+    def finish_job(self, elapsed: float) -> None:
+        """ジョブ全体の時間から、FFmpegの外（Python側）で使った時間を求める"""
+        self.job_seconds = round(elapsed, 3)
+        with self._lock:
+            intervals = sorted(self._intervals)
+        if not intervals:
+            return
+        # 並列に動いた区間の重なりは1回だけ数える
+        busy = 0.0
+        current_start, current_end = intervals[0]
+        for start, end in intervals[1:]:
+            if start > current_end:
+                busy += current_end - current_start
+                current_start, current_end = start, end
+            else:
+                current_end = max(current_end, end)
+        busy += current_end - current_start
+        self.ffmpeg_wall_seconds = round(busy, 3)
+        self.python_overhead_seconds = round(max(elapsed - busy, 0.0), 3)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            f.name: getattr(self, f.name) for f in fields(self)
+            if not f.name.startswith("_") and f.name != "submitted_at"
+        }
+
+
+# 実行中のジョブの計測先（FFmpegRunnerが実行結果を記録する）
+_current_job_metrics: ContextVar[Optional[JobMetrics]] = ContextVar("current_job_metrics", default=None)
+
+
+@contextmanager
+def job_metrics_scope(metrics: Optional[JobMetrics]) -> Iterator[None]:
+    """ブロック内で実行したFFmpegのCPU時間・速度をmetricsに記録する"""
+    token = _current_job_metrics.set(metrics)
+    try:
+        yield
+    finally:
+        _current_job_metrics.reset(token)
+
+
+def record_ffmpeg_run(
+    rusage: Optional[Dict[str, Any]],
+    speed: Optional[float],
+    interval: Optional[Tuple[float, float]] = None,
+    benchmark: Optional[Dict[str, float]] = None
+) -> None:
+    """実行中のジョブがあれば、FFmpegの実行結果を記録"""
+    metrics = _current_job_metrics.get()
+    if metrics is not None:
+        metrics.add_ffmpeg_run(rusage, speed, interval, benchmark)
+
+
+class Histogram:
+    """Prometheus形式の累積ヒストグラム"""
+
+    def __init__(self, buckets: List[float]):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """区切りの値から分位点を推定（区切りを超える場合は最大の区切り）"""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        for bound, count in zip(self.buckets, self.counts):
+            if count >= rank:
+                return bound
+        return self.buckets[-1]
+
+
+class MetricsRegistry:
+    """ジョブの計測結果を出力形式・品質設定ごとに集計し、Prometheusのテキスト形式とJSONで出力する
+
+    集計はプロセスの起動からの累積（GUIでは複数回の変換をまとめて集計する）。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    def observe(self, output_format: str, quality_preset: Optional[str], status: str, metrics: JobMetrics) -> None:
+        """1ジョブの計測結果を集計に加える"""
+        with self._lock:
+            series = self._series.get((output_format, quality_preset or ""))
+            if series is None:
+                series = {
+                    "jobs": {},
+                    "encode_seconds": Histogram(ENCODE_SECONDS_BUCKETS),
+                    "queue_wait_seconds": Histogram(QUEUE_WAIT_SECONDS_BUCKETS),
+                    "realtime_factor": Histogram(REALTIME_FACTOR_BUCKETS),
+                    "media_seconds": 0.0,
+                    "input_bytes": 0,
+                    "output_bytes": 0,
+                    "cpu_seconds": 0.0
+                }
+                self._series[(output_format, quality_preset or "")] = series
+            series["jobs"][status] = series["jobs"].get(status, 0) + 1
+            if status != "success":
+                return
+            if metrics.queue_wait_seconds is not None:
+                series["queue_wait_seconds"].observe(metrics.queue_wait_seconds)
+            # キャッシュヒットなどFFmpegを実行していないジョブは速度の集計に含めない
+            if metrics.ffmpeg_runs and metrics.encode_seconds is not None:
+                series["encode_seconds"].observe(metrics.encode_seconds)
+                if metrics.realtime_factor is not None:
+                    series["realtime_factor"].observe(metrics.realtime_factor)
+                series["media_seconds"] += metrics.media_duration or 0.0
+                series["cpu_seconds"] += (metrics.cpu_user_seconds or 0.0) + (metrics.cpu_system_seconds or 0.0)
+            series["input_bytes"] += metrics.input_bytes or 0
+            series["output_bytes"] += metrics.output_bytes or 0
+
+    def to_prometheus(self) -> str:
+        """Prometheusのテキスト形式（node_exporterのtextfile collectorで読み込める）"""
+        with self._lock:
+            items = sorted(self._series.items())
+            lines: List[str] = []
+
+            lines.append("# HELP convert_jobs_total Number of conversion jobs by result.")
+            lines.append("# TYPE convert_jobs_total counter")
+            for (output_format, preset), series in items:
+                for status, count in sorted(series["jobs"].items()):
+                    labels = self._labels(output_format, preset, status=status)
+                    lines.append(f"convert_jobs_total{{{labels}}} {count}")
+
+            for name, help_text in (
+                ("encode_seconds", "Wall time of ffmpeg encoding per job."),
+                ("queue_wait_seconds", "Time a job waited for a free worker."),
+                ("realtime_factor", "Media duration divided by encode wall time.")
+            ):
+                metric = f"convert_job_{name}"
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} histogram")
+                for (output_format, preset), series in items:
+                    histogram: Histogram = series[name]
+                    labels = self._labels(output_format, preset)
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f'{metric}_bucket{{{labels},le="{bound:g}"}} {count}')
+                    lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                    lines.append(f"{metric}_sum{{{labels}}} {histogram.sum:.6f}")
+                    lines.append(f"{metric}_count{{{labels}}} {histogram.count}")
+
+            for name, help_text in (
+                ("media_seconds", "Media duration encoded, in seconds."),
+                ("input_bytes", "Bytes read from input files."),
+                ("output_bytes", "Bytes written to output files."),
+                ("cpu_seconds", "CPU time used by ffmpeg child processes.")
+            ):
+                metric = f"convert_{name}_total"
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} counter")
+                for (output_format, preset), series in items:
+                    lines.append(f"{metric}{{{self._labels(output_format, preset)}}} {series[name]:g}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict[str, Any]:
+        """出力形式・品質設定ごとの集計（JSON用）"""
+        with self._lock:
+            result = []
+            for (output_format, preset), series in sorted(self._series.items()):
+                encode: Histogram = series["encode_seconds"]
+                realtime: Histogram = series["realtime_factor"]
+                result.append({
+                    "format": output_format,
+                    "quality_preset": preset or None,
+                    "jobs": dict(series["jobs"]),
+                    "encode_seconds_total": round(encode.sum, 3),
+                    "encode_seconds_p50": encode.quantile(0.5),
+                    "encode_seconds_p95": encode.quantile(0.95),
+                    "media_seconds_total": round(series["media_seconds"], 3),
+                    # 再生時間の合計 / エンコード時間の合計（並列実行の効果は含まない）
+                    "realtime_factor_mean": round(series["media_seconds"] / encode.sum, 2) if encode.sum else None,
+                    "realtime_factor_p50": realtime.quantile(0.5),
+                    "input_bytes_total": series["input_bytes"],
+                    "output_bytes_total": series["output_bytes"],
+                    "throughput_bytes_per_second": round(series["input_bytes"] / encode.sum) if encode.sum else None,
+                    "cpu_seconds_total": round(series["cpu_seconds"], 3)
+                })
+        return {"generated_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "series": result}
+
+    def write(self, prometheus_path: Optional[str], json_path: Optional[str]) -> None:
+        """集計結果をファイルに書き出す（一時ファイルに書いてから置き換える）"""
+        outputs = []
+        if prometheus_path:
+            outputs.append((prometheus_path, self.to_prometheus()))
+        if json_path:
+            outputs.append((json_path, json.dumps(self.summary(), indent=4, ensure_ascii=False) + "\n"))
+        for path, text in outputs:
+            try:
+                directory = os.path.dirname(path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                temp_path = f"{path}.tmp"
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    f.write(text)
+                os.replace(temp_path, path)
+            except OSError as e:
+                logger.warning("メトリクスを書き出せませんでした: {}: {}", path, e)
+
+    def _labels(self, output_format: str, preset: str, **extra: str) -> str:
+        labels = {"format": output_format, "preset": preset or "none"}
+        labels.update(extra)
+        return ",".join(f'{key}="{value}"' for key, value in labels.items())
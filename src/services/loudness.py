@@ -0,0 +1,252 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from .ffmpeg_runner import FFmpegRunner, ProgressCallback
+from .probe_cache import FileKey, file_identity
+from .thread_governor import JOB_AUDIO, ThreadGovernor, apply_thread_args
+from ..utils.logger import logger
+
+# 正規化の目標値（統合ラウドネス, トゥルーピーク, ラウドネスレンジ）
+LoudnessTarget = Tuple[float, float, float]
+
+
+@dataclass
+class LoudnessMeasurement:
+    """loudnormの1パス目（解析）で得られる入力の測定値"""
+    input_i: float       # 統合ラウドネス（LUFS）
+    input_tp: float      # トゥルーピーク（dBTP）
+    input_lra: float     # ラウドネスレンジ（LU）
+    input_thresh: float  # ゲートのしきい値（LUFS）
+    target_offset: float  # 目標値との差（LU）。目標値によって変わり、2パス目が動的モードになった場合に使われる
+
+    @classmethod
+    def from_loudnorm_json(cls, data: Dict[str, Any]) -> "LoudnessMeasurement":
+        """loudnormのprint_format=jsonの出力から作成"""
+        return cls(
+            input_i=float(data["input_i"]),
+            input_tp=float(data["input_tp"]),
+            input_lra=float(data["input_lra"]),
+            input_thresh=float(data["input_thresh"]),
+            target_offset=float(data["target_offset"])
+        )
+
+
+def parse_loudnorm_output(stderr: str) -> LoudnessMeasurement:
+    """FFmpegの標準エラー出力の末尾にあるloudnormのJSONを読み取る"""
+    end = stderr.rfind("}")
+    start = stderr.rfind("{", 0, end)
+    if start < 0 or end < 0:
+        raise RuntimeError("ラウドネスの解析結果が出力されませんでした")
+    try:
+        measurement = LoudnessMeasurement.from_loudnorm_json(json.loads(stderr[start:end + 1]))
+    except (ValueError, KeyError) as e:
+        raise RuntimeError(f"ラウドネスの解析結果を読み取れませんでした: {e}")
+    # 無音のファイルでは -inf になり、正規化できない
+    if not all(math.isfinite(value) for value in asdict(measurement).values()):
+        raise RuntimeError(f"無音などのためラウドネスを正規化できません: {measurement}")
+    return measurement
+
+
+class LoudnessCache:
+    """loudnormの解析結果をSQLiteに保存するキャッシュ
+
+    入力の測定値は入力ファイルの内容だけで決まるが、target_offsetは正規化の目標値によって変わるため、
+    ファイルの識別情報（パス・サイズ・更新時刻・inode）と目標値（I・TP・LRA）の組をキーにする。
+    出力形式やビットレートを変えて変換し直す場合や、失敗した変換をやり直す場合は解析を省略できる。
+    保存する項目やキーが変わった場合はSCHEMA_VERSIONを上げ、古い形式のエントリは開くときに破棄する。
+    """
+
+    # 2: target_offsetを追加
+    # 3: 正規化の目標値をキーに追加
+    SCHEMA_VERSION = 3
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != self.SCHEMA_VERSION:
+            logger.info("ラウドネスキャッシュの形式が古いため作り直します: {} (version {})", db_path, version)
+            self._conn.execute("DROP TABLE IF EXISTS loudness_cache")
+            self._conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS loudness_cache (
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                integrated REAL NOT NULL,
+                true_peak REAL NOT NULL,
+                lra REAL NOT NULL,
+                data TEXT NOT NULL,
+                created REAL NOT NULL,
+                PRIMARY KEY (path, size, mtime_ns, inode, integrated, true_peak, lra)
+            )
+            """
+        )
+        self._conn.commit()
+        logger.info("ラウドネスキャッシュを開きました: {}", db_path)
+
+    def lookup(self, key: FileKey, target: LoudnessTarget) -> Optional[LoudnessMeasurement]:
+        """目標値targetでの解析結果を検索（未登録ならNone）"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM loudness_cache WHERE path = ? AND size = ? AND mtime_ns = ? AND inode = ? "
+                "AND integrated = ? AND true_peak = ? AND lra = ?",
+                key + target
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        try:
+            return LoudnessMeasurement(**json.loads(row[0]))
+        except (ValueError, TypeError):
+            return None
+
+    def store(self, key: FileKey, target: LoudnessTarget, measurement: LoudnessMeasurement) -> None:
+        """目標値targetでの解析結果を保存（同じパスで内容の変わる前のエントリは削除）"""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM loudness_cache WHERE path = ? AND NOT (size = ? AND mtime_ns = ? AND inode = ?)",
+                key
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO loudness_cache "
+                "(path, size, mtime_ns, inode, integrated, true_peak, lra, data, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                key + target + (json.dumps(asdict(measurement)), time.time())
+            )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """ヒット数・ミス数を取得"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class LoudnessNormalizer:
+    """EBU R128（loudnorm）の2パス正規化
+
+    1パス目で入力を解析し、2パス目のエンコードに測定値を渡して線形のゲインで正規化する。
+    解析結果はキャッシュに保存するため、同じ入力を再び正規化する場合は1パス目を実行しない。
+    """
+
+    def __init__(
+        self,
+        ffmpeg_path: str,
+        runner: FFmpegRunner,
+        governor: ThreadGovernor,
+        settings: Dict[str, Any],
+        cache: Optional[LoudnessCache] = None
+    ):
+        self.ffmpeg_path = ffmpeg_path
+        self.runner = runner
+        self.governor = governor
+        self.integrated = float(settings.get("integrated", -16.0))
+        self.true_peak = float(settings.get("true_peak", -1.5))
+        self.lra = float(settings.get("lra", 11.0))
+        self.cache = cache
+
+    @property
+    def target(self) -> LoudnessTarget:
+        """正規化の目標値（解析結果のキャッシュのキーに使う）"""
+        return (self.integrated, self.true_peak, self.lra)
+
+    def _target_args(self) -> str:
+        return f"I={self.integrated}:TP={self.true_peak}:LRA={self.lra}"
+
+    def build_analysis_command(self, input_path: str) -> List[str]:
+        """1パス目（解析のみ、出力は捨てる）のコマンドを生成"""
+        return [
+            self.ffmpeg_path,
+            "-i", input_path,
+            "-vn",
+            "-map", "0:a:0",
+            "-af", f"loudnorm={self._target_args()}:print_format=json",
+            "-f", "null",
+            "-"
+        ]
+
+    def build_filter(self, measurement: LoudnessMeasurement) -> str:
+        """2パス目のエンコードに渡すフィルタ
+
+        線形モードではゲインをmeasured_Iと目標値から求めるためoffsetは使われないが、
+        トゥルーピークの制限などで動的モードに切り替わった場合に備えて渡す。
+        """
+        return (
+            f"loudnorm={self._target_args()}"
+            f":measured_I={measurement.input_i}"
+            f":measured_TP={measurement.input_tp}"
+            f":measured_LRA={measurement.input_lra}"
+            f":measured_thresh={measurement.input_thresh}"
+            f":offset={measurement.target_offset}"
+            ":linear=true:print_format=none"
+        )
+
+    def cached_measurement(self, input_path: str) -> Optional[LoudnessMeasurement]:
+        """キャッシュ済みの解析結果（無い場合やキャッシュ無効時はNone）"""
+        if self.cache is None:
+            return None
+        try:
+            measurement = self.cache.lookup(file_identity(input_path), self.target)
+        except Exception as e:
+            logger.warning("ラウドネスキャッシュを読み取れませんでした: {}: {}", input_path, e)
+            return None
+        if measurement is not None:
+            logger.info("ラウドネスの解析結果をキャッシュから使用: {}", input_path)
+        return measurement
+
+    def measure(
+        self,
+        input_path: str,
+        duration: Optional[float] = None,
+        progress_callback: Optional[ProgressCallback] = None
+    ) -> LoudnessMeasurement:
+        """入力の測定値を返す（キャッシュにあれば解析しない）"""
+        return self.cached_measurement(input_path) or self.analyze(input_path, duration, progress_callback)
+
+    def analyze(
+        self,
+        input_path: str,
+        duration: Optional[float] = None,
+        progress_callback: Optional[ProgressCallback] = None
+    ) -> LoudnessMeasurement:
+        """1パス目を実行して入力を解析し、結果をキャッシュに保存"""
+        # 解析中にファイルが変わっても古い測定値を保存しないよう、解析前の識別情報をキーにする
+        key = file_identity(input_path)
+        command = self.build_analysis_command(input_path)
+        logger.info("ラウドネスを解析中: {}", input_path)
+        logger.opt(lazy=True).debug("実行するコマンド: {}", lambda: ' '.join(command))
+        with self.governor.lease(JOB_AUDIO) as threads:
+            result = self.runner.run(apply_thread_args(command, threads), duration, progress_callback)
+        if result.returncode != 0:
+            logger.error("ラウドネスの解析中にエラーが発生しました: {}", result.stderr)
+            raise RuntimeError(f"ラウドネスの解析中にエラーが発生しました: {result.stderr}")
+
+        measurement = parse_loudnorm_output(result.stderr)
+        logger.debug("ラウドネスの解析結果: {}: {}", input_path, measurement)
+        if self.cache is not None:
+            try:
+                self.cache.store(key, self.target, measurement)
+            except Exception as e:
+                logger.warning("ラウドネスの解析結果を保存できませんでした: {}: {}", input_path, e)
+        return measurement
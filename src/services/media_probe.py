@@ -0,0 +1,200 @@
+import json
+import subprocess
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from .probe_cache import ProbeCache
+from ..utils.logger import logger
+
+
+def _to_int(value: Any) -> Optional[int]:
+    """ffprobeの値を整数に変換（"N/A"などはNone）"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value: Any) -> Optional[float]:
+    """ffprobeの値を小数に変換（"N/A"などはNone）"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    """秒数を "HH:MM:SS.xx" 形式に変換"""
+    if seconds is None:
+        return "unknown"
+    hours, remainder = divmod(seconds, 3600)
+    minutes, secs = divmod(remainder, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{secs:05.2f}"
+
+
+@dataclass
+class StreamInfo:
+    """ストリーム単位の情報"""
+    index: int
+    codec_type: str
+    codec_name: str = "unknown"
+    profile: Optional[str] = None
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    bit_rate: Optional[int] = None
+    duration: Optional[float] = None
+    is_attached_pic: bool = False  # MP3のカバー画像など
+
+    @classmethod
+    def from_ffprobe(cls, data: Dict[str, Any]) -> "StreamInfo":
+        """ffprobeのstreams要素から生成"""
+        return cls(
+            index=_to_int(data.get("index")) or 0,
+            codec_type=data.get("codec_type", "unknown"),
+            codec_name=data.get("codec_name", "unknown"),
+            profile=data.get("profile"),
+            sample_rate=_to_int(data.get("sample_rate")),
+            channels=_to_int(data.get("channels")),
+            width=_to_int(data.get("width")),
+            height=_to_int(data.get("height")),
+            bit_rate=_to_int(data.get("bit_rate")),
+            duration=_to_float(data.get("duration")),
+            is_attached_pic=bool(data.get("disposition", {}).get("attached_pic", 0))
+        )
+
+
+@dataclass
+class FormatInfo:
+    """コンテナ単位の情報"""
+    format_name: str = "unknown"
+    duration: Optional[float] = None
+    bit_rate: Optional[int] = None
+    size: Optional[int] = None
+
+    @classmethod
+    def from_ffprobe(cls, data: Dict[str, Any]) -> "FormatInfo":
+        """ffprobeのformat要素から生成"""
+        return cls(
+            format_name=data.get("format_name", "unknown"),
+            duration=_to_float(data.get("duration")),
+            bit_rate=_to_int(data.get("bit_rate")),
+            size=_to_int(data.get("size"))
+        )
+
+
+@dataclass
+class MediaInfo:
+    """ffprobeで取得したメディアファイルの情報"""
+    path: str
+    format: FormatInfo
+    streams: List[StreamInfo] = field(default_factory=list)
+
+    @classmethod
+    def from_ffprobe(cls, path: str, data: Dict[str, Any]) -> "MediaInfo":
+        """ffprobeのJSON出力から生成"""
+        return cls(
+            path=path,
+            format=FormatInfo.from_ffprobe(data.get("format", {})),
+            streams=[StreamInfo.from_ffprobe(stream) for stream in data.get("streams", [])]
+        )
+
+    @property
+    def audio_streams(self) -> List[StreamInfo]:
+        return [s for s in self.streams if s.codec_type == "audio"]
+
+    @property
+    def video_streams(self) -> List[StreamInfo]:
+        """映像ストリーム（カバー画像は除く）"""
+        return [s for s in self.streams if s.codec_type == "video" and not s.is_attached_pic]
+
+    @property
+    def audio(self) -> Optional[StreamInfo]:
+        """最初の音声ストリーム"""
+        streams = self.audio_streams
+        return streams[0] if streams else None
+
+    @property
+    def video(self) -> Optional[StreamInfo]:
+        """最初の映像ストリーム"""
+        streams = self.video_streams
+        return streams[0] if streams else None
+
+    @property
+    def has_audio(self) -> bool:
+        return self.audio is not None
+
+    @property
+    def has_video(self) -> bool:
+        return self.video is not None
+
+    @property
+    def duration(self) -> Optional[float]:
+        """再生時間（秒）。コンテナに無い場合はストリームの最大値"""
+        if self.format.duration is not None:
+            return self.format.duration
+        durations = [s.duration for s in self.streams if s.duration is not None]
+        return max(durations) if durations else None
+
+    def to_info_dict(self) -> Dict[str, Any]:
+        """get_audio_info互換の辞書に変換"""
+        audio = self.audio
+        video = self.video
+        bit_rate = (audio.bit_rate if audio and audio.bit_rate else None) or self.format.bit_rate
+        return {
+            "format": audio.codec_name if audio else "unknown",
+            "duration": format_duration(self.duration),
+            "duration_seconds": self.duration,
+            "bitrate": f"{bit_rate // 1000} kb/s" if bit_rate else "unknown",
+            "channels": str(audio.channels) if audio and audio.channels else "unknown",
+            "sample_rate": str(audio.sample_rate) if audio and audio.sample_rate else "unknown",
+            "is_video": video is not None,
+            "video_codec": video.codec_name if video else None
+        }
+
+
+class MediaProber:
+    """ffprobeのJSON出力からメディア情報を取得するクラス"""
+
+    def __init__(self, ffprobe_path: str, cache: Optional[ProbeCache] = None):
+        self.ffprobe_path = ffprobe_path
+        self.cache = cache
+
+    def probe_json(self, file_path: str) -> Dict[str, Any]:
+        """ffprobeを1回実行し、JSON出力を辞書で返す"""
+        result = subprocess.run(
+            [
+                self.ffprobe_path,
+                "-v", "error",
+                "-print_format", "json",
+                "-show_format",
+                "-show_streams",
+                file_path
+            ],
+            capture_output=True,
+            text=True,
+            encoding="utf-8",
+            errors="replace"
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"ffprobeの実行に失敗しました: {result.stderr.strip()}")
+        try:
+            return json.loads(result.stdout or "{}")
+        except json.JSONDecodeError as e:
+            raise RuntimeError(f"ffprobeの出力を解析できませんでした: {str(e)}")
+
+    def probe(self, file_path: str) -> MediaInfo:
+        """ファイルを解析してMediaInfoを返す（キャッシュがあれば再利用）"""
+        if self.cache is None:
+            data = self.probe_json(file_path)
+        else:
+            key, data = self.cache.lookup(file_path)
+            if data is None:
+                data = self.probe_json(file_path)
+                self.cache.store(key, data)
+        media_info = MediaInfo.from_ffprobe(file_path, data)
+        logger.debug(
+            "メディア情報を取得しました: {} (duration={}, audio={}, video={})",
+            file_path, media_info.duration, media_info.has_audio, media_info.has_video
+        )
+        return media_info
@@ -0,0 +1,68 @@
+import math
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Union
+from .job_metrics import JobMetrics
+from .media_probe import MediaInfo
+
+
+@dataclass
+class MicroBatchJob:
+    """まとめて変換する1ファイル"""
+    index: int  # 進捗の番号（1始まり）
+    file_path: str
+    output_path: Union[str, Exception]
+    media_info: MediaInfo
+    metrics: JobMetrics
+    cache_key: Optional[str] = None
+
+
+class MicroBatchPolicy:
+    """短いファイルを1回のFFmpegの実行にまとめるかの判定とグループ分け
+
+    短い音声ではプロセスの起動やコーデックの初期化が処理時間の大半を占めるため、
+    再生時間とサイズがしきい値以下のファイルは複数の -i を持つ1つのFFmpegでまとめて変換する。
+    """
+
+    def __init__(self, settings: Dict[str, Any]):
+        self.enabled = bool(settings.get("enabled", False))
+        self.max_duration = float(settings.get("max_duration_seconds", 60))
+        self.max_bytes = int(float(settings.get("max_size_mb", 20)) * 1024 * 1024)
+        self.max_files = max(2, int(settings.get("max_files", 32)))
+
+    def is_eligible(self, media_info: Optional[MediaInfo], input_bytes: Optional[int]) -> bool:
+        """まとめて変換できる短いファイルか（長さやサイズが分からないものはまとめない）"""
+        if not self.enabled or media_info is None or not media_info.has_audio:
+            return False
+        if media_info.duration is None or input_bytes is None:
+            return False
+        return media_info.duration <= self.max_duration and input_bytes <= self.max_bytes
+
+    def group(self, indices: List[int], workers: int) -> List[List[int]]:
+        """まとめる対象をグループに分ける（1件だけのグループは通常の変換に回す）
+
+        並列数の分だけグループを作れるよう、1グループの件数は対象数を並列数で割った数までとする。
+        """
+        if len(indices) < 2:
+            return []
+        size = min(self.max_files, max(2, math.ceil(len(indices) / max(workers, 1))))
+        groups = [indices[i:i + size] for i in range(0, len(indices), size)]
+        return [group for group in groups if len(group) > 1]
+
+
+def split_batch_future(batch_future: Future, count: int) -> List[Future]:
+    """結果のリストを返すFutureを、要素ごとのFutureに分ける（例外は全要素に伝える）"""
+    members: List[Future] = [Future() for _ in range(count)]
+
+    def on_done(future: Future) -> None:
+        try:
+            results = future.result()
+        except BaseException as e:
+            for member in members:
+                member.set_exception(e)
+            return
+        for member, result in zip(members, results):
+            member.set_result(result)
+
+    batch_future.add_done_callback(on_done)
+    return members
@@ -0,0 +1,111 @@
+import os
+import threading
+from typing import Dict, Optional, Set, Tuple
+from ..utils.logger import logger
+
+
+def is_unused_placeholder(path: str) -> bool:
+    """割り当て時に作成した空のファイルのまま残っているか"""
+    try:
+        return os.path.isfile(path) and os.path.getsize(path) == 0
+    except OSError:
+        return False
+
+
+class OutputPathAllocator:
+    """安全モード（_convertedを付けた別名保存）の出力パスを割り当てる
+
+    出力先のディレクトリは最初に1回だけ一覧を取得し、使用済みの名前をメモリ上の索引で管理する。
+    割り当てた名前はO_EXCLで空のファイルを作成して確保するため、並列のワーカーや別のプロセスと
+    同じ名前になることはない（一覧の取得後に他で作られた名前は、作成に失敗した時点で次の番号に進む）。
+    連番は名前ごとに次の候補を覚えておくため、同じ名前の出力が続いても1件あたりの処理は一定。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # ディレクトリごとの使用済みの名前（normcase済み）
+        self._index: Dict[str, Set[str]] = {}
+        # (ディレクトリ, 基本の名前) ごとの次に試す連番
+        self._next_counter: Dict[Tuple[str, str], int] = {}
+        self._claimed: Set[str] = set()
+
+    def allocate(self, input_path: str, output_format: str, variant: Optional[str] = None) -> str:
+        """入力ファイルと同じディレクトリに出力パスを割り当て、空のファイルを作成して確保する"""
+        directory = os.path.dirname(input_path)
+        filename = os.path.splitext(os.path.basename(input_path))[0]
+        if variant:
+            filename = f"{filename}_{variant}"
+        base_name = f"{filename}_converted"
+        counter_key = (os.path.normcase(directory), os.path.normcase(f"{base_name}.{output_format}"))
+
+        while True:
+            with self._lock:
+                taken = self._taken_names(directory)
+                counter = self._next_counter.get(counter_key, 0)
+                while True:
+                    name = f"{base_name}.{output_format}" if counter == 0 else f"{base_name}_{counter}.{output_format}"
+                    counter += 1
+                    if os.path.normcase(name) not in taken:
+                        break
+                # 確保を試す間に他のスレッドが同じ名前を選ばないよう先に使用済みにする
+                taken.add(os.path.normcase(name))
+                self._next_counter[counter_key] = counter
+
+            output_path = os.path.join(directory, name)
+            try:
+                fd = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+            except FileExistsError:
+                # 一覧の取得後に他のプロセスなどが作成した名前
+                logger.debug("同名ファイルが作成されていたため次の名前を試します: {}", output_path)
+                continue
+            except OSError:
+                with self._lock:
+                    taken.discard(os.path.normcase(name))
+                raise
+            os.close(fd)
+
+            with self._lock:
+                self._claimed.add(output_path)
+            logger.debug("出力パスを割り当てました: {}", output_path)
+            return output_path
+
+    def release(self, output_path: str) -> None:
+        """割り当てた名前を解放（空のファイルのままなら削除して、名前を再び使えるようにする）"""
+        with self._lock:
+            if output_path not in self._claimed:
+                return
+            self._claimed.discard(output_path)
+            if not is_unused_placeholder(output_path):
+                return
+            try:
+                os.remove(output_path)
+            except OSError as e:
+                logger.warning("割り当てた出力ファイルを削除できませんでした: {}: {}", output_path, e)
+                return
+            taken = self._index.get(os.path.normcase(os.path.dirname(output_path)))
+            if taken is not None:
+                taken.discard(os.path.normcase(os.path.basename(output_path)))
+            # 解放した番号から再び割り当てられるよう連番の候補を戻す
+            self._next_counter.clear()
+
+    def release_unused(self) -> None:
+        """変換に失敗するなどして書き込まれなかった出力ファイルをすべて解放（バッチの終了時に呼ぶ）"""
+        with self._lock:
+            claimed = list(self._claimed)
+        for output_path in claimed:
+            self.release(output_path)
+
+    def _taken_names(self, directory: str) -> Set[str]:
+        """ディレクトリの使用済みの名前（初回のみ一覧を取得、ロック取得済みで呼ぶ）"""
+        key = os.path.normcase(directory)
+        taken = self._index.get(key)
+        if taken is None:
+            taken = set()
+            try:
+                with os.scandir(directory or ".") as entries:
+                    for entry in entries:
+                        taken.add(os.path.normcase(entry.name))
+            except OSError as e:
+                logger.warning("出力先のディレクトリを読み取れませんでした: {}: {}", directory, e)
+            self._index[key] = taken
+        return taken
@@ -0,0 +1,138 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from ..utils.logger import logger
+
+# (正規化したパス, サイズ, 更新時刻(ns), inode)
+FileKey = Tuple[str, int, int, int]
+
+
+def file_identity(file_path: str) -> FileKey:
+    """ファイルを識別するキーをstat 1回で取得"""
+    stat = os.stat(file_path)
+    return (
+        os.path.normcase(os.path.abspath(file_path)),
+        stat.st_size,
+        stat.st_mtime_ns,
+        stat.st_ino
+    )
+
+
+class ProbeCache:
+    """ffprobe結果をSQLiteに保存するキャッシュ（LRUで件数を制限）"""
+
+    # 最終アクセス時刻の更新はまとめて書き込む
+    TOUCH_FLUSH_SIZE = 500
+
+    def __init__(self, db_path: str, max_entries: int = 100000):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._pending_touches: List[Tuple[float, str, int, int, int]] = []
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS probe_cache (
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                data TEXT NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (path, size, mtime_ns, inode)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_probe_cache_last_access ON probe_cache (last_access)"
+        )
+        self._conn.commit()
+        self._entry_count = self._conn.execute("SELECT COUNT(*) FROM probe_cache").fetchone()[0]
+        logger.info("プローブキャッシュを開きました: {} ({}件)", db_path, self._entry_count)
+
+    def lookup(self, file_path: str) -> Tuple[FileKey, Optional[Dict[str, Any]]]:
+        """キャッシュを検索し、(キー, ffprobeのJSON) を返す（未登録ならNone）"""
+        key = file_identity(file_path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM probe_cache WHERE path = ? AND size = ? AND mtime_ns = ? AND inode = ?",
+                key
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return key, None
+
+            self.hits += 1
+            self._pending_touches.append((time.time(),) + key)
+            if len(self._pending_touches) >= self.TOUCH_FLUSH_SIZE:
+                self._flush_touches()
+
+        try:
+            return key, json.loads(row[0])
+        except json.JSONDecodeError:
+            return key, None
+
+    def store(self, key: FileKey, data: Dict[str, Any]) -> None:
+        """ffprobeのJSONを保存（同じパスの古いエントリは削除）"""
+        with self._lock:
+            self._flush_touches()
+            path = key[0]
+            removed = self._conn.execute("DELETE FROM probe_cache WHERE path = ?", (path,)).rowcount
+            self._conn.execute(
+                "INSERT INTO probe_cache (path, size, mtime_ns, inode, data, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                key + (json.dumps(data, ensure_ascii=False), time.time())
+            )
+            self._entry_count += 1 - max(removed, 0)
+            if self._entry_count > self.max_entries:
+                self._evict()
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """ヒット数・ミス数・件数を取得"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": self._entry_count}
+
+    def flush(self) -> None:
+        """まとめておいた最終アクセス時刻を書き込む"""
+        with self._lock:
+            self._flush_touches()
+
+    def close(self) -> None:
+        """未反映のアクセス時刻を書き込んで閉じる"""
+        with self._lock:
+            self._flush_touches()
+            self._conn.commit()
+            self._conn.close()
+
+    def _flush_touches(self) -> None:
+        """まとめておいた最終アクセス時刻を反映（ロック取得済みで呼ぶ）"""
+        if not self._pending_touches:
+            return
+        self._conn.executemany(
+            "UPDATE probe_cache SET last_access = ? WHERE path = ? AND size = ? AND mtime_ns = ? AND inode = ?",
+            self._pending_touches
+        )
+        self._conn.commit()
+        self._pending_touches = []
+
+    def _evict(self) -> None:
+        """最終アクセスが古いものから上限を超えた分を削除（ロック取得済みで呼ぶ）"""
+        excess = self._entry_count - self.max_entries
+        self._conn.execute(
+            "DELETE FROM probe_cache WHERE rowid IN "
+            "(SELECT rowid FROM probe_cache ORDER BY last_access ASC LIMIT ?)",
+            (excess,)
+        )
+        self._entry_count -= excess
+        logger.debug("プローブキャッシュから{}件を削除しました", excess)
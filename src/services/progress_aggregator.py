@@ -0,0 +1,263 @@
+import os
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional, Tuple
+
+
+@dataclass
+class JobProgress:
+    """1ファイルの進捗"""
+    index: int
+    file_path: str
+    fraction: Optional[float] = None  # 0.0〜1.0（長さが分からない場合はNone）
+    out_time: Optional[float] = None  # 出力済みの長さ（秒）
+    speed: Optional[float] = None     # FFmpegの処理速度（再生速度の何倍か）
+    started_at: Optional[float] = None  # 開始前はNone
+    lane: str = "audio"
+    weight: float = 1.0               # 全体の進捗での重み（見積もりの処理時間）
+    duration: Optional[float] = None  # 再生時間（秒）。残り時間の計算に使う
+
+    @property
+    def remaining_media_seconds(self) -> float:
+        return (self.duration or 0.0) * (1.0 - (self.fraction or 0.0))
+
+    @property
+    def name(self) -> str:
+        return os.path.basename(self.file_path)
+
+
+@dataclass
+class ProgressSnapshot:
+    """ある時点の進捗（UIの描画用のコピー）"""
+    version: int
+    total_files: int
+    completed_files: int
+    message: str
+    jobs: List[JobProgress]            # 変換中のジョブ
+    percent: float = 0.0               # 見積もりの処理時間で重み付けした全体の進捗
+    eta_seconds: Optional[float] = None  # 全体の残り時間の見込み（計測できるまではNone）
+    lane_eta_seconds: Dict[str, Optional[float]] = field(default_factory=dict)
+    lane_speed: Dict[str, float] = field(default_factory=dict)  # レーンごとの処理速度（再生時間/経過時間）
+
+
+class ProgressAggregator:
+    """ワーカーが書き込み、UIが一定間隔で読み出す進捗の集計
+
+    書き込みはロック内で値を置き換えるだけで、UIへの通知は行わない。
+    UIはsnapshot()をポーリングし、versionが変わったときだけ描画し直す。
+    そのため進捗イベントがいくら多くても、UIの処理量はポーリングの頻度で決まる。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._total_files = 0
+        self._completed_files = 0
+        self._message = ""
+        # 開始前・変換中のジョブと、そのうち変換中のジョブ
+        self._jobs: Dict[int, JobProgress] = {}
+        self._started: Dict[int, JobProgress] = {}
+        self._total_weight = 0.0
+        self._completed_weight = 0.0
+        # レーンごとの未完了のジョブ数・重みの合計・再生時間の合計（snapshotで全ジョブを走査しないよう逐次更新する）
+        self._lane_jobs: Dict[str, int] = {}
+        self._lane_weight: Dict[str, float] = {}
+        self._lane_media: Dict[str, float] = {}
+        # レーンごとの実行中のジョブ数・ジョブを実行していた時間・完了したジョブの再生時間の合計
+        self._lane_running: Dict[str, int] = {}
+        self._lane_busy_since: Dict[str, float] = {}
+        self._lane_busy_seconds: Dict[str, float] = {}
+        self._lane_done_media: Dict[str, float] = {}
+
+    def start_batch(self, total_files: int) -> None:
+        """新しいバッチの開始（総数が分からない逐次変換では0）"""
+        with self._lock:
+            self._total_files = total_files
+            self._completed_files = 0
+            self._jobs = {}
+            self._started = {}
+            self._total_weight = 0.0
+            self._completed_weight = 0.0
+            self._lane_jobs = {}
+            self._lane_weight = {}
+            self._lane_media = {}
+            self._lane_running = {}
+            self._lane_busy_since = {}
+            self._lane_busy_seconds = {}
+            self._lane_done_media = {}
+            self._message = ""
+            self._version += 1
+
+    def plan_job(self, index: int, file_path: str, lane: str, weight: float, duration: Optional[float]) -> None:
+        """開始前のジョブを登録（全体の進捗の重みと、残り時間の計算に使う）"""
+        with self._lock:
+            self._add_job(JobProgress(index, file_path, lane=lane, weight=max(weight, 0.0), duration=duration))
+            self._total_weight += max(weight, 0.0)
+            self._version += 1
+
+    def start_job(self, index: int, file_path: str, lane: str = "audio") -> None:
+        """ジョブの開始を記録（plan_jobで登録していないジョブはlaneのレーンで追加）"""
+        now = time.monotonic()
+        with self._lock:
+            job = self._jobs.get(index)
+            if job is None:
+                job = self._add_job(JobProgress(index, file_path, lane=lane))
+            if job.started_at is None:
+                job.started_at = now
+                self._started[index] = job
+                running = self._lane_running.get(job.lane, 0)
+                if running == 0:
+                    self._lane_busy_since[job.lane] = now
+                self._lane_running[job.lane] = running + 1
+            self._version += 1
+
+    def update_job(
+        self,
+        index: int,
+        fraction: Optional[float] = None,
+        out_time: Optional[float] = None,
+        speed: Optional[float] = None
+    ) -> None:
+        """FFmpegの進捗を反映（start_jobの前に呼ばれた場合はジョブを追加しない）"""
+        with self._lock:
+            job = self._jobs.get(index)
+            if job is None:
+                return
+            if fraction is not None:
+                job.fraction = fraction
+            if out_time is not None:
+                job.out_time = out_time
+            if speed is not None:
+                job.speed = speed
+            self._version += 1
+
+    def finish_job(self, index: int) -> int:
+        """ジョブの完了を記録し、完了したファイル数を返す"""
+        now = time.monotonic()
+        with self._lock:
+            job = self._jobs.get(index)
+            if job is not None:
+                self._remove_job(job)
+                self._completed_weight += job.weight
+                if job.started_at is not None:
+                    lane = job.lane
+                    self._lane_done_media[lane] = self._lane_done_media.get(lane, 0.0) + (job.duration or 0.0)
+                    self._lane_running[lane] -= 1
+                    if self._lane_running[lane] == 0:
+                        busy = now - self._lane_busy_since.pop(lane, now)
+                        self._lane_busy_seconds[lane] = self._lane_busy_seconds.get(lane, 0.0) + busy
+            self._completed_files += 1
+            self._version += 1
+            return self._completed_files
+
+    def set_message(self, message: str) -> None:
+        with self._lock:
+            self._message = message
+            self._version += 1
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def snapshot(self) -> ProgressSnapshot:
+        now = time.monotonic()
+        with self._lock:
+            # 開始前のジョブはレーンごとの合計だけを使い、コピーするのは変換中のジョブのみ
+            running = [replace(job) for job in self._started.values()]
+            snapshot = ProgressSnapshot(
+                version=self._version,
+                total_files=self._total_files,
+                completed_files=self._completed_files,
+                message=self._message,
+                jobs=sorted(running, key=lambda job: job.index),
+                percent=self._percent(running)
+            )
+            snapshot.lane_speed, snapshot.lane_eta_seconds = self._lane_estimates(running, now)
+        known = [eta for eta in snapshot.lane_eta_seconds.values() if eta is not None]
+        # レーンは並行して進むため、最も遅く終わるレーンが全体の残り時間
+        if known and len(known) == len(snapshot.lane_eta_seconds):
+            snapshot.eta_seconds = max(known)
+        return snapshot
+
+    def _add_job(self, job: JobProgress) -> JobProgress:
+        """未完了のジョブとレーンごとの合計に加える（ロック取得済みで呼ぶ）"""
+        previous = self._jobs.get(job.index)
+        if previous is not None:
+            self._remove_job(previous)
+        self._jobs[job.index] = job
+        self._lane_jobs[job.lane] = self._lane_jobs.get(job.lane, 0) + 1
+        self._lane_weight[job.lane] = self._lane_weight.get(job.lane, 0.0) + job.weight
+        self._lane_media[job.lane] = self._lane_media.get(job.lane, 0.0) + (job.duration or 0.0)
+        return job
+
+    def _remove_job(self, job: JobProgress) -> None:
+        """未完了のジョブとレーンごとの合計から除く（ロック取得済みで呼ぶ）"""
+        self._jobs.pop(job.index, None)
+        self._started.pop(job.index, None)
+        lane = job.lane
+        self._lane_jobs[lane] -= 1
+        if self._lane_jobs[lane] == 0:
+            # 浮動小数点の誤差が残らないよう、ジョブが無くなったレーンの合計は消す
+            del self._lane_jobs[lane]
+            self._lane_weight.pop(lane, None)
+            self._lane_media.pop(lane, None)
+        else:
+            self._lane_weight[lane] -= job.weight
+            self._lane_media[lane] -= job.duration or 0.0
+
+    def _percent(self, running: List[JobProgress]) -> float:
+        """全体の進捗（変換中のジョブを渡し、ロック取得済みで呼ぶ）
+
+        登録済みのジョブがあれば見積もりの処理時間で重み付けし、無ければファイル数で計算する。
+        """
+        if self._total_weight > 0:
+            done = self._completed_weight + sum(job.weight * (job.fraction or 0.0) for job in running)
+            return min(done / self._total_weight * 100, 100.0)
+        if self._total_files <= 0:
+            return 0.0
+        done = self._completed_files + sum(job.fraction or 0.0 for job in running)
+        return min(done / self._total_files * 100, 100.0)
+
+    def _lane_estimates(
+        self,
+        running_jobs: List[JobProgress],
+        now: float
+    ) -> Tuple[Dict[str, float], Dict[str, Optional[float]]]:
+        """レーンごとの処理速度と残り時間（変換中のジョブを渡し、ロック取得済みで呼ぶ）
+
+        開始前のジョブはレーンごとの合計（ジョブ数・重み・再生時間）で扱うため、計算量は変換中のジョブ数で決まる。
+
+        処理速度はレーンで処理した再生時間の合計を、レーンがジョブを実行していた時間で割ったもの
+        （並列で実行しているジョブの分も含み、ジョブの無かった時間は含まない）。まだ計測できない場合は変換中のジョブのFFmpegの速度の合計を使い、
+        それも無ければ見積もりの処理時間（重み）の残りを残り時間とする。
+        """
+        speeds: Dict[str, float] = {}
+        etas: Dict[str, Optional[float]] = {}
+        for lane in set(self._lane_jobs) | set(self._lane_running):
+            running = [job for job in running_jobs if job.lane == lane]
+            processed = self._lane_done_media.get(lane, 0.0) + sum(
+                (job.duration or 0.0) - job.remaining_media_seconds for job in running
+            )
+            busy = self._lane_busy_seconds.get(lane, 0.0)
+            if lane in self._lane_busy_since:
+                busy += now - self._lane_busy_since[lane]
+            if processed > 0 and busy > 0:
+                speed = processed / busy
+            else:
+                speed = sum(job.speed or 0.0 for job in running)
+            if speed > 0:
+                speeds[lane] = speed
+            if not self._lane_jobs.get(lane):
+                continue
+            if speed > 0:
+                remaining_media = self._lane_media[lane] - sum(
+                    (job.duration or 0.0) * (job.fraction or 0.0) for job in running
+                )
+                etas[lane] = max(remaining_media, 0.0) / speed
+            elif self._total_weight > 0:
+                remaining_weight = self._lane_weight[lane] - sum(job.weight * (job.fraction or 0.0) for job in running)
+                etas[lane] = max(remaining_weight, 0.0)
+            else:
+                etas[lane] = None
+        return speeds, etas
@@ -0,0 +1,370 @@
+import contextvars
+import json
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional
+from .ffmpeg_runner import FFmpegRunner, ProgressCallback
+from .thread_governor import JOB_AUDIO, JOB_COPY, JOB_VIDEO, ThreadGovernor, apply_thread_args
+from ..utils.logger import logger
+
+# MPEG-1 Layer III の1フレームあたりのサンプル数
+MP3_FRAME_SAMPLES = 1152
+# LAMEのエンコーダー遅延（576）とデコーダー遅延（529）の合計
+MP3_ENCODER_DELAY = 1105
+# 分割位置の手前からエンコードして捨てるフレーム数（エンコーダーの立ち上がりを吸収）
+MP3_PREROLL_FRAMES = 8
+# 分割位置の後ろまで余分にエンコードするフレーム数（末尾のフラッシュの影響を避ける）
+MP3_TAIL_FRAMES = 4
+
+MPEG1_BITRATES_KBPS = [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320]
+MPEG1_SAMPLE_RATES = [44100, 48000, 32000]
+
+# 動画のキーフレーム位置より少し手前から切り出す（時刻の丸め誤差でフレームが欠けないように）
+KEYFRAME_EPSILON = 0.001
+
+
+def iter_mp3_frames(data: bytes) -> Iterator[bytes]:
+    """タグ・Xingヘッダーの無いMPEG-1 Layer IIIのデータをフレーム単位に分割"""
+    position = 0
+    while position + 4 <= len(data):
+        header = int.from_bytes(data[position:position + 4], "big")
+        if header >> 21 != 0x7FF or (header >> 19) & 0x3 != 0x3 or (header >> 17) & 0x3 != 0x1:
+            raise ValueError(f"MPEG-1 Layer IIIのフレームではありません (offset={position})")
+        bitrate_index = (header >> 12) & 0xF
+        sample_rate_index = (header >> 10) & 0x3
+        if bitrate_index in (0, 15) or sample_rate_index == 3:
+            raise ValueError(f"対応していないMP3フレームです (offset={position})")
+        length = (
+            144 * MPEG1_BITRATES_KBPS[bitrate_index] * 1000 // MPEG1_SAMPLE_RATES[sample_rate_index]
+            + ((header >> 9) & 0x1)
+        )
+        yield data[position:position + length]
+        position += length
+
+
+def split_evenly(total: float, count: int, snap) -> List[float]:
+    """0〜totalをcount個に分ける境界（snapで位置を補正、重複は除く）"""
+    boundaries: List[float] = []
+    for i in range(1, count):
+        boundary = snap(total * i / count)
+        if boundary is not None and (not boundaries or boundary > boundaries[-1]) and 0 < boundary < total:
+            boundaries.append(boundary)
+    return boundaries
+
+
+def snap_mp3_boundary(samples: float) -> int:
+    """分割位置を「フレーム境界 - エンコーダー遅延」に合わせる（各区間の出力がフレーム単位で切り出せる）"""
+    return round((samples + MP3_ENCODER_DELAY) / MP3_FRAME_SAMPLES) * MP3_FRAME_SAMPLES - MP3_ENCODER_DELAY
+
+
+@dataclass
+class Mp3Slice:
+    """MP3の分割エンコードの1区間の範囲（単位はサンプル数・フレーム数）"""
+    start: int                 # 区間の開始位置
+    end: Optional[int]         # 区間の終了位置（最後の区間はNone）
+    encode_start: int          # エンコードを開始する位置（開始位置の手前から）
+    skip: int                  # 出力の先頭から捨てるフレーム数
+    keep: Optional[int]        # 残すフレーム数（最後の区間はNoneで末尾まで）
+
+
+def plan_mp3_slices(total_samples: int, count: int) -> List[Mp3Slice]:
+    """total_samplesをcount個以下の区間に分け、各区間のエンコード範囲と残すフレームを決める
+
+    全体を1回でエンコードした場合のk番目のフレームは、入力の k × 1152 - 遅延 のサンプルから始まる。
+    2番目以降の区間はフレーム境界に合わせた位置の手前からエンコードし、余分なフレームを捨てることで、
+    各区間の残したフレームをつなぐと1回でエンコードした場合と同じフレームの並びになる。
+    """
+    boundaries = [0] + [int(b) for b in split_evenly(total_samples, count, snap_mp3_boundary)]
+    slices = []
+    for i, start in enumerate(boundaries):
+        end = boundaries[i + 1] if i + 1 < len(boundaries) else None
+        if i == 0:
+            encode_start, skip = 0, 0
+            keep = (end + MP3_ENCODER_DELAY) // MP3_FRAME_SAMPLES if end is not None else None
+        else:
+            first_frame = (start + MP3_ENCODER_DELAY) // MP3_FRAME_SAMPLES
+            encode_start = (first_frame - MP3_PREROLL_FRAMES) * MP3_FRAME_SAMPLES
+            skip = MP3_PREROLL_FRAMES
+            keep = (end - start) // MP3_FRAME_SAMPLES if end is not None else None
+        slices.append(Mp3Slice(start, end, encode_start, skip, keep))
+    return slices
+
+
+@dataclass
+class Segment:
+    """分割エンコードの1区間"""
+    index: int
+    path: str
+    command: List[str]
+    duration: float  # 進捗計算用の長さ（秒）
+    job_class: str = JOB_AUDIO
+
+
+class SegmentedEncoder:
+    """長い録音・動画を時間で分割して並列にエンコードし、concatデマクサーで結合するクラス
+
+    MP3は分割位置をフレーム境界（エンコーダー遅延を考慮）に合わせ、ビットリザーバーを無効にして
+    各区間の余分なフレームを捨てることで、継ぎ目に隙間や重複が出ないようにする。
+    MP4は分割位置をキーフレームに合わせて映像のみ並列にエンコードし、音声は全体を1回でエンコードする。
+    """
+
+    def __init__(
+        self,
+        ffmpeg_path: str,
+        ffprobe_path: str,
+        runner: FFmpegRunner,
+        settings: Dict[str, Any],
+        governor: Optional[ThreadGovernor] = None
+    ):
+        self.ffmpeg_path = ffmpeg_path
+        self.ffprobe_path = ffprobe_path
+        self.runner = runner
+        self.governor = governor or ThreadGovernor()
+        self.enabled = bool(settings.get("enabled", True))
+        self.min_duration = float(settings.get("min_duration_seconds", 1200))
+        self.min_segment_duration = float(settings.get("min_segment_seconds", 120))
+        # 0の場合は並列数の枠1つあたりのCPUスレッド数で決める
+        self.max_segments = int(settings.get("segments", 0))
+
+    def should_segment(self, output_format: str, duration: Optional[float], stream_copy: bool = False) -> bool:
+        """分割エンコードを使うか判定（ストリームコピーやWAV出力は分割しても速くならない）"""
+        if not self.enabled or stream_copy or output_format not in ("mp3", "mp4"):
+            return False
+        return duration is not None and duration >= self.min_duration and self._segment_count(duration) > 1
+
+    def encode_audio(
+        self,
+        input_path: str,
+        output_path: str,
+        encode_args: List[str],
+        sample_rate: int,
+        duration: float,
+        progress_callback: Optional[ProgressCallback] = None
+    ) -> bool:
+        """MP3を分割エンコードしてoutput_pathに出力（分割できない条件の場合はFalseを返す）"""
+        if sample_rate not in MPEG1_SAMPLE_RATES:
+            logger.info("サンプルレート{}Hzは分割エンコードに対応していません: {}", sample_rate, input_path)
+            return False
+
+        total_samples = int(duration * sample_rate)
+        slices = plan_mp3_slices(total_samples, self._segment_count(duration))
+        if len(slices) < 2:
+            return False
+
+        work_dir = self._make_work_dir(output_path)
+        try:
+            segments = []
+            for i, mp3_slice in enumerate(slices):
+                end, encode_start = mp3_slice.end, mp3_slice.encode_start
+                path = os.path.join(work_dir, f"part{i:03d}.mp3")
+                command = [self.ffmpeg_path, "-ss", f"{encode_start / sample_rate:.9f}", "-i", input_path, "-vn"]
+                if end is not None:
+                    length = end - encode_start + MP3_TAIL_FRAMES * MP3_FRAME_SAMPLES
+                    command.extend(["-t", f"{length / sample_rate:.9f}"])
+                command.extend(encode_args)
+                command.extend([
+                    "-reservoir", "0",       # フレームが前のフレームのデータを参照しないようにする
+                    "-write_xing", "0",
+                    "-id3v2_version", "0",
+                    "-write_id3v1", "0",
+                    "-f", "mp3", "-y", path
+                ])
+                segment_end = end if end is not None else total_samples
+                segments.append(Segment(i, path, command, (segment_end - encode_start) / sample_rate))
+
+            logger.info("{}区間に分割してエンコードします: {}", len(segments), input_path)
+            self._run_segments(segments, progress_callback)
+
+            # 各区間から重なり部分のフレームを取り除き、concatデマクサーで結合
+            parts = []
+            for segment, mp3_slice in zip(segments, slices):
+                with open(segment.path, "rb") as f:
+                    frames = list(iter_mp3_frames(f.read()))
+                skip, keep = mp3_slice.skip, mp3_slice.keep
+                frames = frames[skip:] if keep is None else frames[skip:skip + keep]
+                part_path = os.path.join(work_dir, f"trimmed{segment.index:03d}.mp3")
+                with open(part_path, "wb") as f:
+                    f.write(b"".join(frames))
+                parts.append(part_path)
+
+            self._concat(parts, work_dir, ["-c", "copy", "-f", "mp3", "-y", output_path])
+            return True
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def encode_video(
+        self,
+        input_path: str,
+        output_path: str,
+        video_args: List[str],
+        audio_args: Optional[List[str]],
+        duration: float,
+        progress_callback: Optional[ProgressCallback] = None
+    ) -> bool:
+        """MP4を分割エンコードしてoutput_pathに出力（キーフレームが足りない場合などはFalseを返す）
+
+        audio_argsがNoneの場合は音声なしのMP4を出力する。
+        """
+        keyframes = self._probe_keyframes(input_path)
+        if not keyframes:
+            return False
+
+        def snap(seconds: float) -> float:
+            return min(keyframes, key=lambda keyframe: abs(keyframe - seconds))
+
+        boundaries = [0.0] + split_evenly(duration, self._segment_count(duration), snap)
+        if len(boundaries) < 2:
+            return False
+
+        work_dir = self._make_work_dir(output_path)
+        try:
+            segments = []
+            for i, start in enumerate(boundaries):
+                end = boundaries[i + 1] if i + 1 < len(boundaries) else None
+                command = [self.ffmpeg_path]
+                if start > 0:
+                    command.extend(["-ss", f"{start - KEYFRAME_EPSILON:.6f}"])
+                command.extend(["-i", input_path, "-map", "0:v:0", "-an", "-sn", "-dn"])
+                if end is not None:
+                    # 次のキーフレームのフレームは次の区間に含める
+                    command.extend(["-t", f"{end - start - KEYFRAME_EPSILON:.6f}"])
+                path = os.path.join(work_dir, f"part{i:03d}.mp4")
+                command.extend(video_args + ["-y", path])
+                segments.append(Segment(i, path, command, (end if end is not None else duration) - start, JOB_VIDEO))
+
+            audio_path = None
+            if audio_args is not None:
+                audio_path = os.path.join(work_dir, "audio.m4a")
+                command = [self.ffmpeg_path, "-i", input_path, "-map", "0:a:0", "-vn"] + audio_args + ["-y", audio_path]
+                # 音声のエンコードは映像より十分速いため、進捗の計算には含めない
+                segments.append(Segment(len(segments), audio_path, command, 0.0))
+
+            logger.info("{}区間に分割して動画をエンコードします: {}", len(boundaries), input_path)
+            self._run_segments(segments, progress_callback)
+
+            parts = [segment.path for segment in segments if segment.path != audio_path]
+            mux_args = ["-map", "0:v:0"]
+            extra_inputs: List[str] = []
+            if audio_path:
+                extra_inputs = ["-i", audio_path]
+                mux_args.extend(["-map", "1:a:0"])
+            mux_args.extend(["-c", "copy", "-movflags", "+faststart", "-y", output_path])
+            self._concat(parts, work_dir, mux_args, extra_inputs)
+            return True
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def _segment_count(self, duration: float) -> int:
+        """区間の数（1区間が短くなりすぎないように制限）
+
+        複数のファイルを並列に変換している場合、ファイルごとにCPUコア数まで分割すると
+        FFmpegのプロセスがコア数の2乗近くまで増えるため、並列数の枠1つあたりのスレッド数までとする。
+        """
+        limit = self.governor.process_share()
+        if self.max_segments > 0:
+            limit = min(limit, self.max_segments)
+        return max(1, min(limit, int(duration // self.min_segment_duration)))
+
+    def _make_work_dir(self, output_path: str) -> str:
+        """区間ファイルの作業ディレクトリ（出力先と同じ場所に作り、前回の残りは消す）"""
+        work_dir = f"{output_path}.segments"
+        shutil.rmtree(work_dir, ignore_errors=True)
+        os.makedirs(work_dir)
+        return work_dir
+
+    def _probe_keyframes(self, input_path: str) -> List[float]:
+        """映像のキーフレームの時刻一覧を取得（キーフレーム以外はデコードしない）"""
+        command = [
+            self.ffprobe_path,
+            "-v", "error",
+            "-select_streams", "v:0",
+            "-skip_frame", "nokey",
+            "-show_entries", "frame=pts_time",
+            "-print_format", "json",
+            input_path
+        ]
+        try:
+            result = subprocess.run(
+                command, capture_output=True, text=True, encoding="utf-8", errors="replace", check=True
+            )
+            frames = json.loads(result.stdout).get("frames", [])
+        except (OSError, subprocess.CalledProcessError, json.JSONDecodeError) as e:
+            logger.warning("キーフレームの取得に失敗しました: {}: {}", input_path, e)
+            return []
+
+        keyframes = []
+        for frame in frames:
+            try:
+                keyframes.append(float(frame["pts_time"]))
+            except (KeyError, TypeError, ValueError):
+                continue
+        return sorted(keyframes)
+
+    def _run_segments(self, segments: List[Segment], progress_callback: Optional[ProgressCallback]) -> None:
+        """区間を並列にエンコードし、進捗は全区間の合計で通知する"""
+        lock = threading.Lock()
+        done_times: Dict[int, float] = {}
+        total = sum(segment.duration for segment in segments) or None
+
+        def make_callback(segment: Segment) -> Optional[ProgressCallback]:
+            if progress_callback is None or not segment.duration:
+                return None
+
+            def on_progress(progress: Dict[str, Any]) -> None:
+                out_time = progress.get("out_time")
+                if out_time is None:
+                    return
+                with lock:
+                    done_times[segment.index] = min(out_time, segment.duration)
+                    elapsed = sum(done_times.values())
+                progress_callback({
+                    "out_time": elapsed,
+                    "speed": None,
+                    "fraction": min(elapsed / total, 1.0) if total else None,
+                    "progress": "continue"
+                })
+
+            return on_progress
+
+        # 1ファイル分の並列数の枠を区間で分け合う
+        weight = 1.0 / len(segments)
+
+        def run(segment: Segment) -> None:
+            with self.governor.lease(segment.job_class, weight) as threads:
+                result = self.runner.run(
+                    apply_thread_args(segment.command, threads), segment.duration or None, make_callback(segment)
+                )
+            if result.returncode != 0:
+                raise RuntimeError(f"区間{segment.index}のエンコード中にエラーが発生しました: {result.stderr}")
+
+        with ThreadPoolExecutor(max_workers=len(segments), thread_name_prefix="segment") as executor:
+            # ジョブの計測先（job_metrics）をワーカースレッドに引き継ぐ
+            futures = [executor.submit(contextvars.copy_context().run, run, segment) for segment in segments]
+            for future in futures:
+                future.result()
+
+    def _concat(
+        self,
+        parts: List[str],
+        work_dir: str,
+        output_args: List[str],
+        extra_inputs: Optional[List[str]] = None
+    ) -> None:
+        """concatデマクサーで区間ファイルを結合"""
+        list_path = os.path.join(work_dir, "concat.txt")
+        with open(list_path, "w", encoding="utf-8") as f:
+            for part in parts:
+                escaped = os.path.abspath(part).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+
+        command = [self.ffmpeg_path, "-f", "concat", "-safe", "0", "-i", list_path]
+        command.extend(extra_inputs or [])
+        command.extend(output_args)
+        with self.governor.lease(JOB_COPY) as threads:
+            result = self.runner.run(apply_thread_args(command, threads))
+        if result.returncode != 0:
+            raise RuntimeError(f"区間ファイルの結合中にエラーが発生しました: {result.stderr}")
@@ -0,0 +1,100 @@
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# ジョブの種類
+JOB_VIDEO = "video"  # H.264エンコード（マルチスレッドで速くなる）
+JOB_AUDIO = "audio"  # MP3/WAVエンコード（エンコーダーはシングルスレッド）
+JOB_COPY = "copy"    # ストリームコピー（ほぼI/Oのみ）
+
+# libx264はこれ以上スレッドを増やしても効率が上がりにくい
+DEFAULT_MAX_THREADS_PER_JOB = 16
+
+
+def apply_thread_args(command: List[str], threads: int, output_paths: Optional[List[str]] = None) -> List[str]:
+    """FFmpegのコマンドにスレッド数の指定を追加
+
+    -filter_threads はグローバルオプションとして先頭に、-threads は各出力の直前に入れる
+    （output_pathsを省略した場合はコマンドの最後の引数を出力とみなす）。
+    """
+    outputs = set(output_paths) if output_paths else {command[-1]}
+    result = [command[0], "-filter_threads", str(threads)]
+    for i, arg in enumerate(command[1:], 1):
+        if arg in outputs and command[i - 1] != "-i":
+            result.extend(["-threads", str(threads)])
+        result.append(arg)
+    return result
+
+
+class ThreadGovernor:
+    """同時に動くFFmpegプロセスにCPUスレッドを配分するクラス
+
+    音声エンコードとストリームコピーには1スレッド、H.264エンコードには残りを並列数の空き枠で等分して割り当てる。
+    合計はCPUコア数 × cpu_share を上限とする。実行中のFFmpegのスレッド数は変えられないため、
+    ジョブが終わって空いた分は、次に開始するジョブの割り当てに反映される。
+    """
+
+    def __init__(
+        self,
+        cpu_count: Optional[int] = None,
+        cpu_share: float = 0.9,
+        max_threads_per_job: int = DEFAULT_MAX_THREADS_PER_JOB
+    ):
+        self.cpu_count = cpu_count or os.cpu_count() or 1
+        self.budget = max(1, int(self.cpu_count * cpu_share))
+        self.max_threads_per_job = max(1, max_threads_per_job)
+        self.expected_jobs = 1
+        self._lock = threading.Lock()
+        self._active: Dict[int, Tuple[str, int, float]] = {}
+        self._next_id = 0
+
+    def set_expected_jobs(self, expected_jobs: int) -> None:
+        """同時に実行される見込みのジョブ数（変換の並列数）を設定"""
+        with self._lock:
+            self.expected_jobs = max(1, expected_jobs)
+
+    def process_share(self) -> int:
+        """並列数の枠1つあたりのCPUスレッド数（1ファイルを分割して同時に動かすプロセス数の上限に使う）"""
+        with self._lock:
+            return max(1, self.budget // self.expected_jobs)
+
+    @contextmanager
+    def lease(self, job_class: str, weight: float = 1.0) -> Iterator[int]:
+        """ジョブの実行中、割り当てたスレッド数を確保する
+
+        weightは並列数の枠1つに対する割合（1ファイルを分割して並列にエンコードする場合は区間数分の1）。
+        """
+        with self._lock:
+            threads = self._allocate(job_class, weight)
+            lease_id = self._next_id
+            self._next_id += 1
+            self._active[lease_id] = (job_class, threads, weight)
+        try:
+            yield threads
+        finally:
+            with self._lock:
+                self._active.pop(lease_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        """現在の割り当て状況"""
+        with self._lock:
+            return {
+                "budget": self.budget,
+                "active_jobs": len(self._active),
+                "allocated_threads": sum(threads for _, threads, _ in self._active.values())
+            }
+
+    def _allocate(self, job_class: str, weight: float) -> int:
+        """新しく開始するジョブのスレッド数を決める（ロック取得済みで呼ぶ）
+
+        残りのスレッドを、まだ埋まっていない並列数の枠で等分した分（×weight）を割り当てる。
+        """
+        if job_class != JOB_VIDEO:
+            return 1
+
+        allocated = sum(threads for _, threads, _ in self._active.values())
+        used_slots = sum(w for _, _, w in self._active.values())
+        free_slots = max(self.expected_jobs - used_slots, weight)
+        share = (self.budget - allocated) * weight / free_slots
+        return max(1, min(int(round(share)), self.max_threads_per_job))
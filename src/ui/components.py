@@ -1,8 +1,16 @@
 import tkinter as tk
 from tkinter import ttk
-from typing import Callable, List, Optional
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
 import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
 from tkinterdnd2 import DND_FILES, TkinterDnD
+from ..services.media_probe import format_duration
+from ..services.progress_aggregator import ProgressSnapshot
+from ..utils.logger import logger
 
 class DragDropFrame(ttk.Frame):
     """ドラッグ＆ドロップ領域のフレーム"""
@@ -33,8 +41,8 @@ class DragDropFrame(ttk.Frame):
 
     def _on_drop(self, event) -> None:
         """ファイルがドロップされた時の処理"""
-        print("\nデバッグ: ファイルがドロップされました")
-        print(f"デバッグ: 生のイベントデータ: {event.data}")
+        logger.debug("ファイルがドロップされました")
+        logger.debug("生のイベントデータ: {}", event.data)
 
         try:
             # ドロップされたファイルのパスを取得
@@ -63,17 +71,17 @@ class DragDropFrame(ttk.Frame):
             if current_path:  # 最後のパスを追加
                 file_paths.append(current_path)
 
-            print(f"デバッグ: パース後のパス: {file_paths}")
+            logger.debug("パース後のパス: {}", file_paths)
 
             # パスの正規化
             file_paths = [os.path.normpath(path) for path in file_paths]
-            print(f"デバッグ: 正規化後のパス: {file_paths}")
+            logger.debug("正規化後のパス: {}", file_paths)
 
             # コールバックを呼び出し
             self.on_files_dropped(file_paths)
 
         except Exception as e:
-            print(f"エラー: ドロップ処理中にエラーが発生: {str(e)}")
+            logger.error("ドロップ処理中にエラーが発生: {}", e)
             raise
         finally:
             # 見た目を元に戻す
@@ -81,31 +89,55 @@ class DragDropFrame(ttk.Frame):
 
     def _on_drag_enter(self, event) -> None:
         """ドラッグが領域に入った時の処理"""
-        print("デバッグ: ドラッグが領域に入りました")
+        logger.debug("ドラッグが領域に入りました")
         self.drop_label.configure(background="lightblue")
 
     def _on_drag_leave(self, event) -> None:
         """ドラッグが領域から出た時の処理"""
-        print("デバッグ: ドラッグが領域から出ました")
+        logger.debug("ドラッグが領域から出ました")
         self.drop_label.configure(background="")
 
 class FileListFrame(ttk.Frame):
-    """ファイル一覧を表示するフレーム"""
+    """ファイル一覧を表示するフレーム
+
+    一覧はパスから行へのdictで管理し、削除や一覧の取得で全行を走査しない。
+    追加した行は一定件数ずつ分けてツリービューに挿入し、サイズと長さ（プローブ結果）は
+    バックグラウンドのスレッドで取得してから、まとめて表示に反映する。
+    数千件のファイルを追加してもTkのメインループを止めない。
+    """
+
+    # 1回の更新で挿入する行数と、情報を反映する行数
+    INSERT_CHUNK = 500
+    UPDATE_CHUNK = 1000
+    POLL_INTERVAL_MS = 50
 
     def __init__(
         self,
         master: tk.Misc,
         on_file_remove: Callable[[str], None],
         *args,
+        probe: Optional[Callable[[str], Any]] = None,
         **kwargs
     ):
         super().__init__(master, *args, **kwargs)
         self.on_file_remove = on_file_remove
+        self.probe = probe
+
+        # パス -> 行 と 行 -> パス（挿入待ちの行はパスだけを持つ）
+        self._items: Dict[str, Optional[str]] = {}
+        self._paths_by_item: Dict[str, str] = {}
+        self._insert_queue: Deque[str] = deque()
+        # バックグラウンドのスレッドとの受け渡し
+        self._info_requests: "queue.SimpleQueue[str]" = queue.SimpleQueue()
+        self._info_results: "queue.SimpleQueue[Tuple[str, str, str]]" = queue.SimpleQueue()
+        self._info_thread: Optional[threading.Thread] = None
+        self._info_outstanding = 0  # 結果をまだ受け取っていない取得要求の数（Tkのスレッドでのみ更新）
+        self._poll_scheduled = False
 
         # ファイル一覧のツリービュー
         self.tree = ttk.Treeview(
             self,
-            columns=("path", "size", "format"),
+            columns=("path", "size", "format", "duration"),
             show="headings",
             selectmode="browse"
         )
@@ -114,10 +146,12 @@ class FileListFrame(ttk.Frame):
         self.tree.heading("path", text="ファイル名")
         self.tree.heading("size", text="サイズ")
         self.tree.heading("format", text="形式")
+        self.tree.heading("duration", text="長さ")
 
         self.tree.column("path", width=300)
         self.tree.column("size", width=100)
         self.tree.column("format", width=100)
+        self.tree.column("duration", width=100)
 
         # スクロールバー
         scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.tree.yview)
@@ -136,35 +170,66 @@ class FileListFrame(ttk.Frame):
 
     def add_file(self, file_path: str) -> None:
         """ファイルをリストに追加"""
-        # ファイル情報を取得
-        file_name = os.path.basename(file_path)
-        file_size = os.path.getsize(file_path)
-        file_format = os.path.splitext(file_path)[1].lstrip(".")
-
-        # サイズを適切な単位に変換
-        size_str = self._format_size(file_size)
-
-        # ツリービューに追加
-        self.tree.insert("", "end", values=(file_name, size_str, file_format), tags=(file_path,))
+        self.add_files([file_path])
+
+    def add_files(self, file_paths: Iterable[str]) -> int:
+        """ファイルをまとめてリストに追加し、追加した件数を返す（既に一覧にあるパスは無視）
+
+        Tkのスレッドから呼ぶ。行の挿入と情報の取得は後から少しずつ行う。
+        """
+        added = 0
+        for file_path in file_paths:
+            if file_path in self._items:
+                logger.debug("既に一覧にあるファイルです: {}", file_path)
+                continue
+            self._items[file_path] = None
+            self._insert_queue.append(file_path)
+            self._info_requests.put(file_path)
+            self._info_outstanding += 1
+            added += 1
+        if added:
+            self._ensure_info_thread()
+            self._schedule_poll(0)
+        return added
 
     def remove_file(self, file_path: str) -> None:
         """ファイルをリストから削除"""
-        for item in self.tree.get_children():
-            if file_path in self.tree.item(item)["tags"]:
-                self.tree.delete(item)
-                break
+        if file_path not in self._items:
+            return
+        item = self._items.pop(file_path)
+        if item is not None:
+            self._paths_by_item.pop(item, None)
+            self.tree.delete(item)
+        # 挿入待ちの行は、挿入時に一覧に無ければ飛ばす
+
+    def remove_files(self, file_paths: Iterable[str]) -> None:
+        """複数のファイルをまとめてリストから削除"""
+        items = []
+        for file_path in file_paths:
+            if file_path not in self._items:
+                continue
+            item = self._items.pop(file_path)
+            if item is not None:
+                self._paths_by_item.pop(item, None)
+                items.append(item)
+        if items:
+            self.tree.delete(*items)
 
     def clear(self) -> None:
         """リストをクリア"""
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        self._items.clear()
+        self._paths_by_item.clear()
+        self._insert_queue.clear()
+        children = self.tree.get_children()
+        if children:
+            self.tree.delete(*children)
 
     def get_files(self) -> List[str]:
-        """リストに表示されているファイルのパスを取得"""
-        files = []
-        for item in self.tree.get_children():
-            files.extend(self.tree.item(item)["tags"])
-        return files
+        """リストに表示されているファイルのパスを取得（追加した順）"""
+        return list(self._items)
+
+    def __len__(self) -> int:
+        return len(self._items)
 
     def _format_size(self, size: int) -> str:
         """ファイルサイズを適切な単位に変換"""
@@ -174,6 +239,79 @@ class FileListFrame(ttk.Frame):
             size /= 1024
         return f"{size:.1f} TB"
 
+    def _ensure_info_thread(self) -> None:
+        """サイズとプローブ結果を取得するスレッドを開始（実行中なら何もしない）"""
+        if self._info_thread is not None and self._info_thread.is_alive():
+            return
+        self._info_thread = threading.Thread(target=self._info_worker, name="file-list-info", daemon=True)
+        self._info_thread.start()
+
+    def _info_worker(self) -> None:
+        """バックグラウンドのスレッド: ファイルのサイズとプローブ結果を取得して結果のキューに入れる"""
+        while True:
+            file_path = self._info_requests.get()
+            if file_path not in self._items:
+                # 取得前に一覧から削除された
+                self._info_results.put((file_path, "", ""))
+                continue
+            try:
+                size_str = self._format_size(os.path.getsize(file_path))
+            except OSError as e:
+                logger.warning("ファイルのサイズを取得できませんでした: {}: {}", file_path, e)
+                size_str = "-"
+            duration_str = ""
+            if self.probe is not None:
+                try:
+                    media_info = self.probe(file_path)
+                    duration = getattr(media_info, "duration", None)
+                    duration_str = format_duration(duration) if duration else ""
+                except Exception as e:
+                    logger.debug("一覧の表示用のプローブに失敗しました: {}: {}", file_path, e)
+            self._info_results.put((file_path, size_str, duration_str))
+
+    def _schedule_poll(self, delay_ms: int) -> None:
+        if not self._poll_scheduled:
+            self._poll_scheduled = True
+            self.after(delay_ms, self._poll)
+
+    def _poll(self) -> None:
+        """Tkのスレッド: 挿入待ちの行と取得済みの情報を一定件数ずつ反映する"""
+        self._poll_scheduled = False
+        for _ in range(min(self.INSERT_CHUNK, len(self._insert_queue))):
+            file_path = self._insert_queue.popleft()
+            if file_path not in self._items or self._items[file_path] is not None:
+                continue
+            item = self.tree.insert(
+                "", "end",
+                values=(os.path.basename(file_path), "…", os.path.splitext(file_path)[1].lstrip("."), "")
+            )
+            self._items[file_path] = item
+            self._paths_by_item[item] = file_path
+
+        deferred = []
+        for _ in range(self.UPDATE_CHUNK):
+            try:
+                file_path, size_str, duration_str = self._info_results.get_nowait()
+            except queue.Empty:
+                break
+            item = self._items.get(file_path)
+            if item is None and file_path in self._items:
+                # 行の挿入前に情報が届いた
+                deferred.append((file_path, size_str, duration_str))
+                continue
+            self._info_outstanding -= 1
+            if item is not None:
+                self.tree.set(item, "size", size_str)
+                self.tree.set(item, "duration", duration_str)
+        for result in deferred:
+            self._info_results.put(result)
+
+        if self._insert_queue:
+            # 挿入待ちがあれば、イベント処理を挟んですぐに続ける
+            self._schedule_poll(1)
+        elif self._info_outstanding > 0:
+            self._schedule_poll(self.POLL_INTERVAL_MS)
+
     def _show_context_menu(self, event: tk.Event) -> None:
         """右クリックメニューを表示"""
         item = self.tree.identify_row(event.y)
@@ -185,10 +323,11 @@ class FileListFrame(ttk.Frame):
         """選択されたファイルを削除"""
         selected = self.tree.selection()
         if selected:
-            item = selected[0]
-            file_path = self.tree.item(item)["tags"][0]
+            file_path = self._paths_by_item.get(selected[0])
+            if file_path is None:
+                return
             self.on_file_remove(file_path)
-            self.tree.delete(item)
+            self.remove_file(file_path)
 
 class FormatSelector(ttk.Frame):
     """出力フォーマット選択フレーム"""
@@ -326,7 +465,9 @@ class FormatSelector(ttk.Frame):
             self.warning_label.pack_forget()
 
 class ProgressFrame(ttk.Frame):
-    """進捗表示フレーム"""
+    """進捗表示フレーム（全体の進捗バーと、変換中のファイルごとの進捗バー）"""
+
+    LANE_NAMES = {"video": "動画", "audio": "音声", "copy": "コピー"}
 
     def __init__(self, master: tk.Misc, *args, **kwargs):
         super().__init__(master, *args, **kwargs)
@@ -344,14 +485,77 @@ class ProgressFrame(ttk.Frame):
         self.status_label = ttk.Label(self, text="")
         self.status_label.pack(side="top", fill="x", padx=5)
 
+        # 残り時間とレーンごとの処理速度
+        self.eta_label = ttk.Label(self, text="")
+        self.eta_label.pack(side="top", fill="x", padx=5)
+
+        # ファイルごとの進捗（行は使い回し、変換中のファイル数に合わせて表示・非表示を切り替える）
+        self.jobs_frame = ttk.Frame(self)
+        self.jobs_frame.pack(side="top", fill="x", padx=5, pady=(5, 0))
+        self._job_rows: List[Tuple[ttk.Label, ttk.Progressbar]] = []
+        self._rendered_version = -1
+        self._rendered_at = 0.0
+
     def update_progress(self, message: str, value: float) -> None:
         """進捗を更新"""
         self.status_label.configure(text=message)
         self.progress["value"] = value
-        self.update_idletasks()
+
+    def render(self, snapshot: ProgressSnapshot) -> None:
+        """進捗の集計を描画（前回から変化が無ければ、残り時間の表示のために1秒に1回だけ描画）"""
+        now = time.monotonic()
+        if snapshot.version == self._rendered_version and now - self._rendered_at < 1.0:
+            return
+        self._rendered_version = snapshot.version
+        self._rendered_at = now
+        self.update_progress(snapshot.message, snapshot.percent)
+        self.eta_label.configure(text=self._format_eta(snapshot))
+
+        while len(self._job_rows) < len(snapshot.jobs):
+            label = ttk.Label(self.jobs_frame, text="", width=40, anchor="w")
+            bar = ttk.Progressbar(self.jobs_frame, orient="horizontal", mode="determinate", length=200)
+            row = len(self._job_rows)
+            label.grid(row=row, column=0, sticky="w")
+            bar.grid(row=row, column=1, sticky="ew", padx=(5, 0))
+            self._job_rows.append((label, bar))
+        self.jobs_frame.columnconfigure(1, weight=1)
+
+        for i, (label, bar) in enumerate(self._job_rows):
+            if i >= len(snapshot.jobs):
+                label.grid_remove()
+                bar.grid_remove()
+                continue
+            job = snapshot.jobs[i]
+            text = job.name
+            if job.speed:
+                text += f" ({job.speed:.2f}x)"
+            label.configure(text=text)
+            bar["value"] = (job.fraction or 0.0) * 100
+            label.grid()
+            bar.grid()
+
+    def _format_eta(self, snapshot: ProgressSnapshot) -> str:
+        """残り時間・終了予定時刻・レーンごとの処理速度の表示"""
+        parts = []
+        if snapshot.eta_seconds is not None:
+            finish = datetime.now() + timedelta(seconds=snapshot.eta_seconds)
+            hours, remainder = divmod(int(snapshot.eta_seconds), 3600)
+            minutes, seconds = divmod(remainder, 60)
+            parts.append(f"残り 約{hours}:{minutes:02d}:{seconds:02d}（終了予定 {finish.strftime('%m/%d %H:%M')}）")
+        speeds = [
+            f"{self.LANE_NAMES.get(lane, lane)} {speed:.1f}倍速"
+            for lane, speed in sorted(snapshot.lane_speed.items())
+        ]
+        if speeds:
+            parts.append(" / ".join(speeds))
+        return "  ".join(parts)
 
     def reset(self) -> None:
         """進捗表示をリセット"""
         self.status_label.configure(text="")
+        self.eta_label.configure(text="")
         self.progress["value"] = 0
-        self.update_idletasks()
\ No newline at end of file
+        for label, bar in self._job_rows:
+            label.grid_remove()
+            bar.grid_remove()
+        self._rendered_version = -1
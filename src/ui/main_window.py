@@ -1,12 +1,18 @@
+import os
 import tkinter as tk
 from tkinter import ttk, messagebox
-from typing import List
+from typing import List, Tuple
 import threading
 from tkinterdnd2 import DND_FILES, TkinterDnD
 from .components import DragDropFrame, FileListFrame, FormatSelector, ProgressFrame
 from ..controllers.converter_controller import ConverterController
 from ..utils.logger import logger
 
+# 進捗表示の更新間隔（20Hz）
+PROGRESS_POLL_INTERVAL_MS = 50
+# 完了メッセージに一覧表示するファイル数（超えた分は件数のみ表示）
+MESSAGE_LIST_LIMIT = 20
+
 class MainWindow(TkinterDnD.Tk):
     """メインウィンドウ"""
 
@@ -20,7 +26,7 @@ class MainWindow(TkinterDnD.Tk):
 
         # コントローラーの初期化
         self.controller = ConverterController()
-        self.controller.set_progress_callback(self._update_progress)
+        self._converting = False
 
         # UIの初期化
         self._init_ui()
@@ -41,7 +47,8 @@ class MainWindow(TkinterDnD.Tk):
         # ファイル一覧
         self.file_list = FileListFrame(
             main_frame,
-            on_file_remove=self._on_file_removed
+            on_file_remove=self._on_file_removed,
+            probe=self.controller.ffmpeg.prober.probe
         )
         self.file_list.pack(expand=True, fill="both", pady=10)
 
@@ -69,22 +76,47 @@ class MainWindow(TkinterDnD.Tk):
         self.convert_button.pack(pady=10)
 
     def _on_files_dropped(self, file_paths: List[str]) -> None:
-        """ファイルがドロップされた時の処理"""
+        """ファイルがドロップされた時の処理
+
+        ファイルとフォルダーの判別やフォルダーの走査は、ネットワークドライブなどで時間がかかるため別スレッドで行う。
+        """
+        threading.Thread(
+            target=self._add_dropped_paths, args=(list(file_paths),), name="scan-dropped", daemon=True
+        ).start()
+
+    def _add_dropped_paths(self, file_paths: List[str]) -> None:
+        """ドロップされたファイルとフォルダー内のファイルを一覧に追加（別スレッドで実行）"""
         try:
-            for path in file_paths:
-                self.file_list.add_file(path)
-            logger.info(f"{len(file_paths)}個のファイルが追加されました")
+            files, directories = self.controller.file_handler.split_directories(file_paths)
+            for start in range(0, len(files), FileListFrame.INSERT_CHUNK):
+                self.after(0, self.file_list.add_files, files[start:start + FileListFrame.INSERT_CHUNK])
+            logger.info("{}個のファイルがドロップされました", len(files))
+            if directories:
+                self._scan_dropped_directories(directories)
         except Exception as e:
-            logger.error(f"ファイルの追加中にエラーが発生しました: {str(e)}")
-            messagebox.showerror("エラー", f"ファイルの追加中にエラーが発生しました: {str(e)}")
+            logger.error("ファイルの追加中にエラーが発生しました: {}", e)
+            self.after(0, messagebox.showerror, "エラー", f"ファイルの追加中にエラーが発生しました: {str(e)}")
+
+    def _scan_dropped_directories(self, directories: List[str]) -> None:
+        """ドロップされたフォルダー内のサポートされている形式のファイルを一覧に追加（_add_dropped_pathsから呼ぶ）"""
+        chunk: List[str] = []
+        for directory in directories:
+            for entry in self.controller.file_handler.scan_directory(directory):
+                chunk.append(entry.path)
+                if len(chunk) >= FileListFrame.INSERT_CHUNK:
+                    self.after(0, self.file_list.add_files, chunk)
+                    chunk = []
+        if chunk:
+            self.after(0, self.file_list.add_files, chunk)
+        logger.info("フォルダーの走査が完了しました: {}", directories)
 
     def _on_file_removed(self, file_path: str) -> None:
         """ファイルが削除された時の処理"""
-        logger.info(f"ファイルが削除されました: {file_path}")
+        logger.info("ファイルが削除されました: {}", file_path)
 
     def _on_format_changed(self, format_type: str) -> None:
         """フォーマットが変更された時の処理"""
-        logger.info(f"出力フォーマットが変更されました: {format_type}")
+        logger.info("出力フォーマットが変更されました: {}", format_type)
         # ウィンドウタイトルを更新
         if format_type == "mp4":
             self.title("動画コンバーター - MOV→MP4変換")
@@ -93,12 +125,12 @@ class MainWindow(TkinterDnD.Tk):
 
     def _on_quality_changed(self, quality_preset: str) -> None:
         """品質設定が変更された時の処理"""
-        logger.info(f"MP4品質設定が変更されました: {quality_preset}")
+        logger.info("MP4品質設定が変更されました: {}", quality_preset)
         self.controller.set_quality_preset(quality_preset)
 
     def _on_overwrite_changed(self, overwrite: bool) -> None:
         """上書きモードが変更された時の処理"""
-        logger.info(f"上書きモードが変更されました: {'有効' if overwrite else '無効'}")
+        logger.info("上書きモードが変更されました: {}", '有効' if overwrite else '無効')
         self.controller.set_overwrite_mode(overwrite)
 
     def _start_conversion(self) -> None:
@@ -123,12 +155,18 @@ class MainWindow(TkinterDnD.Tk):
             target=self._convert_files,
             args=(files, self.format_selector.get_format())
         )
+        self._converting = True
         thread.start()
+        self._poll_progress()
 
     def _convert_files(self, files: List[str], output_format: str) -> None:
         """ファイルの変換を実行"""
         try:
-            results = self.controller.convert_files(files, output_format)
+            # 一覧のファイルはすべて変換する（件数の上限は適用しない）
+            skipped: List[Tuple[str, str]] = []
+            results = self.controller.convert_files(
+                files, output_format, lambda path, reason: skipped.append((path, reason)), limit_files=False
+            )
 
             # 結果を集計
             success = sum(1 for r in results if r["status"] == "success")
@@ -148,20 +186,33 @@ class MainWindow(TkinterDnD.Tk):
             # 成功したファイルの出力パスを表示
             if success > 0:
                 message += "変換されたファイル:\n"
-                for result in results:
-                    if result["status"] == "success":
-                        message += f"・{result['output_path']}\n"
+                outputs = [result["output_path"] for result in results if result["status"] == "success"]
+                for output_path in outputs[:MESSAGE_LIST_LIMIT]:
+                    message += f"・{output_path}\n"
+                if len(outputs) > MESSAGE_LIST_LIMIT:
+                    message += f"・ほか{len(outputs) - MESSAGE_LIST_LIMIT}件\n"
 
             if failed > 0:
                 message += "\nエラーの詳細はログファイルを確認してください"
 
-            self.after(0, lambda: messagebox.showinfo("完了", message))
+            if skipped:
+                message += f"\n\n変換しなかったファイル: {len(skipped)}件（一覧に残しています）\n"
+                for path, reason in skipped[:MESSAGE_LIST_LIMIT]:
+                    message += f"・{path}: {reason}\n"
+                if len(skipped) > MESSAGE_LIST_LIMIT:
+                    message += f"・ほか{len(skipped) - MESSAGE_LIST_LIMIT}件\n"
 
-            # ファイルリストをクリア
-            self.after(0, self.file_list.clear)
+            show_message = messagebox.showwarning if skipped else messagebox.showinfo
+            self.after(0, lambda: show_message("完了", message))
+
+            # 変換したファイルだけを一覧から削除（検証で除外したファイルは残す）
+            processed = {os.path.normpath(r["input_path"]) for r in results}
+            self.after(0, lambda: self.file_list.remove_files(
+                [path for path in files if os.path.normpath(path) in processed]
+            ))
 
         except Exception as e:
-            logger.error(f"変換処理中にエラーが発生しました: {str(e)}")
+            logger.error("変換処理中にエラーが発生しました: {}", e)
             self.after(0, lambda: messagebox.showerror(
                 "エラー",
                 f"変換処理中にエラーが発生しました: {str(e)}"
@@ -171,11 +222,19 @@ class MainWindow(TkinterDnD.Tk):
             # UIを有効化
             self.after(0, lambda: self._set_ui_state("normal"))
             # 進捗表示をリセット
-            self.after(0, self.progress_frame.reset)
+            self.after(0, self._finish_progress)
+
+    def _poll_progress(self) -> None:
+        """変換中は一定間隔で進捗の集計を読み出して描画（進捗イベントの数によらず描画の回数は一定）"""
+        if not self._converting:
+            return
+        self.progress_frame.render(self.controller.get_progress())
+        self.after(PROGRESS_POLL_INTERVAL_MS, self._poll_progress)
 
-    def _update_progress(self, message: str, value: float) -> None:
-        """進捗を更新"""
-        self.after(0, lambda: self.progress_frame.update_progress(message, value))
+    def _finish_progress(self) -> None:
+        """進捗のポーリングを止めて表示をリセット"""
+        self._converting = False
+        self.progress_frame.reset()
 
     def _set_ui_state(self, state: str) -> None:
         """UIの状態を設定"""
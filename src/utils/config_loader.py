@@ -42,53 +42,105 @@ class ConfigLoader:
                 "audio_bitrate": "128k"
             }
         },
+        "cache": {
+            "probe_cache_enabled": True,
+            "probe_cache_path": "cache/probe_cache.sqlite3",
+            "probe_cache_max_entries": 100000,
+            "conversion_cache_enabled": False,
+            "conversion_cache_dir": "cache/conversions",
+            "conversion_cache_max_size_mb": 2048,
+            "conversion_cache_use_hardlinks": True,
+            "scheduler_stats_path": "cache/scheduler_stats.json",  # 変換時間の見積もり係数の学習結果
+            "loudness_cache_enabled": True,
+            "loudness_cache_path": "cache/loudness_cache.sqlite3"  # ラウドネス正規化の解析結果
+        },
+        "segmented_encoding": {
+            "enabled": True,
+            "min_duration_seconds": 1200,  # この長さ以上のファイルを分割して並列にエンコード
+            "min_segment_seconds": 120,    # 1区間の最小の長さ
+            "segments": 0                  # 最大の分割数（0で並列数の枠1つあたりのCPUスレッド数）
+        },
+        "micro_batch": {
+            # 短いファイルを1回のFFmpegでまとめて変換（プロセスの起動回数を減らす）
+            "enabled": False,
+            "max_duration_seconds": 60,  # この長さ以下のファイルをまとめる
+            "max_size_mb": 20,           # このサイズ以下のファイルをまとめる
+            "max_files": 32              # 1回の実行でまとめる最大のファイル数
+        },
+        "loudness": {
+            # MP3/WAVの出力をEBU R128（loudnorm）の2パスで正規化
+            "enabled": False,
+            "integrated": -16.0,  # 目標の統合ラウドネス（LUFS）
+            "true_peak": -1.5,    # トゥルーピークの上限（dBTP）
+            "lra": 11.0           # ラウドネスレンジの目標（LU）
+        },
+        "logging": {
+            "level": "INFO",          # ログファイルのレベル（DEBUGで詳細な動作を記録）
+            "console_level": "INFO",  # コンソールのレベル
+            "json": False,            # ログファイルをJSON Lines形式で出力
+            "enqueue": False          # 書き込みをバックグラウンドのスレッドで行う（遅い出力先向け）
+        },
+        "metrics": {
+            # 変換ジョブの計測結果の集計（空文字で出力しない）
+            "prometheus_path": "logs/metrics.prom",
+            "json_path": "logs/metrics_summary.json"
+        },
+        "execution_lanes": {
+            # レーンごとの同時実行数（0で並列数から自動決定）
+            "video": 0,  # 動画の再エンコード
+            "audio": 0,  # 音声の再エンコード
+            "copy": 0    # ストリームコピー
+        },
         "app": {
             "max_files": 20,
+            "max_workers": 0,  # 同時変換数（0でCPUコア数）
+            "job_timeout_seconds": 0,  # 非同期エンジンの1ジョブあたりの制限時間（0で無制限）
+            "cpu_share": 0.9,  # FFmpegに割り当てるスレッドの合計（CPUコア数に対する割合）
+            "max_threads_per_job": 16,  # 1つの動画エンコードに割り当てる最大スレッド数
             "log_retention_days": 7,
             "log_max_size_mb": 10
         }
     }
 
     def __init__(self, config_path: str = "config/config.json"):
-        print("デバッグ: ConfigLoaderの初期化開始")
+        logger.debug("ConfigLoaderの初期化開始")
         self.base_path = self._get_base_path()
-        print(f"デバッグ: ベースパス: {self.base_path}")
+        logger.debug("ベースパス: {}", self.base_path)
         self.config_path = os.path.normpath(os.path.join(self.base_path, self._normalize_path(config_path)))
-        print(f"デバッグ: 設定ファイルのパス: {self.config_path}")
+        logger.debug("設定ファイルのパス: {}", self.config_path)
         self.config: Dict[str, Any] = {}
         self.load_config()
 
     def create_default_config(self) -> None:
         """デフォルトの設定ファイルを作成する"""
         try:
-            print("デバッグ: デフォルト設定ファイルの作成開始")
+            logger.debug("デフォルト設定ファイルの作成開始")
             # configディレクトリが存在しない場合は作成
             os.makedirs(os.path.dirname(self.config_path), exist_ok=True)
-            print(f"デバッグ: 設定ディレクトリを作成: {os.path.dirname(self.config_path)}")
+            logger.debug("設定ディレクトリを作成: {}", os.path.dirname(self.config_path))
 
             # FFmpegのパスを絶対パスに変換
             config = self.DEFAULT_CONFIG.copy()
             ffmpeg_path = os.path.normpath(os.path.join(self.base_path, self.DEFAULT_CONFIG["ffmpeg"]["path"]))
             config["ffmpeg"]["path"] = ffmpeg_path
-            print(f"デバッグ: FFmpegパスを設定: {ffmpeg_path}")
+            logger.debug("FFmpegパスを設定: {}", ffmpeg_path)
 
             with open(self.config_path, 'w', encoding='utf-8') as f:
                 json.dump(config, f, indent=4, ensure_ascii=False)
-            print(f"デバッグ: デフォルト設定ファイルを作成完了: {self.config_path}")
-            logger.info(f"デフォルトの設定ファイルを作成しました: {self.config_path}")
+            logger.debug("デフォルト設定ファイルを作成完了: {}", self.config_path)
+            logger.info("デフォルトの設定ファイルを作成しました: {}", self.config_path)
 
         except Exception as e:
-            print(f"エラー: デフォルト設定ファイルの作成中にエラー発生: {str(e)}")
-            logger.error(f"デフォルト設定ファイルの作成中にエラーが発生しました: {str(e)}")
+            logger.error("デフォルト設定ファイルの作成中にエラーが発生しました: {}", e)
             raise
 
     def load_config(self) -> None:
         """設定ファイルを読み込む"""
         try:
-            print(f"デバッグ: 設定ファイルの読み込み開始: {self.config_path}")
+            logger.debug("設定ファイルの読み込み開始: {}", self.config_path)
             if not os.path.exists(self.config_path):
-                print("デバッグ: 設定ファイルが存在しないためデフォルト設定を作成します")
-                logger.warning(f"設定ファイルが見つかりません。デフォルト設定で作成します: {self.config_path}")
+                logger.debug("設定ファイルが存在しないためデフォルト設定を作成します")
+                logger.warning("設定ファイルが見つかりません。デフォルト設定で作成します: {}", self.config_path)
                 self.create_default_config()
 
             with open(self.config_path, 'r', encoding='utf-8') as f:
@@ -98,18 +150,16 @@ class ConfigLoader:
                 if not os.path.isabs(ffmpeg_path):
                     ffmpeg_path = os.path.normpath(os.path.join(self.base_path, self._normalize_path(ffmpeg_path)))
                     self.config["ffmpeg"]["path"] = ffmpeg_path
-                    print(f"デバッグ: FFmpegパスを絶対パスに変換: {ffmpeg_path}")
-                print("デバッグ: 設定ファイルの読み込みが完了")
+                    logger.debug("FFmpegパスを絶対パスに変換: {}", ffmpeg_path)
+                logger.debug("設定ファイルの読み込みが完了")
                 logger.info("設定ファイルを読み込みました")
 
         except json.JSONDecodeError as e:
-            print(f"エラー: 設定ファイルの形式が不正: {str(e)}")
-            logger.error(f"設定ファイルの形式が不正です: {str(e)}")
+            logger.error("設定ファイルの形式が不正です: {}", e)
             raise
 
         except Exception as e:
-            print(f"エラー: 設定ファイルの読み込み中にエラー発生: {str(e)}")
-            logger.error(f"設定ファイルの読み込み中にエラーが発生しました: {str(e)}")
+            logger.error("設定ファイルの読み込み中にエラーが発生しました: {}", e)
             raise
 
     def get_ffmpeg_path(self) -> str:
@@ -117,6 +167,15 @@ class ConfigLoader:
         path = self.config.get("ffmpeg", {}).get("path", "")
         return os.path.normpath(path)
 
+    def get_ffprobe_path(self) -> str:
+        """ffprobeのパスを取得（未設定の場合はFFmpegと同じディレクトリのffprobe）"""
+        path = self.config.get("ffmpeg", {}).get("ffprobe_path", "")
+        if path:
+            return self.resolve_path(path)
+        ffmpeg_path = self.get_ffmpeg_path()
+        directory, filename = os.path.split(ffmpeg_path)
+        return os.path.join(directory, filename.replace("ffmpeg", "ffprobe", 1))
+
     def get_default_format(self) -> str:
         """デフォルトの出力フォーマットを取得"""
         return self.config.get("ffmpeg", {}).get("default_format", "mp3")
@@ -129,5 +188,53 @@ class ConfigLoader:
         """アプリケーションの設定を取得"""
         return self.config.get("app", {})
 
+    def get_cache_settings(self) -> Dict[str, Any]:
+        """キャッシュの設定を取得（設定ファイルに無い項目はデフォルト値）"""
+        settings = dict(self.DEFAULT_CONFIG["cache"])
+        settings.update(self.config.get("cache", {}))
+        return settings
+
+    def get_segmented_encoding_settings(self) -> Dict[str, Any]:
+        """分割エンコードの設定を取得（設定ファイルに無い項目はデフォルト値）"""
+        settings = dict(self.DEFAULT_CONFIG["segmented_encoding"])
+        settings.update(self.config.get("segmented_encoding", {}))
+        return settings
+
+    def get_execution_lane_settings(self) -> Dict[str, int]:
+        """実行レーンの設定を取得（設定ファイルに無い項目はデフォルト値）"""
+        settings = dict(self.DEFAULT_CONFIG["execution_lanes"])
+        settings.update(self.config.get("execution_lanes", {}))
+        return settings
+
+    def get_micro_batch_settings(self) -> Dict[str, Any]:
+        """まとめて変換する設定を取得（設定ファイルに無い項目はデフォルト値）"""
+        settings = dict(self.DEFAULT_CONFIG["micro_batch"])
+        settings.update(self.config.get("micro_batch", {}))
+        return settings
+
+    def get_loudness_settings(self) -> Dict[str, Any]:
+        """ラウドネス正規化の設定を取得（設定ファイルに無い項目はデフォルト値）"""
+        settings = dict(self.DEFAULT_CONFIG["loudness"])
+        settings.update(self.config.get("loudness", {}))
+        return settings
+
+    def get_logging_settings(self) -> Dict[str, Any]:
+        """ログの設定を取得（設定ファイルに無い項目はデフォルト値）"""
+        settings = dict(self.DEFAULT_CONFIG["logging"])
+        settings.update(self.config.get("logging", {}))
+        return settings
+
+    def get_metrics_settings(self) -> Dict[str, str]:
+        """メトリクスの出力設定を取得（設定ファイルに無い項目はデフォルト値）"""
+        settings = dict(self.DEFAULT_CONFIG["metrics"])
+        settings.update(self.config.get("metrics", {}))
+        return settings
+
+    def resolve_path(self, path: str) -> str:
+        """相対パスをベースパスからの絶対パスに変換"""
+        if not os.path.isabs(path):
+            path = os.path.join(self.base_path, self._normalize_path(path))
+        return os.path.normpath(path)
+
 # グローバルな設定インスタンスを作成
 config = ConfigLoader()
\ No newline at end of file
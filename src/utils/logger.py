@@ -3,51 +3,91 @@ import sys
 from datetime import datetime
 from loguru import logger
 
-def setup_logger():
-    """ロガーの初期設定を行う"""
+CONSOLE_FORMAT = (
+    "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | "
+    "<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
+)
+FILE_FORMAT = "{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}"
+
+
+def setup_logger(
+    console=sys.stdout,
+    console_level: str = "INFO",
+    file_level: str = "INFO",
+    json_lines: bool = False,
+    enqueue: bool = False,
+    log_dir: str = "logs"
+):
+    """ロガーの初期設定を行う
+
+    consoleにはコンソール出力先のストリームとレベルを指定する。
+    全出力先のレベルより低いログは、メッセージを組み立てる前に捨てられる
+    （そのためログは logger.debug("... {}", value) のように引数で値を渡して書く）。
+    enqueue=Trueの場合は書き込みとローテーション時の圧縮をバックグラウンドのスレッドで行う
+    （レコードをプロセス間キューで受け渡すため1件あたりの負荷は増える。遅い出力先向け）。
+    json_lines=Trueの場合はログファイルを1行1レコードのJSONで出力する。
+    """
     try:
         # ログファイルのパスを設定
-        log_dir = os.path.abspath("logs")
+        log_dir = os.path.abspath(log_dir)
         os.makedirs(log_dir, exist_ok=True)
-        
-        log_file = os.path.join(log_dir, f"audio_converter_{datetime.now().strftime('%Y%m%d')}.log")
-        
+
+        extension = "jsonl" if json_lines else "log"
+        log_file = os.path.join(log_dir, f"audio_converter_{datetime.now().strftime('%Y%m%d')}.{extension}")
+
         # ロガーの設定
         config = {
             "handlers": [
                 {
-                    "sink": sys.stdout,
-                    "format": "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
+                    "sink": console,
+                    "level": console_level,
+                    "format": CONSOLE_FORMAT,
+                    "enqueue": enqueue,
                     "catch": True,
                 },
                 {
                     "sink": log_file,
-                    "format": "{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
+                    "level": file_level,
+                    "format": FILE_FORMAT,
+                    "serialize": json_lines,
                     "rotation": "1 day",
                     "retention": "7 days",
                     "compression": "zip",
                     "encoding": "utf-8",
+                    "enqueue": enqueue,
                     "catch": True,
                 },
             ],
         }
-        
-        # 既存のハンドラーを削除
+
+        # 既存のハンドラーを削除（キューに残っているログは書き出してから削除される）
         logger.remove()
-        
+
         # 新しい設定を適用
         for handler in config["handlers"]:
             logger.add(**handler)
-        
-        logger.info("ロガーの初期化が完了しました")
+
+        logger.debug("ロガーの初期化が完了しました")
         return logger
-        
+
     except Exception as e:
         print(f"ロガーの初期化中にエラーが発生しました: {str(e)}")
         # 最低限のロガー設定を適用
         logger.remove()
-        logger.add(sys.stdout, catch=True)
+        logger.add(console, catch=True)
         return logger
 
+
+def apply_logging_settings(settings: dict, console=sys.stdout, console_level: str = None):
+    """設定ファイルのloggingの設定でロガーを設定し直す（console_levelを指定した場合はそちらを優先）"""
+    return setup_logger(
+        console,
+        console_level or settings.get("console_level", "INFO"),
+        settings.get("level", "INFO"),
+        bool(settings.get("json", False)),
+        bool(settings.get("enqueue", False))
+    )
+
+
 # グローバルなロガーインスタンスを作成
-logger = setup_logger() 
\ No newline at end of file
+logger = setup_logger()
@@ -0,0 +1,170 @@
+"""プロファイリングモード（--profile）
+
+cProfileとtracemallocでPythonの処理を計測し、各FFmpegに -benchmark を付けてエンコーダー自体の時間を取得する。
+終了時に、ジョブごとの「Pythonのオーバーヘッド」と「エンコーダーの時間」を分けたレポートを1つのファイルに書き出す。
+"""
+import cProfile
+import io
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# -benchmark の出力（例: "bench: utime=0.120s stime=0.010s rtime=0.200s", "bench: maxrss=30720KiB"）
+BENCH_TIMES_PATTERN = re.compile(r"bench:\s+utime=([\d.]+)s\s+stime=([\d.]+)s\s+rtime=([\d.]+)s")
+BENCH_MAXRSS_PATTERN = re.compile(r"bench:\s+maxrss=(\d+)\s*[kK]i?B")
+
+_active_session: Optional["ProfileSession"] = None
+
+
+def is_profiling() -> bool:
+    """プロファイリング中か（FFmpegRunnerが -benchmark を付けるかの判定に使う）"""
+    return _active_session is not None
+
+
+def parse_benchmark(stderr_lines: List[str]) -> Optional[Dict[str, float]]:
+    """FFmpegの標準エラー出力から -benchmark の結果を取り出す"""
+    result: Dict[str, float] = {}
+    for line in stderr_lines:
+        match = BENCH_TIMES_PATTERN.search(line)
+        if match:
+            result["utime"], result["stime"], result["rtime"] = (float(value) for value in match.groups())
+            continue
+        match = BENCH_MAXRSS_PATTERN.search(line)
+        if match:
+            result["maxrss_kb"] = float(match.group(1))
+    return result or None
+
+
+def record_job(input_path: str, metrics: Dict[str, Any]) -> None:
+    """プロファイリング中なら、ジョブの計測結果をレポートに加える"""
+    session = _active_session
+    if session is not None:
+        session.add_job(input_path, metrics)
+
+
+def default_report_path() -> str:
+    return os.path.abspath(os.path.join("logs", f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"))
+
+
+class ProfileSession:
+    """with ブロックの間プロファイリングし、終了時にレポートを書き出す
+
+    Python 3.11以前のcProfileはスレッドごとに動くため、ブロック内で開始したスレッド（変換のワーカーなど）にも
+    個別のプロファイラーを付けて、最後に集計する。3.12以降は1つのプロファイラーで全スレッドを計測できる。
+    """
+
+    def __init__(self, report_path: Optional[str] = None, top: int = 40):
+        self.report_path = report_path or default_report_path()
+        self.top = top
+        self._lock = threading.Lock()
+        self._profiles: List[cProfile.Profile] = []
+        self._jobs: List[Dict[str, Any]] = []
+        self._per_thread = sys.version_info < (3, 12)
+        self._started = 0.0
+        self._cpu_started = 0.0
+
+    def __enter__(self) -> "ProfileSession":
+        global _active_session
+        tracemalloc.start(10)
+        self._started = time.perf_counter()
+        self._cpu_started = time.process_time()
+        if self._per_thread:
+            threading.setprofile(self._start_thread_profile)
+        self._start_profile()
+        _active_session = self
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        global _active_session
+        _active_session = None
+        if self._per_thread:
+            threading.setprofile(None)
+        wall = time.perf_counter() - self._started
+        cpu = time.process_time() - self._cpu_started
+        for profile in self._profiles:
+            profile.disable()
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self._write_report(wall, cpu, snapshot, peak)
+
+    def add_job(self, input_path: str, metrics: Dict[str, Any]) -> None:
+        with self._lock:
+            self._jobs.append(dict(metrics, input_path=input_path))
+
+    def _start_profile(self) -> None:
+        profile = cProfile.Profile()
+        with self._lock:
+            self._profiles.append(profile)
+        profile.enable()
+
+    def _start_thread_profile(self, *args: Any) -> None:
+        """新しいスレッドの最初の呼び出しでプロファイラーを開始（以降はcProfileがフックを置き換える）"""
+        sys.setprofile(None)
+        if _active_session is self:
+            self._start_profile()
+
+    def _write_report(self, wall: float, cpu: float, snapshot: tracemalloc.Snapshot, peak: int) -> None:
+        out = io.StringIO()
+        out.write(f"プロファイル: {datetime.now().isoformat(timespec='seconds')}\n")
+        out.write(f"経過時間: {wall:.3f}秒 / Python（このプロセス）のCPU時間: {cpu:.3f}秒\n")
+        out.write(f"Pythonのメモリ確保のピーク（tracemalloc）: {peak / (1024 * 1024):.1f} MB\n\n")
+        self._write_jobs(out)
+
+        out.write(f"\n== cProfile（累積時間の上位{self.top}件、全スレッドの合計） ==\n")
+        stats: Optional[pstats.Stats] = None
+        for profile in self._profiles:
+            try:
+                if stats is None:
+                    stats = pstats.Stats(profile, stream=out)
+                else:
+                    stats.add(profile)
+            except TypeError:
+                # 関数を1つも実行していないスレッドのプロファイル
+                continue
+        if stats is not None:
+            stats.sort_stats("cumulative").print_stats(self.top)
+
+        out.write("\n== tracemalloc（確保中のメモリの上位20行） ==\n")
+        for stat in snapshot.statistics("lineno")[:20]:
+            out.write(f"{stat}\n")
+
+        directory = os.path.dirname(self.report_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.report_path, "w", encoding="utf-8") as f:
+            f.write(out.getvalue())
+        print(f"プロファイルを書き出しました: {self.report_path}", file=sys.stderr)
+
+    def _write_jobs(self, out: io.StringIO) -> None:
+        """ジョブごとのPythonのオーバーヘッドとエンコーダーの時間"""
+        out.write("== ジョブごとの内訳（秒） ==\n")
+        out.write("ジョブ全体\tFFmpeg実行中\tPython\tエンコーダー(rtime)\tエンコーダーCPU(utime+stime)\tファイル\n")
+        totals = {"job": 0.0, "ffmpeg": 0.0, "python": 0.0, "rtime": 0.0, "encoder_cpu": 0.0}
+        with self._lock:
+            jobs = list(self._jobs)
+        for job in jobs:
+            bench = job.get("encoder_benchmark") or {}
+            values = {
+                "job": job.get("job_seconds") or 0.0,
+                "ffmpeg": job.get("ffmpeg_wall_seconds") or 0.0,
+                "python": job.get("python_overhead_seconds") or 0.0,
+                "rtime": bench.get("rtime", 0.0),
+                "encoder_cpu": bench.get("utime", 0.0) + bench.get("stime", 0.0)
+            }
+            for key, value in values.items():
+                totals[key] += value
+            out.write(
+                f"{values['job']:.3f}\t{values['ffmpeg']:.3f}\t{values['python']:.3f}\t"
+                f"{values['rtime']:.3f}\t{values['encoder_cpu']:.3f}\t{job['input_path']}\n"
+            )
+        out.write(
+            f"合計 {len(jobs)}件: ジョブ全体 {totals['job']:.3f} / FFmpeg実行中 {totals['ffmpeg']:.3f} / "
+            f"Python {totals['python']:.3f} / エンコーダー {totals['rtime']:.3f}\n"
+        )
@@ -0,0 +1,15 @@
+import os
+import shutil
+import tempfile
+
+# src.utils.loggerはimport時にカレントディレクトリのlogsにログファイルを作成するため、
+# 一時ディレクトリで読み込んでからハンドラーを外し、テストの実行でリポジトリにファイルを残さない
+_log_root = tempfile.mkdtemp(prefix="audio_converter_test_")
+_cwd = os.getcwd()
+os.chdir(_log_root)
+try:
+    from src.utils.logger import logger
+finally:
+    os.chdir(_cwd)
+logger.remove()
+shutil.rmtree(_log_root, ignore_errors=True)
@@ -0,0 +1,142 @@
+import os
+import subprocess
+import sys
+import textwrap
+import pytest
+from src.services.job_journal import STATE_DONE, STATE_FAILED, STATE_QUEUED, STATE_RUNNING, JobJournal
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = JobJournal(str(tmp_path / "journal.sqlite3"))
+    yield journal
+    journal.close()
+
+
+def make_input(tmp_path, name="input.wav", data=b"audio"):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_make_key_is_stable_for_same_input_and_params(tmp_path, monkeypatch):
+    """相対パス・絶対パスや設定の順序が違っても、同じジョブは同じキーになる"""
+    monkeypatch.chdir(tmp_path)
+    params = {"format": "mp3", "bitrate": "192k"}
+    key = JobJournal.make_key("input.wav", params)
+    assert key == JobJournal.make_key(str(tmp_path / "input.wav"), {"bitrate": "192k", "format": "mp3"})
+    assert key != JobJournal.make_key("input.wav", {"format": "mp3", "bitrate": "320k"})
+    assert key != JobJournal.make_key("other.wav", params)
+
+
+def test_find_completed_returns_done_job_with_outputs(tmp_path, journal):
+    """完了済みで入力が変わっておらず出力も残っているジョブは再開時に飛ばせる"""
+    input_path = make_input(tmp_path)
+    output_path = str(tmp_path / "input_converted.mp3")
+    key = JobJournal.make_key(input_path, {"format": "mp3"})
+    journal.mark_queued(key, input_path, {"format": "mp3"}, [output_path], [])
+    journal.mark_running(key)
+    assert journal.find_completed(key) is None
+
+    with open(output_path, "wb") as f:
+        f.write(b"mp3")
+    journal.mark_done(key)
+    entry = journal.find_completed(key)
+    assert entry is not None
+    assert entry.output_paths == [output_path]
+    assert entry.attempts == 1
+
+
+def test_find_completed_ignores_changed_input_or_missing_output(tmp_path, journal):
+    """入力が変更された場合や出力が消された場合は変換し直す"""
+    input_path = make_input(tmp_path)
+    output_path = str(tmp_path / "input_converted.mp3")
+    key = JobJournal.make_key(input_path, {"format": "mp3"})
+    journal.mark_queued(key, input_path, {"format": "mp3"}, [output_path], [])
+    with open(output_path, "wb") as f:
+        f.write(b"mp3")
+    journal.mark_done(key)
+
+    stat = os.stat(input_path)
+    os.utime(input_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert journal.find_completed(key) is None
+
+    journal.mark_queued(key, input_path, {"format": "mp3"}, [output_path], [])
+    journal.mark_done(key)
+    assert journal.find_completed(key) is not None
+    os.remove(output_path)
+    assert journal.find_completed(key) is None
+
+
+def test_recover_removes_partial_outputs_and_requeues(tmp_path, journal):
+    """実行中だったジョブの書きかけの出力と一時ファイルを削除し、待機状態に戻す"""
+    input_path = make_input(tmp_path)
+    output_path = tmp_path / "input_converted.mp3"
+    temp_dir = tmp_path / "input_converted.mp3.segments"
+    key = JobJournal.make_key(input_path, {"format": "mp3"})
+    journal.mark_queued(key, input_path, {"format": "mp3"}, [str(output_path)], [str(temp_dir)])
+    journal.mark_running(key)
+    output_path.write_bytes(b"partial")
+    temp_dir.mkdir()
+    (temp_dir / "part000.mp3").write_bytes(b"segment")
+
+    entries = journal.recover()
+    assert [entry.job_key for entry in entries] == [key]
+    assert not output_path.exists()
+    assert not temp_dir.exists()
+    assert os.path.exists(input_path)
+    assert journal.get(key).state == STATE_QUEUED
+
+
+def test_recover_keeps_input_and_written_outputs_of_queued_jobs(tmp_path, journal):
+    """開始前のジョブは空の確保用ファイルだけを削除し、入力と同じパスの出力（上書きモード）は消さない"""
+    input_path = make_input(tmp_path)
+    placeholder = tmp_path / "a_converted.mp3"
+    placeholder.write_bytes(b"")
+    existing = tmp_path / "b_converted.mp3"
+    existing.write_bytes(b"written")
+    queued_key = JobJournal.make_key(input_path, {"format": "mp3"})
+    journal.mark_queued(queued_key, input_path, {"format": "mp3"}, [str(placeholder), str(existing)], [])
+    overwrite_key = JobJournal.make_key(input_path, {"format": "mp3", "overwrite_mode": True})
+    journal.mark_queued(overwrite_key, input_path, {"format": "mp3", "overwrite_mode": True}, [input_path], [])
+    journal.mark_running(overwrite_key)
+
+    journal.recover()
+    assert not placeholder.exists()
+    assert existing.read_bytes() == b"written"
+    assert os.path.exists(input_path)
+
+
+def test_committed_state_survives_crash(tmp_path):
+    """閉じずにプロセスが終了しても、WALにコミット済みの状態は次に開いたときに読める"""
+    db_path = str(tmp_path / "journal.sqlite3")
+    input_path = make_input(tmp_path)
+    script = textwrap.dedent(f"""
+        import os
+        from src.services.job_journal import JobJournal
+        journal = JobJournal({db_path!r})
+        journal.set_meta("output_format", "mp3")
+        journal.mark_queued("done", {input_path!r}, {{}}, [], [])
+        journal.mark_running("done")
+        journal.mark_done("done")
+        journal.mark_queued("running", {input_path!r}, {{}}, [], [])
+        journal.mark_running("running")
+        os._exit(1)
+    """)
+    # ログファイルがリポジトリに作られないよう、一時ディレクトリで実行する
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    result = subprocess.run([sys.executable, "-c", script], cwd=str(tmp_path), env=env, capture_output=True, text=True)
+    assert result.returncode == 1, result.stderr
+    assert os.path.exists(db_path + "-wal")
+
+    journal = JobJournal(db_path)
+    try:
+        assert journal.get_meta("output_format") == "mp3"
+        assert journal.get("done").state == STATE_DONE
+        assert journal.get("running").state == STATE_RUNNING
+        journal.recover()
+        assert journal.stats() == {STATE_QUEUED: 1, STATE_RUNNING: 0, STATE_DONE: 1, STATE_FAILED: 0}
+    finally:
+        journal.close()
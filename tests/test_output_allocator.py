@@ -0,0 +1,78 @@
+import os
+import threading
+from src.services.output_allocator import OutputPathAllocator
+
+
+def test_allocate_creates_placeholder_with_converted_suffix(tmp_path):
+    """_convertedを付けた名前で空のファイルを作成して確保する"""
+    input_path = str(tmp_path / "song.wav")
+    output_path = OutputPathAllocator().allocate(input_path, "mp3")
+    assert output_path == str(tmp_path / "song_converted.mp3")
+    assert os.path.getsize(output_path) == 0
+
+
+def test_allocate_skips_existing_names(tmp_path):
+    """既にあるファイルの名前は使わず、連番を付ける"""
+    (tmp_path / "song_converted.mp3").write_bytes(b"old")
+    (tmp_path / "song_converted_1.mp3").write_bytes(b"old")
+    output_path = OutputPathAllocator().allocate(str(tmp_path / "song.wav"), "mp3")
+    assert output_path == str(tmp_path / "song_converted_2.mp3")
+    assert (tmp_path / "song_converted.mp3").read_bytes() == b"old"
+
+
+def test_allocate_retries_when_name_is_created_after_listing(tmp_path):
+    """一覧の取得後に別のプロセスが作成した名前は、O_EXCLの失敗で検出して次の番号に進む"""
+    allocator = OutputPathAllocator()
+    first = allocator.allocate(str(tmp_path / "a.wav"), "mp3")
+    # 一覧は取得済みのため、ここで作成したファイルは索引に無い
+    (tmp_path / "b_converted.mp3").write_bytes(b"other process")
+    second = allocator.allocate(str(tmp_path / "b.wav"), "mp3")
+    assert first == str(tmp_path / "a_converted.mp3")
+    assert second == str(tmp_path / "b_converted_1.mp3")
+    assert (tmp_path / "b_converted.mp3").read_bytes() == b"other process"
+
+
+def test_two_allocators_never_share_a_name(tmp_path):
+    """別々のアロケーター（別のプロセスに相当）でも同じ名前は割り当てない"""
+    first = OutputPathAllocator()
+    second = OutputPathAllocator()
+    # 両方とも空のディレクトリの一覧を先に取得させる
+    first._taken_names(str(tmp_path))
+    second._taken_names(str(tmp_path))
+    paths = [first.allocate(str(tmp_path / "song.wav"), "mp3"), second.allocate(str(tmp_path / "song.wav"), "mp3")]
+    assert len(set(paths)) == 2
+
+
+def test_parallel_allocation_gives_unique_names(tmp_path):
+    """並列のワーカーから同じ入力名で割り当てても名前が重複しない"""
+    allocator = OutputPathAllocator()
+    results = []
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(20):
+            path = allocator.allocate(str(tmp_path / "song.wav"), "mp3")
+            with lock:
+                results.append(path)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == len(set(results)) == 160
+    assert all(os.path.exists(path) for path in results)
+
+
+def test_release_unused_removes_only_empty_placeholders(tmp_path):
+    """書き込まれなかった出力だけを削除し、その名前は再び割り当てられる"""
+    allocator = OutputPathAllocator()
+    written = allocator.allocate(str(tmp_path / "a.wav"), "mp3")
+    unused = allocator.allocate(str(tmp_path / "b.wav"), "mp3")
+    with open(written, "wb") as f:
+        f.write(b"data")
+
+    allocator.release_unused()
+    assert os.path.exists(written)
+    assert not os.path.exists(unused)
+    assert allocator.allocate(str(tmp_path / "b.wav"), "mp3") == unused
@@ -0,0 +1,101 @@
+import os
+import pytest
+from src.services.probe_cache import ProbeCache, file_identity
+
+PROBE_DATA = {"format": {"duration": "1.0"}, "streams": []}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ProbeCache(str(tmp_path / "probe_cache.sqlite3"))
+    yield cache
+    cache.close()
+
+
+@pytest.fixture
+def media_file(tmp_path):
+    path = tmp_path / "song.mp3"
+    path.write_bytes(b"audio data")
+    return str(path)
+
+
+def test_file_identity_uses_path_size_mtime_and_inode(media_file):
+    """キーは正規化した絶対パス・サイズ・更新時刻(ns)・inode"""
+    stat = os.stat(media_file)
+    assert file_identity(media_file) == (
+        os.path.normcase(os.path.abspath(media_file)), stat.st_size, stat.st_mtime_ns, stat.st_ino
+    )
+
+
+def test_lookup_hits_for_unchanged_file(cache, media_file):
+    """変更されていないファイルはキャッシュから返す"""
+    key, data = cache.lookup(media_file)
+    assert data is None
+    cache.store(key, PROBE_DATA)
+    assert cache.lookup(media_file) == (key, PROBE_DATA)
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1}
+
+
+def test_size_change_invalidates(cache, media_file):
+    """サイズが変わったファイルはキャッシュを使わない"""
+    key, _ = cache.lookup(media_file)
+    cache.store(key, PROBE_DATA)
+    stat = os.stat(media_file)
+    with open(media_file, "ab") as f:
+        f.write(b"more")
+    # 更新時刻は元に戻し、サイズの違いだけで判定されることを確かめる
+    os.utime(media_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert cache.lookup(media_file)[1] is None
+
+
+def test_mtime_change_invalidates(cache, media_file):
+    """サイズが同じでも更新時刻が変わったファイルはキャッシュを使わない"""
+    key, _ = cache.lookup(media_file)
+    cache.store(key, PROBE_DATA)
+    stat = os.stat(media_file)
+    os.utime(media_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert cache.lookup(media_file)[1] is None
+
+
+def test_replaced_file_invalidates(cache, media_file, tmp_path):
+    """サイズと更新時刻が同じでも、別のファイルに置き換えられた場合（inodeの違い）はキャッシュを使わない"""
+    key, _ = cache.lookup(media_file)
+    cache.store(key, PROBE_DATA)
+    stat = os.stat(media_file)
+    replacement = tmp_path / "replacement.mp3"
+    replacement.write_bytes(b"audio DATA")
+    os.utime(str(replacement), ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    os.replace(str(replacement), media_file)
+
+    new_stat = os.stat(media_file)
+    if new_stat.st_ino == stat.st_ino or not stat.st_ino:
+        pytest.skip("inodeを取得できないファイルシステム")
+    assert (new_stat.st_size, new_stat.st_mtime_ns) == (stat.st_size, stat.st_mtime_ns)
+    assert cache.lookup(media_file)[1] is None
+
+
+def test_store_replaces_stale_entry_for_same_path(cache, media_file):
+    """同じパスの古いエントリは新しい結果で置き換え、件数は増えない"""
+    key, _ = cache.lookup(media_file)
+    cache.store(key, PROBE_DATA)
+    with open(media_file, "ab") as f:
+        f.write(b"more")
+    key, _ = cache.lookup(media_file)
+    cache.store(key, {"format": {"duration": "2.0"}, "streams": []})
+    assert cache.lookup(media_file)[1]["format"]["duration"] == "2.0"
+    assert cache.stats()["entries"] == 1
+
+
+def test_entries_survive_reopen(tmp_path, media_file):
+    """保存した結果は次に開いたときも使える"""
+    db_path = str(tmp_path / "probe_cache.sqlite3")
+    cache = ProbeCache(db_path)
+    key, _ = cache.lookup(media_file)
+    cache.store(key, PROBE_DATA)
+    cache.close()
+
+    cache = ProbeCache(db_path)
+    try:
+        assert cache.lookup(media_file)[1] == PROBE_DATA
+    finally:
+        cache.close()
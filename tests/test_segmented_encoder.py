@@ -0,0 +1,96 @@
+import pytest
+from src.services.segmented_encoder import (
+    MP3_ENCODER_DELAY,
+    MP3_FRAME_SAMPLES,
+    MP3_PREROLL_FRAMES,
+    iter_mp3_frames,
+    plan_mp3_slices,
+    snap_mp3_boundary,
+)
+
+
+def make_frame(bitrate_index: int = 9, sample_rate_index: int = 0, padding: int = 0) -> bytes:
+    """MPEG-1 Layer IIIのフレーム（中身はゼロ）を作成"""
+    header = (0x7FF << 21) | (0x3 << 19) | (0x1 << 17) | (1 << 16)
+    header |= (bitrate_index << 12) | (sample_rate_index << 10) | (padding << 9)
+    bitrate = [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320][bitrate_index]
+    sample_rate = [44100, 48000, 32000][sample_rate_index]
+    length = 144 * bitrate * 1000 // sample_rate + padding
+    return header.to_bytes(4, "big") + bytes(length - 4)
+
+
+def kept_frame_ranges(slices):
+    """各区間で残すフレームが、全体を1回でエンコードした場合の何番目のフレームかを返す"""
+    ranges = []
+    for mp3_slice in slices:
+        first = mp3_slice.encode_start // MP3_FRAME_SAMPLES + mp3_slice.skip
+        ranges.append((first, None if mp3_slice.keep is None else first + mp3_slice.keep))
+    return ranges
+
+
+@pytest.mark.parametrize("samples", [0, 1, 575, 1152, 44100 * 60, 44100 * 3600 + 7])
+def test_snapped_boundary_is_frame_aligned_after_delay(samples):
+    """分割位置にエンコーダー遅延を足すとフレーム境界になる"""
+    boundary = snap_mp3_boundary(samples)
+    assert (boundary + MP3_ENCODER_DELAY) % MP3_FRAME_SAMPLES == 0
+    assert abs(boundary - samples) <= MP3_FRAME_SAMPLES // 2
+
+
+@pytest.mark.parametrize("count", [2, 3, 4, 7, 16])
+def test_kept_frames_are_contiguous_without_gaps_or_overlaps(count):
+    """各区間の残すフレームをつなぐと、1回でエンコードした場合のフレームの並びになる"""
+    total_samples = 44100 * 3600 + 123
+    slices = plan_mp3_slices(total_samples, count)
+    assert len(slices) == count
+
+    ranges = kept_frame_ranges(slices)
+    assert ranges[0][0] == 0
+    for (_, previous_end), (next_first, _) in zip(ranges, ranges[1:]):
+        assert next_first == previous_end
+    assert ranges[-1][1] is None
+
+
+def test_slices_start_encoding_before_their_boundary():
+    """2番目以降の区間は境界の手前からエンコードし、捨てるフレームは境界より前の分だけ"""
+    slices = plan_mp3_slices(44100 * 1800, 4)
+    first = slices[0]
+    assert (first.start, first.encode_start, first.skip) == (0, 0, 0)
+    for previous, mp3_slice in zip(slices, slices[1:]):
+        assert previous.end == mp3_slice.start
+        assert mp3_slice.encode_start >= 0
+        assert mp3_slice.skip == MP3_PREROLL_FRAMES
+        # 捨てるフレームの直後が、境界から始まるフレーム
+        assert mp3_slice.encode_start + MP3_PREROLL_FRAMES * MP3_FRAME_SAMPLES - MP3_ENCODER_DELAY == mp3_slice.start
+
+
+def test_first_slice_keeps_the_encoder_delay_frames():
+    """最初の区間はエンコーダー遅延の分だけ多くのフレームを残す"""
+    slices = plan_mp3_slices(44100 * 1800, 2)
+    assert slices[0].keep == (slices[0].end + MP3_ENCODER_DELAY) // MP3_FRAME_SAMPLES
+    assert slices[0].keep * MP3_FRAME_SAMPLES == slices[0].end + MP3_ENCODER_DELAY
+
+
+def test_single_slice_when_too_short_to_split():
+    """分割できない長さでは1区間だけになる"""
+    for total_samples, count in ((44100 * 1800, 1), (10, 4)):
+        slices = plan_mp3_slices(total_samples, count)
+        assert len(slices) == 1
+        assert slices[0].end is None and slices[0].keep is None
+
+
+def test_iter_mp3_frames_splits_by_header_length():
+    """フレームヘッダーのビットレート・サンプルレート・パディングから長さを求めて分割する"""
+    frames = [make_frame(), make_frame(padding=1), make_frame(bitrate_index=14, sample_rate_index=1)]
+    result = list(iter_mp3_frames(b"".join(frames)))
+    assert result == frames
+    assert [len(frame) for frame in result] == [417, 418, 960]
+
+
+def test_iter_mp3_frames_rejects_non_mp3_data():
+    """フレームの同期ワードが無いデータはエラーにする"""
+    with pytest.raises(ValueError):
+        list(iter_mp3_frames(make_frame() + b"ID3\x04\x00\x00\x00\x00\x00\x00"))
+    free_format = bytearray(make_frame())
+    free_format[2] &= 0x0F  # ビットレートのインデックスを0（フリーフォーマット）にする
+    with pytest.raises(ValueError):
+        list(iter_mp3_frames(bytes(free_format)))